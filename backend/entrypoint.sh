@@ -82,6 +82,14 @@ if [ $? -eq 137 ]; then
   exit 1
 fi
 
+# Key shared by Django and nginx for signed media URLs. Without a configured
+# key a random one is made at every start; URLs signed before a restart then
+# fall back to Django's permission check.
+if [ -z "$MEDIA_SIGNING_KEY" ]; then
+  export MEDIA_SIGNING_KEY=$(python -c 'import secrets; print(secrets.token_urlsafe(32))')
+fi
+echo "set \$media_signing_key \"$MEDIA_SIGNING_KEY\";" > /etc/nginx/media_signing.conf
+
 cat /code/adventurelog.txt
 
 exec "$@"
\ No newline at end of file
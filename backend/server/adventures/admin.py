@@ -2,7 +2,7 @@ import os
 from django.contrib import admin
 from django.utils.html import mark_safe, format_html
 from django.urls import reverse
-from .models import Location, Checklist, ChecklistItem, Collection, Transportation, Note, ContentImage, Visit, Category, ContentAttachment, Lodging, CollectionInvite, Trail, Activity, CollectionItineraryItem, CollectionItineraryDay
+from .models import Location, Checklist, ChecklistItem, Collection, Transportation, Note, ContentImage, Visit, Category, ContentAttachment, Lodging, CollectionInvite, Trail, Activity, CollectionItineraryItem, CollectionItineraryDay, MediaBlob
 from worldtravel.models import Country, Region, VisitedRegion, City, VisitedCity
 from allauth.account.decorators import secure_admin_login
 
@@ -144,6 +144,12 @@ class CollectionAdmin(admin.ModelAdmin):
 
     list_display = ('name', 'user', 'is_public')
 
+class MediaBlobAdmin(admin.ModelAdmin):
+    list_display = ('file', 'kind', 'size', 'ref_count', 'created_at')
+    list_filter = ('kind',)
+    search_fields = ('sha256', 'file')
+    readonly_fields = ('sha256', 'file', 'size', 'ref_count')
+
 class ActivityAdmin(admin.ModelAdmin):
     list_display = ('name', 'user', 'visit__location', 'sport_type', 'distance', 'elevation_gain', 'moving_time')
 
@@ -195,6 +201,7 @@ admin.site.register(Trail)
 admin.site.register(Activity, ActivityAdmin)
 admin.site.register(CollectionItineraryItem, CollectionItineraryItemAdmin)
 admin.site.register(CollectionItineraryDay)
+admin.site.register(MediaBlob, MediaBlobAdmin)
 
 admin.site.site_header = 'AdventureLog Admin'
 admin.site.site_title = 'AdventureLog Admin Site'
@@ -49,7 +49,7 @@ class Command(BaseCommand):
             )
 
         # Build queryset
-        queryset = Activity.objects.filter(gpx_file__isnull=False).exclude(gpx_file='')
+        queryset = Activity.objects.filter(gpx_file__isnull=False).exclude(gpx_file='').defer('gpx_geojson')
         
         if activity_id:
             queryset = queryset.filter(id=activity_id)
@@ -0,0 +1,54 @@
+"""
+Django management command that converts stored GPX attachments and activity
+tracks to GeoJSON, along with their simplified levels.
+
+Tracks are converted on first use, so this only saves the first reader of
+each existing GPX file the parse.
+
+Usage:
+    python manage.py backfill_gpx_geojson
+    python manage.py backfill_gpx_geojson --all
+"""
+
+from django.core.management.base import BaseCommand
+
+from adventures.models import Activity, MediaBlob
+from adventures.utils.geojson import store_activity_geojson, store_blob_geojson
+
+
+class Command(BaseCommand):
+    help = 'Convert GPX attachments and activity tracks to GeoJSON once and store the result'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Convert again files that already have GeoJSON',
+        )
+
+    def handle(self, *args, **options):
+        blobs = MediaBlob.objects.filter(kind='attachments', file__iendswith='.gpx')
+        activities = Activity.objects.exclude(gpx_file__isnull=True).exclude(gpx_file='')
+        if not options['all']:
+            blobs = blobs.filter(geojson_levels__isnull=True)
+            activities = activities.filter(gpx_geojson__isnull=True)
+
+        converted = failed = 0
+        for blob in blobs.defer('geojson', 'geojson_levels').iterator(chunk_size=100):
+            if self.record(blob.file.name, store_blob_geojson(blob)):
+                converted += 1
+            else:
+                failed += 1
+        for activity in activities.only('id', 'gpx_file').iterator(chunk_size=100):
+            if self.record(activity.gpx_file.name, store_activity_geojson(activity)['full']):
+                converted += 1
+            else:
+                failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Converted {converted} GPX file(s), {failed} could not be parsed'))
+
+    def record(self, name, result):
+        if result and 'error' in result:
+            self.stdout.write(self.style.WARNING(f"{name}: {result['error']}"))
+            return False
+        return True
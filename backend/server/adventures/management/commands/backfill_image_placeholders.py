@@ -0,0 +1,69 @@
+"""
+Django management command that computes missing image placeholders.
+
+New uploads get their placeholder from the ingestion pipeline; this fills in
+images stored before placeholders existed or restored from a backup. Images
+sharing a file are decoded once, on a process pool.
+
+Usage:
+    python manage.py backfill_image_placeholders
+    python manage.py backfill_image_placeholders --workers 4
+    python manage.py backfill_image_placeholders --all
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from adventures.models import ContentImage
+from adventures.utils.image_ingest import placeholder_for_file
+
+BATCH_SIZE = 200
+
+
+class Command(BaseCommand):
+    help = 'Compute inline placeholders for stored images that have none'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.IMAGE_INGEST_WORKERS,
+            help='Number of processes decoding images',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recompute placeholders that are already set',
+        )
+
+    def handle(self, *args, **options):
+        images = ContentImage.objects.filter(blob__isnull=False, processing=False)
+        if not options['all']:
+            images = images.filter(placeholder='')
+        blobs = list(images.order_by().values_list('blob_id', 'blob__file').distinct())
+        self.stdout.write(f'Computing placeholders for {len(blobs)} stored image(s)')
+
+        updated = failed = 0
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=max(1, options['workers']), mp_context=context) as pool:
+            for start in range(0, len(blobs), BATCH_SIZE):
+                batch = blobs[start:start + BATCH_SIZE]
+                futures = [
+                    (blob_id, name, pool.submit(placeholder_for_file, os.path.join(settings.MEDIA_ROOT, name)))
+                    for blob_id, name in batch
+                ]
+                for blob_id, name, future in futures:
+                    try:
+                        placeholder = future.result()
+                    except Exception as e:
+                        failed += 1
+                        self.stdout.write(self.style.ERROR(f'Could not read {name}: {e}'))
+                        continue
+                    rows = images.filter(blob_id=blob_id)
+                    updated += rows.update(placeholder=placeholder)
+
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} image(s), {failed} file(s) could not be read'))
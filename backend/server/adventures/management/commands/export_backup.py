@@ -0,0 +1,50 @@
+"""
+Django management command that writes a user's backup archive to disk, for
+scheduled backups.
+
+With --parent the backup is incremental: it only holds the rows that changed
+since the parent backup, tombstones for removed rows and the media files the
+parent does not have. The parent may be a backup archive or its manifest.json.
+
+Usage:
+    python manage.py export_backup alice --output /backups/alice-full.zip
+    python manage.py export_backup alice --parent /backups/alice-full.zip --output /backups/alice-1.zip
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from adventures.utils.backup import BackupError, backup_archive_chunks, read_backup_manifest
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Write a full or incremental backup of a user to a file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User to back up')
+        parser.add_argument('--output', required=True, help='Path of the archive to write')
+        parser.add_argument(
+            '--parent',
+            help='Earlier backup archive or manifest.json to make an incremental backup against',
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"User {options['username']} not found")
+
+        parent = None
+        if options['parent']:
+            try:
+                parent = read_backup_manifest(options['parent'])
+            except (BackupError, OSError) as e:
+                raise CommandError(f'Cannot read the parent backup: {e}')
+
+        with open(options['output'], 'wb') as out:
+            for chunk in backup_archive_chunks(user, parent=parent):
+                out.write(chunk)
+
+        kind = 'incremental' if parent else 'full'
+        self.stdout.write(self.style.SUCCESS(f"Wrote {kind} backup of {user.username} to {options['output']}"))
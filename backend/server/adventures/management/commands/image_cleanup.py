@@ -1,12 +1,21 @@
-import os
+import json
+
 from django.core.management.base import BaseCommand
-from django.conf import settings
-from adventures.models import ContentImage, ContentAttachment
-from users.models import CustomUser
+
+from adventures.utils.media_fsck import (
+	DEFAULT_BATCH_SIZE,
+	ORPHAN_MIN_AGE,
+	check_media,
+	collect_dead_blobs,
+	delete_orphans,
+)
 
 
 class Command(BaseCommand):
-	help = 'Find and prompt for deletion of unused image files and attachments in filesystem'
+	help = (
+		'Check media files against the database: report unused files, rows whose file is missing '
+		'and unreferenced media blobs, and prompt for deletion of unused files and blobs'
+	)
 
 	def add_arguments(self, parser):
 		parser.add_argument(
@@ -14,81 +23,97 @@ class Command(BaseCommand):
 			action='store_true',
 			help='Show files that would be deleted without actually deleting them',
 		)
+		parser.add_argument(
+			'--delete',
+			action='store_true',
+			help='Delete unused files and unreferenced blobs without prompting',
+		)
+		parser.add_argument(
+			'--json',
+			action='store_true',
+			help='Print the report as JSON instead of text; never prompts',
+		)
+		parser.add_argument(
+			'--batch-size',
+			type=int,
+			default=DEFAULT_BATCH_SIZE,
+			help=f'Files or blobs re-checked and deleted per batch (default {DEFAULT_BATCH_SIZE})',
+		)
+		parser.add_argument(
+			'--workers',
+			type=int,
+			default=None,
+			help='Threads walking the media directories',
+		)
+		parser.add_argument(
+			'--min-age',
+			type=int,
+			default=ORPHAN_MIN_AGE,
+			help=f'Seconds before a new unreferenced file counts as unused (default {ORPHAN_MIN_AGE})',
+		)
 
 	def handle(self, **options):
-		dry_run = options['dry_run']
-		
-		# Get all image and attachment file paths from database
-		used_files = set()
-		
-		# Get ContentImage file paths
-		for img in ContentImage.objects.all():
-			if img.image and img.image.name:
-				used_files.add(os.path.join(settings.MEDIA_ROOT, img.image.name))
-		
-		# Get Attachment file paths
-		for attachment in ContentAttachment.objects.all():
-			if attachment.file and attachment.file.name:
-				used_files.add(os.path.join(settings.MEDIA_ROOT, attachment.file.name))
-		
-		# Get user profile picture file paths
-		for user in CustomUser.objects.all():
-			if user.profile_pic and user.profile_pic.name:
-				used_files.add(os.path.join(settings.MEDIA_ROOT, user.profile_pic.name))
-		
-		# Find all files in media/images and media/attachments directories
-		media_root = settings.MEDIA_ROOT
-		all_files = []
-		
-		# Scan images directory
-		images_dir = os.path.join(media_root, 'images')
-		# Scan attachments directory
-		attachments_dir = os.path.join(media_root, 'attachments')
-		if os.path.exists(attachments_dir):
-			for root, _, files in os.walk(attachments_dir):
-				for file in files:
-					all_files.append(os.path.join(root, file))
-		
-		# Scan profile-pics directory
-		profile_pics_dir = os.path.join(media_root, 'profile-pics')
-		if os.path.exists(profile_pics_dir):
-			for root, _, files in os.walk(profile_pics_dir):
-				for file in files:
-					all_files.append(os.path.join(root, file))
-		attachments_dir = os.path.join(media_root, 'attachments')
-		if os.path.exists(attachments_dir):
-			for root, _, files in os.walk(attachments_dir):
-				for file in files:
-					all_files.append(os.path.join(root, file))
-		
-		# Find unused files
-		unused_files = [f for f in all_files if f not in used_files]
-		
-		if not unused_files:
-			self.stdout.write(self.style.SUCCESS('No unused files found.'))
+		report = check_media(workers=options['workers'], min_age=options['min_age'])
+
+		if options['json']:
+			result = report.as_dict()
+			if options['delete'] and not options['dry_run']:
+				result.update(self.delete(report, options['batch_size']))
+			self.stdout.write(json.dumps(result, indent=2))
+			return
+
+		self.write_report(report)
+		if not report.orphans and not report.dead_blobs:
 			return
-		
-		self.stdout.write(f'Found {len(unused_files)} unused files:')
-		for file_path in unused_files:
-			self.stdout.write(f'  {file_path}')
-		
-		if dry_run:
+
+		if options['dry_run']:
 			self.stdout.write(self.style.WARNING('Dry run mode - no files were deleted.'))
 			return
-		
-		# Prompt for deletion
-		confirm = input('\nDo you want to delete these files? (yes/no): ')
-		if confirm.lower() in ['yes', 'y']:
-			deleted_count = 0
-			for file_path in unused_files:
-				try:
-					os.remove(file_path)
-					self.stdout.write(f'Deleted: {file_path}')
-					deleted_count += 1
-				except OSError as e:
-					self.stdout.write(self.style.ERROR(f'Error deleting {file_path}: {e}'))
-			
-			self.stdout.write(self.style.SUCCESS(f'Successfully deleted {deleted_count} files.'))
-		else:
-			self.stdout.write('Operation cancelled.')
 
+		if not options['delete']:
+			confirm = input('\nDo you want to delete these files? (yes/no): ')
+			if confirm.lower() not in ['yes', 'y']:
+				self.stdout.write('Operation cancelled.')
+				return
+
+		result = self.delete(report, options['batch_size'])
+		for name, error in result['errors']:
+			self.stdout.write(self.style.ERROR(f'Error deleting {name}: {error}'))
+		if report.dead_blobs:
+			self.stdout.write(self.style.SUCCESS(f"Collected {result['collected_blobs']} unreferenced media blobs."))
+		self.stdout.write(self.style.SUCCESS(f"Successfully deleted {result['deleted_files']} files."))
+
+	def delete(self, report, batch_size):
+		errors = []
+		collected = collect_dead_blobs(report, batch_size, errors)
+		deleted = delete_orphans(report, batch_size, errors)
+		return {
+			'collected_blobs': collected,
+			'deleted_files': deleted,
+			'errors': errors,
+		}
+
+	def write_report(self, report):
+		for directory, totals in sorted(report.directories.items()):
+			self.stdout.write(f"{directory}: {totals['files']} files, {totals['bytes']} bytes")
+		self.stdout.write(f'Referenced: {report.referenced_bytes} bytes')
+		if report.recent_files:
+			self.stdout.write(f'Skipped {report.recent_files} unreferenced files newer than the minimum age.')
+
+		if report.missing:
+			self.stdout.write(self.style.WARNING(f'Found {len(report.missing)} rows whose file is missing:'))
+			for label, pk, name in report.missing:
+				self.stdout.write(f'  {label} {pk}: {name}')
+
+		if report.dead_blobs:
+			self.stdout.write(f'Found {len(report.dead_blobs)} unreferenced media blobs ({report.dead_blob_bytes} bytes):')
+			for _, name, size in report.dead_blobs:
+				self.stdout.write(f'  {name} ({size} bytes)')
+
+		if report.orphans:
+			self.stdout.write(f'Found {len(report.orphans)} unused files ({report.orphan_bytes} bytes):')
+			for name, _ in report.orphans:
+				self.stdout.write(f'  {name}')
+
+		if report.is_clean:
+			self.stdout.write(self.style.SUCCESS('No unused or missing files found.'))
@@ -0,0 +1,99 @@
+"""
+Django management command to move existing images and attachments into the
+content-addressed blob store.
+
+Every ContentImage/ContentAttachment that still points at a per-row file is
+hashed, its file is moved to ``<kind>/<sha256><ext>`` (or removed when an
+identical blob already exists) and the row is linked to the shared MediaBlob.
+Afterwards all blob refcounts are recalculated from the actual references.
+
+Usage:
+    python manage.py migrate_media_blobs
+    python manage.py migrate_media_blobs --dry-run
+    python manage.py migrate_media_blobs --recount-only
+"""
+
+import logging
+import os
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from adventures.models import ContentImage, ContentAttachment, MediaBlob
+from adventures.utils.media_blobs import ensure_blob
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Move existing image and attachment files into the content-addressed blob store'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many files would be migrated',
+        )
+        parser.add_argument(
+            '--recount-only',
+            action='store_true',
+            help='Skip migrating files and only recalculate blob refcounts',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        if not options['recount_only']:
+            for model, field_name in ((ContentImage, 'image'), (ContentAttachment, 'file')):
+                self._migrate_model(model, field_name, dry_run)
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes were made'))
+            return
+
+        fixed = self._recount()
+        self.stdout.write(self.style.SUCCESS(f'Refcounts recalculated ({fixed} corrected)'))
+
+    def _migrate_model(self, model, field_name, dry_run):
+        label = model._meta.verbose_name_plural
+        pending = (
+            model.objects.filter(blob__isnull=True)
+            .exclude(**{f'{field_name}__isnull': True})
+            .exclude(**{field_name: ''})
+        )
+        total = pending.count()
+        self.stdout.write(f'{label}: {total} file(s) to migrate')
+        if dry_run or not total:
+            return
+
+        migrated = 0
+        missing = 0
+        for instance in pending.iterator():
+            field_file = getattr(instance, field_name)
+            if not os.path.isfile(field_file.path):
+                missing += 1
+                logger.warning('Skipping %s %s: file %s is missing', label, instance.pk, field_file.name)
+                continue
+            try:
+                ensure_blob(instance)
+                migrated += 1
+            except Exception as e:
+                logger.exception('Failed to migrate %s %s', label, instance.pk)
+                self.stdout.write(self.style.ERROR(f'Error migrating {field_file.name}: {e}'))
+
+        self.stdout.write(self.style.SUCCESS(f'{label}: migrated {migrated} file(s)'))
+        if missing:
+            self.stdout.write(self.style.WARNING(f'{label}: {missing} file(s) missing on disk'))
+
+    def _recount(self):
+        fixed = 0
+        blobs = MediaBlob.objects.annotate(
+            image_refs=Count('images', distinct=True),
+            attachment_refs=Count('attachments', distinct=True),
+        )
+        for blob in blobs.iterator():
+            actual = blob.image_refs + blob.attachment_refs
+            if blob.ref_count != actual:
+                MediaBlob.objects.filter(id=blob.id).update(ref_count=actual)
+                fixed += 1
+        return fixed
@@ -0,0 +1,109 @@
+"""
+Django management command to rebuild or verify the per-user statistics rollup.
+
+The UserStats/UserSportStats tables are maintained incrementally by signals.
+This command recomputes them from scratch, or with --verify compares the
+stored rows against live values and reports any drift.
+
+Usage:
+    python manage.py rebuild_user_stats
+    python manage.py rebuild_user_stats --user-id 123
+    python manage.py rebuild_user_stats --verify
+    python manage.py rebuild_user_stats --verify --fix
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+from adventures.models import UserStats, UserSportStats
+from adventures.utils.stats import SPORT_ROW_FIELDS, sport_type_rows, compute_user_stats, refresh_user_stats
+
+User = get_user_model()
+
+
+def _matches(stored, expected):
+    # Activity deltas accumulate float rounding, and a sum whose values were
+    # all removed is stored as zero where a live SUM() returns NULL
+    if isinstance(expected, float) or isinstance(stored, float):
+        return abs((stored or 0) - (expected or 0)) < 1e-6
+    if isinstance(expected, timedelta) or isinstance(stored, timedelta):
+        return (stored or timedelta(0)) == (expected or timedelta(0))
+    return stored == expected
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify the per-user statistics rollup'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user-id',
+            type=int,
+            help='Only process the user with this ID',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Compare stored rollups against live values instead of rebuilding',
+        )
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='With --verify, rebuild the rollups that differ',
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.all().order_by('id')
+        if options.get('user_id'):
+            users = users.filter(id=options['user_id'])
+            if not users.exists():
+                raise CommandError(f"User with ID {options['user_id']} not found")
+
+        user_ids = list(users.values_list('id', flat=True))
+        if not options['verify']:
+            for user_id in user_ids:
+                refresh_user_stats(user_id)
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt statistics for {len(user_ids)} user(s)'))
+            return
+
+        mismatched = 0
+        for user_id in user_ids:
+            differences = self._differences(user_id)
+            if not differences:
+                continue
+            mismatched += 1
+            self.stdout.write(self.style.WARNING(f'User {user_id}: ' + ', '.join(differences)))
+            if options['fix']:
+                refresh_user_stats(user_id)
+
+        if mismatched:
+            action = 'rebuilt' if options['fix'] else 'found'
+            self.stdout.write(self.style.WARNING(f'{mismatched} of {len(user_ids)} rollup(s) out of date ({action})'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'All {len(user_ids)} rollup(s) are up to date'))
+
+    def _differences(self, user_id):
+        stats = UserStats.objects.filter(user_id=user_id).first()
+        if stats is None:
+            return ['missing rollup row']
+
+        differences = []
+        for field, expected in compute_user_stats(user_id).items():
+            stored = getattr(stats, field)
+            if not _matches(stored, expected):
+                differences.append(f'{field} stored={stored} actual={expected}')
+
+        live_rows = {row['sport_type']: row for row in sport_type_rows(user_id)}
+        stored_rows = {
+            row['sport_type']: row
+            for row in UserSportStats.objects.filter(user_id=user_id).values('sport_type', *SPORT_ROW_FIELDS)
+        }
+        for sport_type in sorted(set(live_rows) | set(stored_rows)):
+            live = live_rows.get(sport_type)
+            stored = stored_rows.get(sport_type)
+            if live is None or stored is None:
+                differences.append(f'sport {sport_type} {"missing" if stored is None else "stale"}')
+            elif not all(_matches(stored[field], live[field]) for field in SPORT_ROW_FIELDS):
+                differences.append(f'sport {sport_type} differs')
+        return differences
@@ -0,0 +1,45 @@
+"""
+Django management command that measures the stored distance of transportations.
+
+Distances are measured when GPX attachments or coordinates change and, for
+rows created in bulk, on first read. This recomputes them all, e.g. after
+changing how distances are measured.
+
+Usage:
+    python manage.py recompute_transportation_distances
+    python manage.py recompute_transportation_distances --missing
+"""
+
+from django.core.management.base import BaseCommand
+from django.db.models import Prefetch
+
+from adventures.models import ContentAttachment, Transportation
+from adventures.utils.geojson import BLOB_GEOJSON_FIELDS
+from adventures.utils.transportation_distance import update_distance
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored distance of transportations from their GPX files or coordinates'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Only measure transportations that have no stored distance yet',
+        )
+
+    def handle(self, *args, **options):
+        attachments = ContentAttachment.objects.select_related('blob').defer(*BLOB_GEOJSON_FIELDS)
+        transportations = Transportation.objects.prefetch_related(Prefetch('attachments', queryset=attachments))
+        if options['missing']:
+            transportations = transportations.filter(distance_source__isnull=True)
+
+        counts = {'gpx': 0, 'geodesic': 0, '': 0}
+        for transportation in transportations.iterator(chunk_size=200):
+            update_distance(transportation)
+            counts[transportation.distance_source] += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Measured {counts['gpx']} transportation(s) from GPX and {counts['geodesic']} from coordinates; "
+            f"{counts['']} have no distance"
+        ))
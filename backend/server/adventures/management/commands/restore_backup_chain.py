@@ -0,0 +1,54 @@
+"""
+Django management command that restores a chain of backups for a user.
+
+The first archive must be a full backup and every following one an
+incremental backup made against the archive before it. All of the user's
+current data is replaced by the state at the end of the chain.
+
+Usage:
+    python manage.py restore_backup_chain alice full.zip incremental-1.zip incremental-2.zip
+    python manage.py restore_backup_chain alice full.zip --no-input
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from adventures.utils.backup import BackupError
+from adventures.utils.backup_chain import restore_backup_chain
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Restore a full backup followed by its incremental backups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User whose data is replaced')
+        parser.add_argument('archives', nargs='+', help='Backup archives, the full backup first')
+        parser.add_argument(
+            '--no-input', '--noinput',
+            action='store_false',
+            dest='interactive',
+            help='Do not ask for confirmation',
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"User {options['username']} not found")
+
+        if options['interactive']:
+            answer = input(f'All data of {user.username} will be replaced. Type "yes" to continue: ')
+            if answer != 'yes':
+                self.stdout.write('Restore cancelled')
+                return
+
+        try:
+            summary = restore_backup_chain(options['archives'], user)
+        except (BackupError, OSError) as e:
+            raise CommandError(str(e))
+
+        restored = ', '.join(f'{count} {name}' for name, count in summary.items() if count)
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored {len(options['archives'])} backup(s) for {user.username}: {restored or 'nothing'}"
+        ))
@@ -0,0 +1,146 @@
+"""
+Django management command that runs queued export/import jobs and processes
+uploaded images.
+
+Jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so several workers
+may run side by side. While jobs run a heartbeat is written every 30
+seconds; jobs whose heartbeat goes stale (the worker was killed) are requeued
+and failed after a few attempts. Finished jobs older than a week are purged
+together with their archives.
+
+Uploaded images waiting for processing are normalized on a separate process
+pool of ``--image-workers`` processes (see adventures.utils.image_ingest).
+
+Usage:
+    python manage.py run_data_jobs
+    python manage.py run_data_jobs --workers 4
+    python manage.py run_data_jobs --image-workers 4
+    python manage.py run_data_jobs --once
+"""
+
+import logging
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from adventures.utils.image_ingest import ImageIngestor
+from adventures.utils.jobs import claim_next_job, purge_expired_jobs, requeue_stale_jobs, run_job, touch_jobs
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 2
+HEARTBEAT_INTERVAL = 30
+MAINTENANCE_INTERVAL = 60 * 5
+
+
+class Command(BaseCommand):
+    help = 'Run queued backup and collection export/import jobs and process uploaded images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.DATA_JOB_WORKERS,
+            help='Number of jobs to run at the same time',
+        )
+        parser.add_argument(
+            '--image-workers',
+            type=int,
+            default=settings.IMAGE_INGEST_WORKERS,
+            help='Number of processes normalizing uploaded images',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the jobs currently queued, then exit',
+        )
+
+    def handle(self, *args, **options):
+        self._stop = threading.Event()
+        self._done = threading.Event()
+        self._running = set()
+        self._lock = threading.Lock()
+        workers = max(1, options['workers'])
+
+        signal.signal(signal.SIGTERM, self._handle_termination)
+        signal.signal(signal.SIGINT, self._handle_termination)
+        threading.Thread(target=self._heartbeat, daemon=True).start()
+
+        self._maintenance()
+        last_maintenance = time.monotonic()
+        self.stdout.write(f'Running data jobs with {workers} worker(s)')
+        images = ImageIngestor(max(1, options['image_workers']))
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while not self._stop.is_set():
+                close_old_connections()
+                images.poll()
+
+                claimed = False
+                while self._free_slots(workers):
+                    close_old_connections()
+                    job = claim_next_job()
+                    if job is None:
+                        break
+                    claimed = True
+                    with self._lock:
+                        self._running.add(job.id)
+                    pool.submit(self._run, job)
+
+                if options['once'] and not claimed:
+                    with self._lock:
+                        idle = not self._running and not images.busy
+                    if idle:
+                        break
+
+                if time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                    self._maintenance()
+                    last_maintenance = time.monotonic()
+                self._stop.wait(POLL_INTERVAL)
+
+        # Leaving the pool waited for running jobs to finish
+        images.shutdown()
+        self._done.set()
+        connection.close()
+
+    def _handle_termination(self, signum, frame):
+        logger.info("Received signal %s; finishing running jobs...", signum)
+        self._stop.set()
+
+    def _free_slots(self, workers):
+        with self._lock:
+            return len(self._running) < workers
+
+    def _run(self, job):
+        try:
+            logger.info("Running %s job %s", job.kind, job.id)
+            run_job(job)
+        finally:
+            with self._lock:
+                self._running.discard(job.id)
+            connection.close()
+
+    def _heartbeat(self):
+        while not self._done.wait(HEARTBEAT_INTERVAL):
+            with self._lock:
+                job_ids = list(self._running)
+            if not job_ids:
+                continue
+            try:
+                close_old_connections()
+                touch_jobs(job_ids)
+            except Exception:
+                logger.exception("Failed to record data job heartbeat")
+
+    def _maintenance(self):
+        requeued, failed = requeue_stale_jobs()
+        if requeued or failed:
+            logger.warning("Requeued %s and failed %s stale data job(s)", requeued, failed)
+        purged = purge_expired_jobs()
+        if purged:
+            logger.info("Purged %s expired data job(s)", purged)
@@ -16,6 +16,7 @@ from django.contrib.auth import get_user_model
 from django.db import transaction
 from django.db.models import Prefetch, Q
 from adventures.models import Location
+from adventures.utils.stats import mark_user_stats_dirty
 from worldtravel.models import Region, City, VisitedRegion, VisitedCity
 from collections import defaultdict
 import logging
@@ -222,6 +223,8 @@ class Command(BaseCommand):
                 new_visited_regions,
                 ignore_conflicts=True  # Handle race conditions gracefully
             )
+        # bulk_create sends no post_save signals for the rollup
+        mark_user_stats_dirty(user_id, 'regions')
         
         return len(regions_to_create)
 
@@ -255,5 +258,6 @@ class Command(BaseCommand):
                 new_visited_cities,
                 ignore_conflicts=True  # Handle race conditions gracefully
             )
+        mark_user_stats_dirty(user_id, 'cities')
         
         return len(cities_to_create)
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.11 on 2026-10-18 21:20
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adventures', '0071_alter_collectionitineraryitem_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('kind', models.CharField(choices=[('images', 'Image'), ('attachments', 'Attachment')], max_length=20)),
+                ('sha256', models.CharField(max_length=64)),
+                ('file', models.FileField(max_length=255, upload_to='')),
+                ('size', models.BigIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Media Blob',
+                'verbose_name_plural': 'Media Blobs',
+                'indexes': [models.Index(fields=['ref_count'], name='adventures__ref_cou_9be632_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'sha256'), name='unique_media_blob_per_kind')],
+            },
+        ),
+        migrations.AddField(
+            model_name='contentattachment',
+            name='blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='attachments', to='adventures.mediablob'),
+        ),
+        migrations.AddField(
+            model_name='contentimage',
+            name='blob',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='images', to='adventures.mediablob'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.11 on 2026-10-18 21:23
+
+import datetime
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adventures', '0072_media_blob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('location_count', models.PositiveIntegerField(default=0)),
+                ('visited_location_count', models.PositiveIntegerField(default=0)),
+                ('next_visit_start', models.DateField(blank=True, null=True)),
+                ('collection_count', models.PositiveIntegerField(default=0)),
+                ('visited_city_count', models.PositiveIntegerField(default=0)),
+                ('visited_region_count', models.PositiveIntegerField(default=0)),
+                ('visited_country_count', models.PositiveIntegerField(default=0)),
+                ('activity_count', models.PositiveIntegerField(default=0)),
+                ('total_distance', models.FloatField(default=0)),
+                ('total_moving_time', models.DurationField(default=datetime.timedelta)),
+                ('total_elevation_gain', models.FloatField(default=0)),
+                ('total_elevation_loss', models.FloatField(default=0)),
+                ('total_calories', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats_rollup', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User Stats',
+                'verbose_name_plural': 'User Stats',
+            },
+        ),
+        migrations.CreateModel(
+            name='UserSportStats',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, unique=True)),
+                ('sport_type', models.CharField(choices=[('General', 'General'), ('Run', 'Run'), ('TrailRun', 'Trail Run'), ('Walk', 'Walk'), ('Hike', 'Hike'), ('VirtualRun', 'Virtual Run'), ('Ride', 'Ride'), ('MountainBikeRide', 'Mountain Bike Ride'), ('GravelRide', 'Gravel Ride'), ('EBikeRide', 'E-Bike Ride'), ('EMountainBikeRide', 'E-Mountain Bike Ride'), ('Velomobile', 'Velomobile'), ('VirtualRide', 'Virtual Ride'), ('Canoeing', 'Canoe'), ('Kayaking', 'Kayak'), ('Kitesurfing', 'Kitesurf'), ('Rowing', 'Rowing'), ('StandUpPaddling', 'Stand Up Paddling'), ('Surfing', 'Surf'), ('Swim', 'Swim'), ('Windsurfing', 'Windsurf'), ('Sailing', 'Sail'), ('IceSkate', 'Ice Skate'), ('AlpineSki', 'Alpine Ski'), ('BackcountrySki', 'Backcountry Ski'), ('NordicSki', 'Nordic Ski'), ('Snowboard', 'Snowboard'), ('Snowshoe', 'Snowshoe'), ('Handcycle', 'Handcycle'), ('InlineSkate', 'Inline Skate'), ('RockClimbing', 'Rock Climb'), ('RollerSki', 'Roller Ski'), ('Golf', 'Golf'), ('Skateboard', 'Skateboard'), ('Soccer', 'Football (Soccer)'), ('Wheelchair', 'Wheelchair'), ('Badminton', 'Badminton'), ('Tennis', 'Tennis'), ('Pickleball', 'Pickleball'), ('Crossfit', 'Crossfit'), ('Elliptical', 'Elliptical'), ('StairStepper', 'Stair Stepper'), ('WeightTraining', 'Weight Training'), ('Yoga', 'Yoga'), ('Workout', 'Workout'), ('HIIT', 'HIIT'), ('Pilates', 'Pilates'), ('TableTennis', 'Table Tennis'), ('Squash', 'Squash'), ('Racquetball', 'Racquetball'), ('VirtualRow', 'Virtual Rowing')], max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_distance', models.FloatField(blank=True, null=True)),
+                ('distance_count', models.PositiveIntegerField(default=0)),
+                ('max_distance', models.FloatField(blank=True, null=True)),
+                ('total_moving_time', models.DurationField(blank=True, null=True)),
+                ('total_elevation_gain', models.FloatField(blank=True, null=True)),
+                ('elevation_gain_count', models.PositiveIntegerField(default=0)),
+                ('max_elevation_gain', models.FloatField(blank=True, null=True)),
+                ('total_elevation_loss', models.FloatField(blank=True, null=True)),
+                ('total_speed', models.FloatField(blank=True, null=True)),
+                ('speed_count', models.PositiveIntegerField(default=0)),
+                ('max_speed', models.FloatField(blank=True, null=True)),
+                ('total_calories', models.FloatField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sport_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'User Sport Stats',
+                'verbose_name_plural': 'User Sport Stats',
+                'unique_together': {('user', 'sport_type')},
+            },
+        ),
+    ]
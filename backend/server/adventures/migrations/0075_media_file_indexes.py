@@ -0,0 +1,24 @@
+# Generated by Django 5.2.11 on 2026-10-18 22:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adventures', '0074_data_jobs'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contentattachment',
+            index=models.Index(fields=['file'], name='adventures__file_7e22b8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contentimage',
+            index=models.Index(fields=['image'], name='adventures__image_d327fe_idx'),
+        ),
+    ]
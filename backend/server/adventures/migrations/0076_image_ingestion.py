@@ -0,0 +1,36 @@
+# Generated by Django 5.2.11 on 2026-10-18 22:15
+
+import adventures.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adventures', '0075_media_file_indexes'),
+        ('contenttypes', '0002_remove_content_type_name'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contentimage',
+            name='processing',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='contentimage',
+            name='processing_claimed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='contentimage',
+            name='image',
+            field=models.ImageField(blank=True, null=True, upload_to=adventures.models.PathAndRename('images/')),
+        ),
+        migrations.AddIndex(
+            model_name='contentimage',
+            index=models.Index(fields=['processing'], name='adventures__process_a94153_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-18 22:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adventures', '0076_image_ingestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contentimage',
+            name='placeholder',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+    ]
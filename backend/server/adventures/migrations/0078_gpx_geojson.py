@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-18 22:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adventures', '0077_image_placeholders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediablob',
+            name='geojson',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.11 on 2026-10-18 22:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adventures', '0078_gpx_geojson'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='gpx_geojson',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='mediablob',
+            name='geojson_levels',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.11 on 2026-10-18 22:25
+
+from django.db import migrations, models
+
+from adventures.utils.transportation_distance import geodesic_from_coordinates, gpx_distance_km
+
+
+def measure_distances(apps, schema_editor):
+    Transportation = apps.get_model('adventures', 'Transportation')
+    ContentAttachment = apps.get_model('adventures', 'ContentAttachment')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    gpx_by_transportation = {}
+    content_type = ContentType.objects.filter(app_label='adventures', model='transportation').first()
+    if content_type is not None:
+        attachments = ContentAttachment.objects.filter(content_type=content_type, file__iendswith='.gpx')
+        for attachment in attachments.only('object_id', 'file').order_by('id'):
+            gpx_by_transportation.setdefault(attachment.object_id, []).append(attachment.file)
+
+    for transportation in Transportation.objects.iterator(chunk_size=500):
+        distance_km, source = None, None
+        for gpx_file in gpx_by_transportation.get(transportation.id, []):
+            distance_km = gpx_distance_km(gpx_file)
+            if distance_km is not None:
+                source = 'gpx'
+                break
+        if source is None:
+            distance_km, source = geodesic_from_coordinates(transportation)
+        Transportation.objects.filter(id=transportation.id).update(distance_km=distance_km, distance_source=source)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adventures', '0079_track_levels'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transportation',
+            name='distance_km',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='transportation',
+            name='distance_source',
+            field=models.CharField(blank=True, choices=[('gpx', 'GPX track'), ('geodesic', 'Geodesic')], editable=False, max_length=10, null=True),
+        ),
+        migrations.RunPython(measure_distances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def reset_user_stats(apps, schema_editor):
+    # Rollup rows created by a write before this release only hold the parts
+    # that write refreshed. Drop them all; each user's row is built in full on
+    # the next read or write.
+    apps.get_model('adventures', 'UserSportStats').objects.all().delete()
+    apps.get_model('adventures', 'UserStats').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('adventures', '0080_transportation_distance'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_user_stats, migrations.RunPython.noop),
+    ]
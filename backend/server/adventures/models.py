@@ -1,12 +1,12 @@
 import os
 import uuid
+from datetime import timedelta
 from django.db import models
 from django.utils.deconstruct import deconstructible
 from adventures.managers import LocationManager
 import threading
 from django.contrib.auth import get_user_model
 from django.contrib.postgres.fields import ArrayField
-from django_resized import ResizedImageField
 from djmoney.models.fields import MoneyField
 from worldtravel.models import City, Country, Region, VisitedCity, VisitedRegion
 from django.core.exceptions import ValidationError
@@ -116,6 +116,11 @@ TRANSPORTATION_TYPES = [
     ('other', 'Other')
 ]
 
+TRANSPORTATION_DISTANCE_SOURCES = [
+    ('gpx', 'GPX track'),
+    ('geodesic', 'Geodesic'),
+]
+
 # Assuming you have a default user ID you want to use
 default_user = 1  # Replace with an actual user ID
 
@@ -328,6 +333,10 @@ class Transportation(models.Model):
     start_code = models.CharField(max_length=100, blank=True, null=True) # Could be airport code, station code, etc.
     end_code = models.CharField(max_length=100, blank=True, null=True)   # Could be airport code, station code, etc.
     to_location = models.CharField(max_length=200, blank=True, null=True)
+    # Measured from a GPX attachment or the coordinates; the source is null
+    # until measured and blank when there was nothing to measure
+    distance_km = models.FloatField(null=True, blank=True, editable=False)
+    distance_source = models.CharField(max_length=10, choices=TRANSPORTATION_DISTANCE_SOURCES, null=True, blank=True, editable=False)
     is_public = models.BooleanField(default=False)
     collection = models.ForeignKey('Collection', on_delete=models.CASCADE, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -348,11 +357,10 @@ class Transportation(models.Model):
                 raise ValidationError('Transportations must be associated with collections owned by the same user. Collection owner: ' + self.collection.user.username + ' Transportation owner: ' + self.user.username)
 
     def delete(self, *args, **kwargs):
-        # Delete all associated images and attachments
+        # Delete all associated images; attachments go with the generic
+        # relation's cascade, which tells their signals the origin
         for image in self.images.all():
             image.delete()
-        for attachment in self.attachments.all():
-            attachment.delete()
         super().delete(*args, **kwargs)
 
     def __str__(self):
@@ -445,19 +453,89 @@ class PathAndRename:
         filename = f"{uuid.uuid4()}.{ext}"
         return os.path.join(self.path, filename)
 
-class ContentImage(models.Model):
+MEDIA_BLOB_KINDS = [
+    ('images', 'Image'),
+    ('attachments', 'Attachment'),
+]
+
+class MediaBlob(models.Model):
+    """Content-addressed file shared by every image or attachment with identical bytes"""
+    id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, primary_key=True)
+    kind = models.CharField(max_length=20, choices=MEDIA_BLOB_KINDS)
+    sha256 = models.CharField(max_length=64)
+    file = models.FileField(max_length=255)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    # GeoJSON of a GPX attachment; blobs never change, so it never goes stale
+    geojson = models.JSONField(null=True, blank=True, editable=False)
+    # The same GeoJSON simplified to each track tolerance level, keyed by meters
+    geojson_levels = models.JSONField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Media Blob"
+        verbose_name_plural = "Media Blobs"
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'sha256'], name='unique_media_blob_per_kind'),
+        ]
+        indexes = [
+            models.Index(fields=["ref_count"]),
+        ]
+
+    def delete(self, *args, **kwargs):
+        if self.file and os.path.isfile(self.file.path):
+            os.remove(self.file.path)
+        if self.kind == 'images':
+            from adventures.utils.renditions import delete_renditions
+            delete_renditions(self.file.name)
+        super().delete(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.file.name} ({self.ref_count} refs)"
+
+class BlobBackedMedia(models.Model):
+    """Shared save/delete handling for models whose file is stored as a MediaBlob"""
+    blob_field_name = None
+    blob_kind = None
+
+    class Meta:
+        abstract = True
+
+    def _stored_blob_id(self):
+        if self._state.adding:
+            return None
+        return type(self).objects.filter(pk=self.pk).values_list('blob_id', flat=True).first()
+
+    def _save_with_blob(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        touches_file = update_fields is None or self.blob_field_name in update_fields
+        previous_blob_id = self._stored_blob_id() if touches_file else None
+        super().save(*args, **kwargs)
+        if touches_file:
+            from adventures.utils.media_blobs import sync_instance_blob
+            sync_instance_blob(self, previous_blob_id=previous_blob_id)
+
+class ContentImage(BlobBackedMedia):
     """Generic image model that can be attached to any content type"""
     id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, default=default_user)
-    image = ResizedImageField(
-        force_format="WEBP",
-        quality=75,
+    # Stored as uploaded; adventures.utils.image_ingest normalizes it to WEBP
+    # in the background while ``processing`` is set
+    image = models.ImageField(
         upload_to=PathAndRename('images/'),
         blank=True,
         null=True,
     )
+    blob = models.ForeignKey(MediaBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='images', editable=False)
     immich_id = models.CharField(max_length=200, null=True, blank=True)
     is_primary = models.BooleanField(default=False)
+    processing = models.BooleanField(default=False)
+    processing_claimed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Tiny inline WEBP (data URI) painted while the image loads
+    placeholder = models.TextField(blank=True, default='', editable=False)
+
+    blob_field_name = 'image'
+    blob_kind = 'images'
     
     # Generic foreign key fields
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='content_images')
@@ -469,6 +547,9 @@ class ContentImage(models.Model):
         verbose_name_plural = "Content Images"
         indexes = [
             models.Index(fields=["content_type", "object_id"]),
+            # Media requests look images up by stored file name
+            models.Index(fields=["image"]),
+            models.Index(fields=["processing"]),
         ]
 
     def clean(self):
@@ -489,24 +570,22 @@ class ContentImage(models.Model):
             self.immich_id = None
             
         self.full_clean()
-        super().save(*args, **kwargs)
-
-    def delete(self, *args, **kwargs):
-        # Remove file from disk when deleting image
-        if self.image and os.path.isfile(self.image.path):
-            os.remove(self.image.path)
-        super().delete(*args, **kwargs)
+        self._save_with_blob(*args, **kwargs)
 
     def __str__(self):
         content_name = getattr(self.content_object, 'name', 'Unknown')
         return f"Image for {self.content_type.model}: {content_name}"
 
-class ContentAttachment(models.Model):
+class ContentAttachment(BlobBackedMedia):
     """Generic attachment model that can be attached to any content type"""
     id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, default=default_user)
     file = models.FileField(upload_to=PathAndRename('attachments/'), validators=[validate_file_extension])
+    blob = models.ForeignKey(MediaBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='attachments', editable=False)
     name = models.CharField(max_length=200, null=True, blank=True)
+
+    blob_field_name = 'file'
+    blob_kind = 'attachments'
     
     # Generic foreign key fields
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, related_name='content_attachments')
@@ -518,12 +597,11 @@ class ContentAttachment(models.Model):
         verbose_name_plural = "Content Attachments"
         indexes = [
             models.Index(fields=["content_type", "object_id"]),
+            models.Index(fields=["file"]),
         ]
 
-    def delete(self, *args, **kwargs):
-        if self.file and os.path.isfile(self.file.path):
-            os.remove(self.file.path)
-        super().delete(*args, **kwargs)
+    def save(self, *args, **kwargs):
+        self._save_with_blob(*args, **kwargs)
 
     def __str__(self):
         content_name = getattr(self.content_object, 'name', 'Unknown')
@@ -640,6 +718,8 @@ class Activity(models.Model):
 
     # GPX File
     gpx_file = models.FileField(upload_to=PathAndRename('activities/'), validators=[validate_file_extension], blank=True, null=True)
+    # GeoJSON of gpx_file and its simplified levels, tagged with the file it was read from
+    gpx_geojson = models.JSONField(null=True, blank=True, editable=False)
 
     # Descriptive
     name = models.CharField(max_length=200)
@@ -785,3 +865,117 @@ class CollectionItineraryItem(models.Model):
                     return value
 
         return None
+
+class UserStats(models.Model):
+    """Per-user rollup of the figures shown on the stats page, kept current by signals"""
+    id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, primary_key=True)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stats_rollup')
+    location_count = models.PositiveIntegerField(default=0)
+    visited_location_count = models.PositiveIntegerField(default=0)
+    # Earliest visit start still in the future; once reached the visited count is stale
+    next_visit_start = models.DateField(null=True, blank=True)
+    collection_count = models.PositiveIntegerField(default=0)
+    visited_city_count = models.PositiveIntegerField(default=0)
+    visited_region_count = models.PositiveIntegerField(default=0)
+    visited_country_count = models.PositiveIntegerField(default=0)
+    activity_count = models.PositiveIntegerField(default=0)
+    total_distance = models.FloatField(default=0)
+    total_moving_time = models.DurationField(default=timedelta)
+    total_elevation_gain = models.FloatField(default=0)
+    total_elevation_loss = models.FloatField(default=0)
+    total_calories = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "User Stats"
+        verbose_name_plural = "User Stats"
+
+    def __str__(self):
+        return f"Stats for {self.user.username}"
+
+class UserSportStats(models.Model):
+    """Per-user, per-sport activity aggregates backing the stats rollup"""
+    id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sport_stats')
+    sport_type = models.CharField(max_length=100, choices=SPORT_TYPE_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+    total_distance = models.FloatField(null=True, blank=True)
+    distance_count = models.PositiveIntegerField(default=0)
+    max_distance = models.FloatField(null=True, blank=True)
+    total_moving_time = models.DurationField(null=True, blank=True)
+    total_elevation_gain = models.FloatField(null=True, blank=True)
+    elevation_gain_count = models.PositiveIntegerField(default=0)
+    max_elevation_gain = models.FloatField(null=True, blank=True)
+    total_elevation_loss = models.FloatField(null=True, blank=True)
+    total_speed = models.FloatField(null=True, blank=True)
+    speed_count = models.PositiveIntegerField(default=0)
+    max_speed = models.FloatField(null=True, blank=True)
+    total_calories = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "User Sport Stats"
+        verbose_name_plural = "User Sport Stats"
+        unique_together = ('user', 'sport_type')
+
+    def __str__(self):
+        return f"{self.sport_type} stats for {self.user.username}"
+
+DATA_JOB_KINDS = [
+    ('backup_export', 'Backup Export'),
+    ('backup_import', 'Backup Import'),
+    ('collection_export', 'Collection Export'),
+    ('collection_import', 'Collection Import'),
+]
+
+DATA_JOB_STATUSES = [
+    ('queued', 'Queued'),
+    ('running', 'Running'),
+    ('succeeded', 'Succeeded'),
+    ('failed', 'Failed'),
+    ('cancelled', 'Cancelled'),
+]
+
+class DataJob(models.Model):
+    """Export or import run by the run_data_jobs worker instead of inside the request"""
+    id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True, primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='data_jobs')
+    kind = models.CharField(max_length=30, choices=DATA_JOB_KINDS)
+    status = models.CharField(max_length=20, choices=DATA_JOB_STATUSES, default='queued')
+    params = models.JSONField(default=dict, blank=True)
+    input_file = models.FileField(upload_to='jobs/', max_length=255, null=True, blank=True)
+    result_file = models.FileField(upload_to='jobs/', max_length=255, null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    progress_current = models.PositiveIntegerField(default=0)
+    progress_total = models.PositiveIntegerField(default=0)
+    cancel_requested = models.BooleanField(default=False)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Touched by the worker while the job runs; a stale heartbeat means the worker died
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Data Job"
+        verbose_name_plural = "Data Jobs"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+        ]
+
+    @property
+    def is_finished(self):
+        return self.status in ('succeeded', 'failed', 'cancelled')
+
+    def delete_files(self):
+        for field_file in (self.input_file, self.result_file):
+            if field_file and os.path.isfile(field_file.path):
+                os.remove(field_file.path)
+
+    def delete(self, *args, **kwargs):
+        self.delete_files()
+        super().delete(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.user.username} ({self.status})"
@@ -1,18 +1,30 @@
 import os
-from .models import Location, ContentImage, ChecklistItem, Collection, Note, Transportation, Checklist, Visit, Category, ContentAttachment, Lodging, CollectionInvite, Trail, Activity, CollectionItineraryItem, CollectionItineraryDay
+from .models import Location, ContentImage, ChecklistItem, Collection, Note, Transportation, Checklist, Visit, Category, ContentAttachment, Lodging, CollectionInvite, Trail, Activity, CollectionItineraryItem, CollectionItineraryDay, DataJob
 from rest_framework import serializers
 from main.utils import CustomModelSerializer
 from users.serializers import CustomUserDetailsSerializer
 from worldtravel.serializers import CountrySerializer, RegionSerializer, CitySerializer
-from geopy.distance import geodesic
 from integrations.models import ImmichIntegration
-from adventures.utils.geojson import gpx_to_geojson
-import gpxpy
+from adventures.utils.geojson import activity_geojson, attachment_geojson
+from adventures.utils.collection_loader import collection_cover_images
+from adventures.utils.jobs import job_progress
+from adventures.utils.media_signing import media_url
+from adventures.utils.renditions import rendition_urls
+from adventures.utils.track_simplify import requested_level
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def track_level(context):
+    """Track simplification asked for with ?tolerance= or ?zoom=, resolved once per response."""
+    if 'track_level' not in context:
+        request = context.get('request')
+        params = getattr(request, 'query_params', getattr(request, 'GET', {}))
+        context['track_level'] = requested_level(params)
+    return context['track_level']
+
+
 def _build_profile_pic_url(user):
     """Return absolute-ish profile pic URL using PUBLIC_URL if available."""
     if not getattr(user, 'profile_pic', None):
@@ -42,14 +54,19 @@ def _serialize_collaborator(user, owner_id=None, request_user=None):
 class ContentImageSerializer(CustomModelSerializer):
     class Meta:
         model = ContentImage
-        fields = ['id', 'image', 'is_primary', 'user', 'immich_id']
-        read_only_fields = ['id', 'user']
+        fields = ['id', 'image', 'is_primary', 'user', 'immich_id', 'processing', 'placeholder']
+        read_only_fields = ['id', 'user', 'processing', 'placeholder']
 
     def to_representation(self, instance):
         # If immich_id is set, check for user integration once
         integration = None
         if instance.immich_id:
-            integration = ImmichIntegration.objects.filter(user=instance.user).first()
+            # Integrations are memoized in the shared context so a list of
+            # images only looks each owner up once
+            integrations = self.context.setdefault('immich_integrations', {})
+            if instance.user_id not in integrations:
+                integrations[instance.user_id] = ImmichIntegration.objects.filter(user_id=instance.user_id).first()
+            integration = integrations[instance.user_id]
             if not integration:
                 return None  # Skip if Immich image but no integration
 
@@ -63,8 +80,16 @@ class ContentImageSerializer(CustomModelSerializer):
             # Use Immich integration URL
             representation['image'] = f"{public_url}/api/integrations/immich/{integration.id}/get/{instance.immich_id}"
         elif instance.image:
-            # Use local image URL
-            representation['image'] = f"{public_url}/media/{instance.image.name}"
+            # Use local image URL, signed so it can be served without a permission check
+            representation['image'] = media_url(public_url, instance.image.name)
+
+        # Smaller sizes for cards and grids, generated on first request. Images
+        # still being processed get theirs from the ingestion pipeline.
+        representation['renditions'] = (
+            rendition_urls(public_url, instance.image.name)
+            if instance.image and not instance.immich_id and not instance.processing
+            else None
+        )
 
         return representation
     
@@ -86,12 +111,12 @@ class AttachmentSerializer(CustomModelSerializer):
             #print(public_url)
             # remove any  ' from the url
             public_url = public_url.replace("'", "")
-            representation['file'] = f"{public_url}/media/{instance.file.name}"
+            representation['file'] = media_url(public_url, instance.file.name)
         return representation
 
     def get_geojson(self, obj):
         if obj.file and obj.file.name.endswith('.gpx'):
-            return gpx_to_geojson(obj.file)
+            return attachment_geojson(obj, track_level(self.context))
         return None
     
 class CategorySerializer(serializers.ModelSerializer):
@@ -118,7 +143,11 @@ class CategorySerializer(serializers.ModelSerializer):
         return instance
     
     def get_num_locations(self, obj):
-        return Location.objects.filter(category=obj, user=obj.user).count()
+        # Precomputed by loaders that serialize many locations at once
+        counts = self.context.get('category_location_counts')
+        if counts is not None and obj.id in counts:
+            return counts[obj.id]
+        return Location.objects.filter(category=obj, user=obj.user_id).count()
     
 class TrailSerializer(CustomModelSerializer):
     provider = serializers.SerializerMethodField()
@@ -217,7 +246,7 @@ class ActivitySerializer(CustomModelSerializer):
         return representation
     
     def get_geojson(self, obj):
-        return gpx_to_geojson(obj.gpx_file)
+        return activity_geojson(obj, track_level(self.context))
 
 class VisitSerializer(serializers.ModelSerializer):
 
@@ -496,9 +525,9 @@ class TransportationSerializer(CustomModelSerializer):
             'is_public', 'collection', 'created_at', 'updated_at', 'end_date',
             'origin_latitude', 'origin_longitude', 'destination_latitude', 'destination_longitude',
             'start_timezone', 'end_timezone', 'distance', 'images', 'attachments', 'start_code', 'end_code',
-            'travel_duration_minutes'
+            'travel_duration_minutes', 'distance_source'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at', 'user', 'distance', 'travel_duration_minutes']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'user', 'distance', 'travel_duration_minutes', 'distance_source']
 
     def get_images(self, obj):
         serializer = ContentImageSerializer(obj.images.all(), many=True, context=self.context)
@@ -511,57 +540,7 @@ class TransportationSerializer(CustomModelSerializer):
         return [attachment for attachment in serializer.data if attachment is not None]
 
     def get_distance(self, obj):
-        gpx_distance = self._get_gpx_distance_km(obj)
-        if gpx_distance is not None:
-            return gpx_distance
-
-        if (
-            obj.origin_latitude and obj.origin_longitude and
-            obj.destination_latitude and obj.destination_longitude
-        ):
-            try:
-                origin = (float(obj.origin_latitude), float(obj.origin_longitude))
-                destination = (float(obj.destination_latitude), float(obj.destination_longitude))
-                return round(geodesic(origin, destination).km, 2)
-            except ValueError:
-                return None
-        return None
-
-    def _get_gpx_distance_km(self, obj):
-        gpx_attachments = obj.attachments.filter(file__iendswith='.gpx')
-        for attachment in gpx_attachments:
-            distance_km = self._parse_gpx_distance_km(attachment.file)
-            if distance_km is not None:
-                return distance_km
-        return None
-
-    def _parse_gpx_distance_km(self, gpx_file_field):
-        try:
-            with gpx_file_field.open('r') as gpx_file:
-                gpx = gpxpy.parse(gpx_file)
-
-            total_meters = 0.0
-
-            for track in gpx.tracks:
-                for segment in track.segments:
-                    segment_length = segment.length_3d() or segment.length_2d()
-                    if segment_length:
-                        total_meters += segment_length
-
-            for route in gpx.routes:
-                route_length = route.length_3d() or route.length_2d()
-                if route_length:
-                    total_meters += route_length
-
-            if total_meters > 0:
-                return round(total_meters / 1000, 2)
-        except Exception as exc:
-            logger.warning(
-                "Failed to calculate GPX distance for file %s: %s",
-                getattr(gpx_file_field, 'name', 'unknown'),
-                exc,
-            )
-        return None
+        return obj.distance_km
 
     def get_travel_duration_minutes(self, obj):
         if not obj.date or not obj.end_date:
@@ -978,33 +957,29 @@ class UltraSlimCollectionSerializer(serializers.ModelSerializer):
         return collaborators
 
     def get_location_images(self, obj):
-        """Get primary images from locations in this collection, optimized with select_related"""
-        # Filter first, then slice (removed slicing)
-        images = list(
-            ContentImage.objects.filter(location__collections=obj)
-            .select_related('user')
-        )
-
-        def sort_key(image):
-            if obj.primary_image and image.id == obj.primary_image.id:
-                return (0, str(image.id))
-            if image.is_primary:
-                return (1, str(image.id))
-            return (2, str(image.id))
-
-        images.sort(key=sort_key)
+        """Get the first few location images, the collection's primary image first"""
+        # List views load every collection on the page with one query
+        covers = self.context.get('collection_cover_images')
+        if covers is None or obj.id not in covers:
+            covers = collection_cover_images([obj])
 
         serializer = ContentImageSerializer(
-            images,
+            covers[obj.id],
             many=True,
-            context={'request': self.context.get('request')}
+            context={
+                'request': self.context.get('request'),
+                'immich_integrations': self.context.setdefault('immich_integrations', {}),
+            }
         )
         # Filter out None values from the serialized data
         return [image for image in serializer.data if image is not None]
 
     def get_location_count(self, obj):
         """Get count of locations in this collection"""
-        # This uses the cached count if available, or does a simple count query
+        # Annotated by collection_list_queryset, otherwise a simple count query
+        location_count = getattr(obj, 'location_count', None)
+        if location_count is not None:
+            return location_count
         return obj.locations.count()
 
     def get_status(self, obj):
@@ -1097,4 +1072,32 @@ class CollectionItineraryItemSerializer(CustomModelSerializer):
             'id': str(obj.item.id),
             'type': obj.content_type.model,
         }
-        
\ No newline at end of file
+        
+
+class DataJobSerializer(serializers.ModelSerializer):
+    progress_current = serializers.SerializerMethodField()
+    progress_total = serializers.SerializerMethodField()
+    status_url = serializers.SerializerMethodField()
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DataJob
+        fields = [
+            'id', 'kind', 'status', 'params', 'result', 'error', 'progress_current', 'progress_total',
+            'cancel_requested', 'created_at', 'started_at', 'finished_at', 'status_url', 'download_url',
+        ]
+        read_only_fields = fields
+
+    def get_progress_current(self, obj):
+        return job_progress(obj)[0]
+
+    def get_progress_total(self, obj):
+        return job_progress(obj)[1]
+
+    def get_status_url(self, obj):
+        return f"/api/jobs/{obj.id}/"
+
+    def get_download_url(self, obj):
+        if obj.status == 'succeeded' and obj.result_file:
+            return f"/api/jobs/{obj.id}/download/"
+        return None
@@ -1,8 +1,22 @@
-from django.db.models.signals import m2m_changed, post_delete
+import os
+
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_save
 from django.dispatch import receiver
+from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 
-from adventures.models import Location
+from adventures.models import (
+    Location, ContentImage, ContentAttachment, Visit, Activity, Collection, Transportation, Note, Checklist, Lodging,
+)
+from adventures.utils.file_permissions import invalidate_media_permissions
+from adventures.utils.media_blobs import release
+from adventures.utils.stats import (
+    activity_snapshot, apply_activity_change, mark_user_data_changed, mark_user_stats_dirty,
+)
+from adventures.utils.transportation_distance import geodesic_from_coordinates, update_distance
+from worldtravel.models import VisitedCity, VisitedRegion
+
+User = get_user_model()
 
 
 @receiver(m2m_changed, sender=Location.collections.through)
@@ -29,6 +43,193 @@ def update_adventure_publicity(sender, instance, action, **kwargs):
                 instance.save(update_fields=['is_public'])
 
 
+@receiver(m2m_changed, sender=Location.collections.through)
+@receiver(m2m_changed, sender=Collection.shared_with.through)
+def sharing_changed_invalidate_media_permissions(sender, action, **kwargs):
+    """Collection membership and sharing decide who may fetch protected media."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_media_permissions()
+
+
+@receiver(post_init, sender=Location)
+@receiver(post_init, sender=Collection)
+@receiver(post_init, sender=Transportation)
+@receiver(post_init, sender=Note)
+@receiver(post_init, sender=Checklist)
+@receiver(post_init, sender=Lodging)
+def remember_loaded_publicity(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred field is not loaded for this
+    instance._loaded_is_public = instance.__dict__.get('is_public')
+
+
+@receiver(post_save, sender=Location)
+@receiver(post_save, sender=Collection)
+@receiver(post_save, sender=Transportation)
+@receiver(post_save, sender=Note)
+@receiver(post_save, sender=Checklist)
+@receiver(post_save, sender=Lodging)
+def publicity_changed_invalidate_media_permissions(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'is_public' not in update_fields):
+        return
+    if getattr(instance, '_loaded_is_public', None) != instance.is_public:
+        invalidate_media_permissions()
+    instance._loaded_is_public = instance.is_public
+
+
+@receiver(post_delete, sender=Collection)
+def collection_deleted_invalidate_media_permissions(sender, instance, **kwargs):
+    # Deleting a collection drops its sharing rows without m2m signals
+    invalidate_media_permissions()
+
+
+@receiver(post_save, sender=ContentImage)
+@receiver(post_delete, sender=ContentImage)
+def immich_image_linked_invalidate_media_permissions(sender, instance, **kwargs):
+    # Who may view a proxied Immich asset depends on what it is attached to
+    if instance.immich_id:
+        invalidate_media_permissions()
+
+
+@receiver(post_delete, sender=ContentImage)
+@receiver(post_delete, sender=ContentAttachment)
+def release_media_blob(sender, instance, **kwargs):
+    """
+    Drop the reference a deleted image/attachment held on its MediaBlob.
+    Runs for cascades and queryset deletes too; unreferenced blobs are
+    removed from disk by the image_cleanup command, while a legacy file
+    owned by the row alone is removed here.
+    """
+    if instance.blob_id:
+        release(instance.blob_id)
+        return
+    field_file = getattr(instance, instance.blob_field_name)
+    if field_file and os.path.isfile(field_file.path):
+        os.remove(field_file.path)
+
+
+TRANSPORTATION_COORDINATE_FIELDS = {
+    'origin_latitude', 'origin_longitude', 'destination_latitude', 'destination_longitude',
+}
+
+
+@receiver(pre_save, sender=Transportation)
+def transportation_saved_measure_distance(sender, instance, update_fields=None, **kwargs):
+    """A distance taken from the coordinates follows them; a GPX distance does not."""
+    if update_fields is not None and not TRANSPORTATION_COORDINATE_FIELDS & set(update_fields):
+        return
+    if instance.distance_source != 'gpx':
+        instance.distance_km, instance.distance_source = geodesic_from_coordinates(instance)
+
+
+@receiver(post_save, sender=ContentAttachment)
+@receiver(post_delete, sender=ContentAttachment)
+def gpx_attachment_changed_measure_distance(sender, instance, origin=None, **kwargs):
+    if not (instance.file and instance.file.name.lower().endswith('.gpx')):
+        return
+    if _is_cascade(instance, origin):
+        # Attachments only cascade from deleting the object they belong to
+        return
+    if instance.content_type_id != ContentType.objects.get_for_model(Transportation).id:
+        return
+    transportation = Transportation.objects.filter(id=instance.object_id).first()
+    if transportation is not None:
+        update_distance(transportation)
+
+
+def _is_cascade(instance, origin):
+    """True when ``instance`` is deleted because something else was."""
+    if origin is None or origin is instance:
+        return False
+    return getattr(origin, 'model', None) is not type(instance)
+
+
+def _is_user_deletion(origin):
+    """True when a delete cascades from removing a user, whose rollup goes away with them."""
+    if isinstance(origin, User):
+        return True
+    return getattr(origin, 'model', None) is User
+
+
+@receiver(post_save, sender=Location)
+def location_saved_update_stats(sender, instance, created, **kwargs):
+    if created:
+        mark_user_stats_dirty(instance.user_id, 'locations')
+    else:
+        # Country/region changes (e.g. from geocoding) affect the timeseries
+        mark_user_data_changed(instance.user_id)
+
+
+@receiver(post_delete, sender=Location)
+def location_deleted_update_stats(sender, instance, origin=None, **kwargs):
+    if not _is_user_deletion(origin):
+        mark_user_stats_dirty(instance.user_id, 'locations', 'visited')
+
+
+@receiver(post_save, sender=Visit)
+@receiver(post_delete, sender=Visit)
+def visit_changed_update_stats(sender, instance, origin=None, **kwargs):
+    if _is_user_deletion(origin):
+        return
+    # Look the owner up by id: on cascades the location may already be gone,
+    # in which case the location delete refreshes the rollup itself.
+    user_id = Location.objects.filter(id=instance.location_id).values_list('user_id', flat=True).first()
+    mark_user_stats_dirty(user_id, 'visited')
+
+
+@receiver(post_init, sender=Activity)
+def remember_loaded_activity_stats(sender, instance, **kwargs):
+    instance._loaded_stats = activity_snapshot(instance)
+
+
+@receiver(post_save, sender=Activity)
+def activity_saved_update_stats(sender, instance, created, **kwargs):
+    new = activity_snapshot(instance)
+    old = None if created else instance._loaded_stats
+    if new is None or (old is None and not created):
+        # Deferred fields leave the delta unknown
+        mark_user_stats_dirty(instance.user_id, 'activities')
+    else:
+        apply_activity_change(old, new)
+    instance._loaded_stats = new
+
+
+@receiver(post_delete, sender=Activity)
+def activity_deleted_update_stats(sender, instance, origin=None, **kwargs):
+    if _is_user_deletion(origin):
+        return
+    old = instance._loaded_stats
+    if old is None:
+        mark_user_stats_dirty(instance.user_id, 'activities')
+    else:
+        apply_activity_change(old, None)
+
+
+@receiver(post_save, sender=Collection)
+def collection_saved_update_stats(sender, instance, created, **kwargs):
+    if created:
+        mark_user_stats_dirty(instance.user_id, 'collections')
+
+
+@receiver(post_delete, sender=Collection)
+def collection_deleted_update_stats(sender, instance, origin=None, **kwargs):
+    if not _is_user_deletion(origin):
+        mark_user_stats_dirty(instance.user_id, 'collections')
+
+
+@receiver(post_save, sender=VisitedCity)
+@receiver(post_delete, sender=VisitedCity)
+def visited_city_changed_update_stats(sender, instance, origin=None, **kwargs):
+    if not _is_user_deletion(origin):
+        mark_user_stats_dirty(instance.user_id, 'cities')
+
+
+@receiver(post_save, sender=VisitedRegion)
+@receiver(post_delete, sender=VisitedRegion)
+def visited_region_changed_update_stats(sender, instance, origin=None, **kwargs):
+    if not _is_user_deletion(origin):
+        mark_user_stats_dirty(instance.user_id, 'regions')
+
+
 @receiver(post_delete)
 def _remove_collection_itinerary_items_on_object_delete(sender, instance, **kwargs):
     """
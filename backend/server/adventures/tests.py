@@ -1,3 +1,878 @@
-from django.test import TestCase
+import io
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import zipfile
+from urllib.parse import parse_qs, urlsplit
+from datetime import timedelta
+from types import SimpleNamespace
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from adventures.models import (
+    Activity, Checklist, ChecklistItem, Collection, CollectionItineraryItem, ContentAttachment, ContentImage, DataJob,
+    Location, MediaBlob, Note, Transportation, UserSportStats, UserStats, Visit,
+)
+from adventures.utils.backup import (
+    backup_archive_chunks, build_backup_export, import_backup_archive, read_backup_data, read_backup_manifest,
+)
+from adventures.utils.backup_chain import restore_backup_chain
+from adventures.serializers import AttachmentSerializer, TransportationSerializer
+from adventures.utils.file_permissions import checkFilePermission
+from adventures.utils.image_ingest import claim_pending_images, finish_image, normalize_image
+from adventures.utils.collection_loader import collection_cover_images
+from adventures.utils.jobs import claim_next_job, run_job
+from adventures.utils.location_matcher import LocationMatchIndex, coords_close, similarity_ratio
+from adventures.utils.media_blobs import file_kwargs_for_bytes, shared_file_kwargs
+from adventures.utils.media_fsck import check_media, collect_dead_blobs, delete_orphans
+from adventures.utils.media_signing import media_url, verify_media_signature
+from adventures.utils.stats import get_user_stats
+from adventures.utils.renditions import RENDITION_SIZES, ensure_rendition, evict_renditions
+from adventures.utils.track_simplify import requested_level, simplify_line
+from integrations.models import ImmichIntegration
+from users.models import CustomUser as User
+from worldtravel import metadata as dataset_metadata
+from worldtravel.models import City, Country, Region, VisitedCity, VisitedRegion
+
+
+class QueryBudgetMixin:
+    def assertQueriesIndependentOfSize(self, build, run, sizes=(1, 8)):
+        """
+        Call ``build(size)`` and then ``run()`` on what it returns for every
+        size, and assert each run issues the same number of queries. Returns
+        the results of the runs so their content can be checked too.
+        """
+        counts = []
+        results = []
+        for size in sizes:
+            subject = build(size)
+            with CaptureQueriesContext(connection) as queries:
+                results.append(run(subject))
+            counts.append(len(queries))
+        self.assertEqual(len(set(counts)), 1, f"Query counts by size: {dict(zip(sizes, counts))}")
+        return results
+
+
+class CollectionRetrieveQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """The full collection view must not issue queries per child row."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='budget', email='budget@example.com', password='password')
+        # Immich images are only serialized for owners with an integration
+        ImmichIntegration.objects.create(user=self.user, server_url='https://immich.example.com', api_key='key')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _build_collection(self, size):
+        collection = Collection.objects.create(user=self.user, name=f'Trip of {size}')
+        location_type = ContentType.objects.get_for_model(Location)
+        transportation_type = ContentType.objects.get_for_model(Transportation)
+        for index in range(size):
+            location = Location.objects.create(user=self.user, name=f'Stop {index}')
+            location.collections.add(collection)
+            visit = Visit.objects.create(location=location, start_date=timezone.now() - timedelta(days=index + 1))
+            Activity.objects.create(user=self.user, visit=visit, name=f'Walk {index}', sport_type='Walk')
+            image = ContentImage.objects.create(
+                user=self.user, content_type=location_type, object_id=location.id,
+                immich_id=f'asset-{size}-{index}',
+            )
+            if index == 0:
+                collection.primary_image = image
+                collection.save(update_fields=['primary_image'])
+            transportation = Transportation.objects.create(
+                user=self.user, collection=collection, type='car', name=f'Drive {index}',
+            )
+            ContentImage.objects.create(
+                user=self.user, content_type=transportation_type, object_id=transportation.id,
+                immich_id=f'ride-{size}-{index}',
+            )
+            Note.objects.create(user=self.user, collection=collection, name=f'Note {index}')
+        return collection
+
+    def _retrieve(self, collection):
+        response = self.client.get(f'/api/collections/{collection.id}/')
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_query_count_does_not_grow_with_collection_size(self):
+        _, data = self.assertQueriesIndependentOfSize(self._build_collection, self._retrieve)
+
+        self.assertEqual((len(data['locations']), len(data['transportations']), len(data['notes'])), (8, 8, 8))
+        collection = Collection.objects.get(id=data['id'])
+        self.assertEqual(data['primary_image']['id'], str(collection.primary_image_id))
+        self.assertEqual(
+            sorted(image['id'] for location in data['locations'] for image in location['images']),
+            sorted(
+                str(pk) for pk in ContentImage.objects.filter(location__collections=collection).values_list('id', flat=True)
+            ),
+        )
+        for location in data['locations']:
+            self.assertEqual(len(location['visits']), 1)
+            self.assertEqual(len(location['visits'][0]['activities']), 1)
+        self.assertTrue(all(len(transportation['images']) == 1 for transportation in data['transportations']))
+
+
+class CollectionDuplicateQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Duplicating a collection must not issue queries per copied row."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cloner', email='cloner@example.com', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _build_collection(self, size):
+        collection = Collection.objects.create(user=self.user, name=f'Trip of {size}')
+        note_type = ContentType.objects.get_for_model(Note)
+        for index in range(size):
+            note = Note.objects.create(user=self.user, collection=collection, name=f'Note {index}')
+            ContentImage.objects.create(
+                user=self.user, content_type=note_type, object_id=note.id, immich_id=f'note-{size}-{index}',
+            )
+            Transportation.objects.create(user=self.user, collection=collection, type='car', name=f'Drive {index}')
+            checklist = Checklist.objects.create(user=self.user, collection=collection, name=f'List {index}')
+            ChecklistItem.objects.create(user=self.user, checklist=checklist, name=f'Item {index}')
+            CollectionItineraryItem.objects.create(
+                collection=collection, content_type=note_type, object_id=note.id, is_global=True, order=index,
+            )
+        return collection
+
+    def _duplicate(self, collection):
+        response = self.client.post(f'/api/collections/{collection.id}/duplicate/')
+        self.assertEqual(response.status_code, 201)
+        return Collection.objects.get(id=response.data['id'])
+
+    def test_duplicate_relinks_itinerary_and_media(self):
+        copy = self._duplicate(self._build_collection(3))
+
+        copied_notes = set(Note.objects.filter(collection=copy).values_list('id', flat=True))
+        self.assertEqual(len(copied_notes), 3)
+        self.assertEqual(
+            set(CollectionItineraryItem.objects.filter(collection=copy).values_list('object_id', flat=True)),
+            copied_notes,
+        )
+        self.assertEqual(ContentImage.objects.filter(object_id__in=copied_notes).count(), 3)
+        self.assertEqual(ChecklistItem.objects.filter(checklist__collection=copy).count(), 3)
+
+    def test_query_count_does_not_grow_with_collection_size(self):
+        _, copy = self.assertQueriesIndependentOfSize(self._build_collection, self._duplicate, sizes=(1, 10))
+        self.assertEqual(Transportation.objects.filter(collection=copy).count(), 10)
+        self.assertEqual(ChecklistItem.objects.filter(checklist__collection=copy).count(), 10)
+
+
+class DataJobTests(TestCase):
+    """Exports and imports run as jobs that can be polled and cancelled."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='jobs', email='jobs@example.com', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Location.objects.create(user=self.user, name='Somewhere')
+
+    def test_backup_export_runs_in_worker(self):
+        response = self.client.get('/api/backup/export/')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], 'queued')
+
+        job = claim_next_job()
+        self.assertEqual(str(job.id), response.data['id'])
+        run_job(job)
+
+        status = self.client.get(response.data['status_url'])
+        self.assertEqual(status.data['status'], 'succeeded')
+        download = self.client.get(status.data['download_url'])
+        self.assertEqual(download.status_code, 200)
+        self.assertTrue(b''.join(download.streaming_content).startswith(b'PK'))
+        DataJob.objects.get(id=job.id).delete()
+
+    def test_cancel_queued_job(self):
+        response = self.client.get('/api/backup/export/')
+        cancelled = self.client.post(f"/api/jobs/{response.data['id']}/cancel/")
+        self.assertEqual(cancelled.data['status'], 'cancelled')
+        self.assertIsNone(claim_next_job())
+
+
+class VisitedRegionStatsTests(TestCase):
+    """Regions and cities marked visited in bulk still refresh the stats rollup."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='marker', email='marker@example.com', password='password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_mark_visited_region_updates_stats(self):
+        country = Country.objects.create(name='Switzerland', country_code='CH')
+        region = Region.objects.create(id='CH-VS', name='Valais', country=country)
+        city = City.objects.create(id='CH-VS-ZER', name='Zermatt', region=region)
+        location = Location.objects.create(user=self.user, name='Matterhorn', region=region, city=city)
+        Visit.objects.create(location=location, start_date=timezone.now() - timedelta(days=1))
+        before = self.client.get(f'/api/stats/counts/{self.user.username}/').data
+        self.assertEqual(before['visited_region_count'], 0)
+
+        response = self.client.post('/api/reverse-geocode/mark_visited_region/')
+        self.assertEqual((response.data['new_regions'], response.data['new_cities']), (1, 1))
+
+        stats = self.client.get(f'/api/stats/counts/{self.user.username}/').data
+        self.assertEqual(
+            (stats['visited_region_count'], stats['visited_city_count'], stats['visited_country_count']), (1, 1, 1),
+        )
+
+
+class MissingStatsRowTests(TestCase):
+    """Writes for a user without a rollup row never leave a partial one."""
+
+    def test_unrelated_write_only_bumps_an_existing_row(self):
+        user = User.objects.create_user(username='editor', email='editor@example.com', password='password')
+        location = Location.objects.create(user=user, name='Bryggen')
+        UserStats.objects.filter(user=user).delete()
+
+        location.name = 'Bryggen i Bergen'
+        location.save()
+        self.assertFalse(UserStats.objects.filter(user=user).exists())
+
+        version = get_user_stats(user).updated_at
+        with CaptureQueriesContext(connection) as queries:
+            location.save()
+        self.assertEqual(
+            [query['sql'].split()[0] for query in queries if 'adventures_userstats' in query['sql']], ['UPDATE'],
+        )
+        self.assertGreater(UserStats.objects.get(user=user).updated_at, version)
+
+    def test_first_write_builds_the_whole_row(self):
+        user = User.objects.create_user(username='upgraded', email='upgraded@example.com', password='password')
+        country = Country.objects.create(name='Norway', country_code='NO')
+        region = Region.objects.create(id='NO-46', name='Vestland', country=country)
+        city = City.objects.create(id='NO-46-BGO', name='Bergen', region=region)
+        collection = Collection.objects.create(user=user, name='Fjords')
+        location = Location.objects.create(user=user, name='Bryggen', region=region, city=city)
+        location.collections.add(collection)
+        visit = Visit.objects.create(location=location, start_date=timezone.now() - timedelta(days=2))
+        Activity.objects.create(user=user, visit=visit, name='Hike', sport_type='Hike', distance=8000.0)
+        VisitedRegion.objects.create(user=user, region=region)
+        VisitedCity.objects.create(user=user, city=city)
+        # As after upgrading: data, but no rollup yet
+        UserSportStats.objects.filter(user=user).delete()
+        UserStats.objects.filter(user=user).delete()
+
+        Location.objects.create(user=user, name='Fløyen')
+
+        client = APIClient()
+        client.force_authenticate(user)
+        stats = client.get(f'/api/stats/counts/{user.username}/').data
+        self.assertEqual(
+            {
+                key: stats[key] for key in (
+                    'location_count', 'visited_location_count', 'trips_count', 'visited_city_count',
+                    'visited_region_count', 'visited_country_count', 'activity_count', 'activity_distance',
+                )
+            },
+            {
+                'location_count': 2, 'visited_location_count': 1, 'trips_count': 1, 'visited_city_count': 1,
+                'visited_region_count': 1, 'visited_country_count': 1, 'activity_count': 1,
+                'activity_distance': 8000.0,
+            },
+        )
+        self.assertEqual(stats['activities_by_category']['walking_hiking']['sports'], {
+            'Hike': {'count': 1, 'total_distance': 8000.0, 'total_elevation_gain': 0},
+        })
+
+
+class DatasetMetadataTests(TestCase):
+    """A dataset rebuild in one process reaches the copies cached by the others."""
+
+    def setUp(self):
+        dataset_metadata._cache.clear()
+
+    def test_rebuild_of_the_same_version_is_picked_up(self):
+        version = settings.COUNTRY_REGION_JSON_VERSION
+        Country.objects.create(name='Iceland', country_code='IS')
+        self.assertEqual(dataset_metadata.get_world_totals()['total_countries'], 1)
+        stale, checked_at = dataset_metadata._cache[version]
+
+        # Another worker imports again with the same version, e.g. after an interruption
+        Country.objects.create(name='Greenland', country_code='GL')
+        dataset_metadata.rebuild_dataset_metadata(version)
+        dataset_metadata._cache[version] = (stale, checked_at)
+        self.assertEqual(dataset_metadata.get_world_totals()['total_countries'], 1)
+
+        dataset_metadata._cache[version] = (stale, checked_at - dataset_metadata.RECHECK_INTERVAL)
+        self.assertEqual(dataset_metadata.get_world_totals()['total_countries'], 2)
+
+
+class ActivityStatsDeltaTests(TestCase):
+    """Activity writes are applied to the rollup without recounting every activity."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='runner', email='runner@example.com', password='password')
+        location = Location.objects.create(user=self.user, name='Track')
+        self.visit = Visit.objects.create(location=location, start_date=timezone.now() - timedelta(days=1))
+        get_user_stats(self.user)
+
+    def test_deltas_match_a_rebuild(self):
+        with CaptureQueriesContext(connection) as queries:
+            run = Activity.objects.create(
+                user=self.user, visit=self.visit, name='Run', sport_type='Run', distance=5000.5,
+                moving_time=timedelta(minutes=30), average_speed=2.8, max_speed=4.1,
+            )
+        self.assertFalse([query for query in queries if 'GROUP BY' in query['sql']])
+        longest = Activity.objects.create(
+            user=self.user, visit=self.visit, name='Long run', sport_type='Run', distance=21100.2, max_speed=5.0,
+        )
+        Activity.objects.create(user=self.user, visit=self.visit, name='Ride', sport_type='Ride', distance=40000.0)
+
+        run.sport_type = 'Walk'
+        run.distance = 3000.1
+        run.save()
+        longest.delete()
+
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((stats.activity_count, round(stats.total_distance, 1)), (2, 43000.1))
+        self.assertEqual(set(UserSportStats.objects.filter(user=self.user).values_list('sport_type', flat=True)), {'Walk', 'Ride'})
+        out = io.StringIO()
+        call_command('rebuild_user_stats', '--verify', stdout=out)
+        self.assertIn('up to date', out.getvalue())
+
+
+class CollectionCoverImageTests(TestCase):
+    """Cover images are ranked per collection, also for locations in several collections."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='covers', email='covers@example.com', password='password')
+        self.location_type = ContentType.objects.get_for_model(Location)
+
+    def _images(self, location, count, prefix):
+        return [
+            ContentImage.objects.create(
+                user=self.user, content_type=self.location_type, object_id=location.id, immich_id=f'{prefix}-{index}',
+            )
+            for index in range(count)
+        ]
+
+    def test_shared_location_and_limit(self):
+        alps = Collection.objects.create(user=self.user, name='Alps')
+        lakes = Collection.objects.create(user=self.user, name='Lakes')
+        shared = Location.objects.create(user=self.user, name='Lucerne')
+        shared.collections.add(alps, lakes)
+        summit = Location.objects.create(user=self.user, name='Eiger')
+        summit.collections.add(alps)
+
+        shared_images = sorted(self._images(shared, 4, 'lucerne'), key=lambda image: image.id)
+        summit_images = self._images(summit, 3, 'eiger')
+        marked = summit_images[2]
+        ContentImage.objects.filter(id=marked.id).update(is_primary=True)
+        alps.primary_image = summit_images[1]
+        alps.save()
+
+        covers = collection_cover_images([alps, lakes])
+
+        self.assertEqual(len(covers[alps.id]), 5)
+        self.assertEqual([image.id for image in covers[alps.id][:2]], [summit_images[1].id, marked.id])
+        rest = sorted(shared_images + [summit_images[0]], key=lambda image: image.id)[:3]
+        self.assertEqual([image.id for image in covers[alps.id][2:]], [image.id for image in rest])
+        self.assertEqual([image.id for image in covers[lakes.id]], [image.id for image in shared_images])
+
+
+class LocationMatchIndexTests(SimpleTestCase):
+    """Blocking candidates finds the same match as scoring every location."""
+
+    @staticmethod
+    def _linear_match(locations, name, location_text, latitude, longitude):
+        best_match, best_score = None, 0.0
+        for candidate in locations:
+            name_score = similarity_ratio(name, candidate.name)
+            loc_text_score = similarity_ratio(location_text, candidate.location)
+            close = coords_close(latitude, longitude, candidate.latitude, candidate.longitude)
+            score = max(name_score, (name_score + loc_text_score) / 2.0)
+            if close:
+                score = max(score, name_score + 0.1)
+            if score > best_score and (name_score >= 0.92 or (name_score >= 0.85 and (loc_text_score >= 0.85 or close))):
+                best_match, best_score = candidate, score
+        return best_match
+
+    def test_matches_linear_scan(self):
+        rng = random.Random(34)
+        words = ['lake', 'mount', 'old town', 'harbour', 'castle', 'bridge', 'market', 'falls', 'museum', 'park']
+        locations = []
+        for index in range(300):
+            name = f'{rng.choice(words)} {rng.choice(words)} {index % 40}'
+            locations.append(SimpleNamespace(
+                name=name.title(), location=f'{rng.choice(words)} district',
+                latitude=46 + rng.uniform(-0.5, 0.5), longitude=7 + rng.uniform(-0.5, 0.5),
+            ))
+        index = LocationMatchIndex(locations)
+
+        for source in rng.sample(locations, 80):
+            # Typos, case and spacing changes, and a few metres to a few kilometres off
+            name = list(source.name)
+            name[rng.randrange(len(name))] = rng.choice('abcdefghij ')
+            queries = [
+                (''.join(name), source.location, source.latitude + 0.005, source.longitude - 0.005),
+                (f'  {source.name.upper()} ', None, None, None),
+                (source.name[:-1], 'elsewhere', source.latitude + rng.uniform(-0.03, 0.03), source.longitude),
+            ]
+            for query in queries:
+                self.assertIs(index.find_match(*query), self._linear_match(locations, *query))
+
+
+class BackupDataMixin:
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter', email='exporter@example.com', password='password')
+
+    def _add_trip(self, index):
+        collection = Collection.objects.create(user=self.user, name=f'Trip {index}')
+        location = Location.objects.create(user=self.user, name=f'Stop {index}')
+        location.collections.add(collection)
+        visit = Visit.objects.create(location=location, start_date=timezone.now() - timedelta(days=index + 1))
+        Activity.objects.create(user=self.user, visit=visit, name=f'Walk {index}', sport_type='Walk')
+        checklist = Checklist.objects.create(user=self.user, collection=collection, name=f'List {index}')
+        ChecklistItem.objects.create(user=self.user, checklist=checklist, name=f'Item {index}')
+        note = Note.objects.create(user=self.user, collection=collection, name=f'Note {index}')
+        CollectionItineraryItem.objects.create(
+            collection=collection, content_type=ContentType.objects.get_for_model(Note), object_id=note.id,
+            is_global=True, order=index,
+        )
+
+
+class BackupExportQueryBudgetTests(BackupDataMixin, QueryBudgetMixin, TestCase):
+    """Building data.json must not issue queries per exported row."""
+
+    def _add_trips(self, count):
+        for index in range(Collection.objects.filter(user=self.user).count(), count):
+            self._add_trip(index)
+        return self.user
+
+    def test_query_count_does_not_grow_with_account_size(self):
+        _, export_data = self.assertQueriesIndependentOfSize(self._add_trips, build_backup_export)
+
+        def names(section):
+            return sorted(entry['name'] for entry in export_data[section])
+
+        for section, model in (
+            ('collections', Collection), ('locations', Location), ('notes', Note), ('checklists', Checklist),
+        ):
+            self.assertEqual(names(section), sorted(model.objects.filter(user=self.user).values_list('name', flat=True)))
+        self.assertEqual(
+            sorted(
+                activity['name'] for location in export_data['locations']
+                for visit in location['visits'] for activity in visit['activities']
+            ),
+            sorted(Activity.objects.filter(user=self.user).values_list('name', flat=True)),
+        )
+        self.assertEqual(
+            sorted(item['name'] for checklist in export_data['checklists'] for item in checklist['items']),
+            sorted(ChecklistItem.objects.filter(user=self.user).values_list('name', flat=True)),
+        )
+        self.assertEqual(len(export_data['itinerary_items']), 8)
+        self.assertEqual(
+            {item['item_reference'] for item in export_data['itinerary_items']},
+            {note['export_id'] for note in export_data['notes']},
+        )
+        self.assertEqual(
+            sorted(export_id for loc in export_data['locations'] for export_id in loc['collection_export_ids']),
+            sorted(str(pk) for pk in Collection.objects.filter(user=self.user).values_list('id', flat=True)),
+        )
+
+
+class BackupRestoreTests(BackupDataMixin, TestCase):
+    """A backup restored over the same account recreates every row and link."""
+
+    def test_round_trip_keeps_links(self):
+        for index in range(3):
+            self._add_trip(index)
+        archive = io.BytesIO(b''.join(backup_archive_chunks(self.user)))
+        summary = import_backup_archive(archive, self.user)
+
+        self.assertEqual(summary['locations'], 3)
+        self.assertEqual(summary['itinerary_items'], 3)
+        self.assertEqual(Location.objects.filter(user=self.user, collections__user=self.user).count(), 3)
+        self.assertEqual(ChecklistItem.objects.filter(checklist__collection__user=self.user).count(), 3)
+        self.assertEqual(Activity.objects.filter(visit__location__user=self.user).count(), 3)
+
+    def test_format_1_archive_still_restores(self):
+        for index in range(2):
+            self._add_trip(index)
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zip_file:
+            zip_file.writestr('data.json', json.dumps(build_backup_export(self.user)))
+        archive.seek(0)
+        summary = import_backup_archive(archive, self.user)
+
+        self.assertEqual(summary['locations'], 2)
+        self.assertEqual(Location.objects.filter(user=self.user, collections__user=self.user).count(), 2)
+
+
+class IncrementalBackupTests(BackupDataMixin, TestCase):
+    """An incremental backup holds only the changes, and its chain restores the latest state."""
+
+    def test_chain_restores_latest_state(self):
+        for index in range(2):
+            self._add_trip(index)
+        full = io.BytesIO(b''.join(backup_archive_chunks(self.user)))
+
+        renamed = Location.objects.get(user=self.user, name='Stop 0')
+        renamed.name = 'Renamed stop'
+        renamed.save()
+        removed = Note.objects.get(user=self.user, name='Note 1')
+        removed.delete()
+        self._add_trip(2)
+
+        incremental = io.BytesIO(b''.join(backup_archive_chunks(self.user, parent=read_backup_manifest(full))))
+        with zipfile.ZipFile(incremental) as zip_file:
+            data = read_backup_data(zip_file)
+            self.assertEqual(sorted(loc['name'] for loc in data['locations']), ['Renamed stop', 'Stop 2'])
+            self.assertEqual(data['tombstones']['notes'], [str(removed.id)])
+
+        full.seek(0)
+        incremental.seek(0)
+        summary = restore_backup_chain([full, incremental], self.user)
+        self.assertEqual(summary['locations'], 3)
+        self.assertEqual(
+            sorted(Location.objects.filter(user=self.user).values_list('name', flat=True)),
+            ['Renamed stop', 'Stop 1', 'Stop 2'],
+        )
+        self.assertEqual(
+            sorted(Note.objects.filter(user=self.user).values_list('name', flat=True)), ['Note 0', 'Note 2']
+        )
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ImageRenditionTests(SimpleTestCase):
+    """Renditions are made on first use and evicted least recently used first."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        os.makedirs(os.path.join(self.media_root, 'images'))
+        for name in ('first.webp', 'second.webp'):
+            Image.new('RGB', (2400, 1600), 'teal').save(os.path.join(self.media_root, 'images', name))
+
+    def test_rendition_is_resized_and_evicted(self):
+        with self.settings(MEDIA_ROOT=self.media_root, RENDITION_CACHE_MAX_BYTES=10 ** 9):
+            first = ensure_rendition('images/first.webp', 'medium', 'webp')
+            second = ensure_rendition('images/second.webp', 'medium', 'webp')
+            with Image.open(os.path.join(self.media_root, first)) as rendition:
+                self.assertEqual(max(rendition.size), RENDITION_SIZES['medium'])
+
+            os.utime(os.path.join(self.media_root, first), (0, 0))
+            total = sum(os.path.getsize(os.path.join(self.media_root, name)) for name in (first, second))
+            evict_renditions(max_bytes=total - 1)
+            self.assertFalse(os.path.exists(os.path.join(self.media_root, first)))
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, second)))
+
+
+@override_settings(MEDIA_SIGNING_KEY='test-key', MEDIA_URL_TTL=3600)
+class SignedMediaUrlTests(SimpleTestCase):
+    """Signed media URLs verify until they expire and only for their own path."""
+
+    def _signature(self, url):
+        query = parse_qs(urlsplit(url).query)
+        return query['md5'][0], query['expires'][0]
+
+    def test_signature_round_trip(self):
+        url = media_url('http://example.com', 'images/abc.webp')
+        signature, expires = self._signature(url)
+        self.assertGreater(int(expires), time.time() + 3600 - 1)
+        self.assertTrue(verify_media_signature('images/abc.webp', signature, expires))
+        self.assertFalse(verify_media_signature('images/other.webp', signature, expires))
+        self.assertFalse(verify_media_signature('images/abc.webp', signature, str(int(time.time()) - 1)))
+
+    def test_job_archives_are_never_signed(self):
+        self.assertEqual(media_url('http://example.com', 'jobs/abc.zip'), 'http://example.com/media/jobs/abc.zip')
+        with self.settings(MEDIA_SIGNING_KEY=''):
+            self.assertEqual(
+                media_url('http://example.com', 'images/abc.webp'), 'http://example.com/media/images/abc.webp'
+            )
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class MediaBlobTests(TestCase):
+    """Identical files share one refcounted blob on disk."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.owner = User.objects.create_user(username='blobs', email='blobs@example.com', password='password')
+        self.friend = User.objects.create_user(username='viewer', email='viewer@example.com', password='password')
+        self.location = Location.objects.create(user=self.owner, name='Private cove')
+        self.location_type = ContentType.objects.get_for_model(Location)
+
+    def _attach(self, location, **kwargs):
+        kwargs.setdefault('file', ContentFile(b'%PDF-1.4 itinerary', name='plan.pdf'))
+        return ContentAttachment.objects.create(
+            user=self.owner, content_type=self.location_type, object_id=location.id, **kwargs,
+        )
+
+    def test_identical_uploads_share_one_blob(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            first = self._attach(self.location)
+            second = self._attach(self.location, file=ContentFile(b'%PDF-1.4 itinerary', name='copy.pdf'))
+
+            self.assertEqual(first.blob_id, second.blob_id)
+            self.assertEqual(first.file.name, second.file.name)
+            self.assertEqual(MediaBlob.objects.get(id=first.blob_id).ref_count, 2)
+            self.assertEqual(os.listdir(os.path.join(self.media_root, 'attachments')), [os.path.basename(first.file.name)])
+
+    def test_file_is_removed_only_without_references(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            original = self._attach(self.location)
+            copy = self._attach(self.location, **shared_file_kwargs(original))
+            blob = MediaBlob.objects.get(id=original.blob_id)
+            self.assertEqual(blob.ref_count, 2)
+
+            original.delete()
+            blob.refresh_from_db()
+            self.assertEqual(blob.ref_count, 1)
+            self.assertEqual(collect_dead_blobs(check_media()), 0)
+            self.assertTrue(os.path.exists(blob.file.path))
+
+            copy.delete()
+            blob.refresh_from_db()
+            self.assertEqual(blob.ref_count, 0)
+            self.assertEqual(collect_dead_blobs(check_media()), 1)
+            self.assertFalse(os.path.exists(blob.file.path))
+            self.assertFalse(MediaBlob.objects.filter(id=blob.id).exists())
+
+    def test_any_row_sharing_the_file_grants_access(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            private = self._attach(self.location)
+            unshared = self._attach(self.location, file=ContentFile(b'%PDF-1.4 budget', name='budget.pdf'))
+            public_location = Location.objects.create(user=self.owner, name='Public pier', is_public=True)
+            self._attach(public_location, **shared_file_kwargs(private))
+
+            self.assertTrue(checkFilePermission(private.file.name.split('/', 1)[1], self.friend, 'attachments/'))
+            self.assertFalse(checkFilePermission(unshared.file.name.split('/', 1)[1], self.friend, 'attachments/'))
+
+
+class MediaPermissionCacheTests(TestCase):
+    """Cached media permission decisions are dropped when sharing or publicity changes."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', email='owner@example.com', password='password')
+        self.friend = User.objects.create_user(username='friend', email='friend@example.com', password='password')
+        self.collection = Collection.objects.create(user=self.owner, name='Private trip')
+        self.location = Location.objects.create(user=self.owner, name='Hidden beach')
+        self.location.collections.add(self.collection)
+        ContentAttachment.objects.create(
+            user=self.owner, file='attachments/plan.pdf',
+            content_type=ContentType.objects.get_for_model(Location), object_id=self.location.id,
+        )
+
+    def test_decision_is_cached_until_sharing_changes(self):
+        self.assertFalse(checkFilePermission('plan.pdf', self.friend, 'attachments/'))
+        with self.assertNumQueries(0):
+            self.assertFalse(checkFilePermission('plan.pdf', self.friend, 'attachments/'))
+
+        self.collection.shared_with.add(self.friend)
+        self.assertTrue(checkFilePermission('plan.pdf', self.friend, 'attachments/'))
+
+    def test_publicity_flip_drops_cached_decision(self):
+        self.location.collections.clear()
+        self.assertFalse(checkFilePermission('plan.pdf', self.friend, 'attachments/'))
+
+        location = Location.objects.get(id=self.location.id)
+        location.is_public = True
+        location.save()
+        self.assertTrue(checkFilePermission('plan.pdf', self.friend, 'attachments/'))
+
+
+class MediaFsckTests(TestCase):
+    """The media check finds unused files and rows whose file is missing."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        os.makedirs(os.path.join(self.media_root, 'images', 'legacy'))
+        self.user = User.objects.create_user(username='fsck', email='fsck@example.com', password='password')
+        location = Location.objects.create(user=self.user, name='Lighthouse')
+        self.image = ContentImage.objects.create(
+            user=self.user, content_type=ContentType.objects.get_for_model(Location), object_id=location.id,
+            immich_id='asset-fsck',
+        )
+        ContentImage.objects.filter(id=self.image.id).update(image='images/missing.webp', immich_id=None)
+
+    def _write(self, name, age):
+        path = os.path.join(self.media_root, name)
+        with open(path, 'wb') as f:
+            f.write(b'orphan')
+        os.utime(path, (time.time() - age, time.time() - age))
+        return path
+
+    def test_reports_and_deletes_orphans(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            orphan = self._write('images/legacy/orphan.webp', age=7200)
+            recent = self._write('images/recent.webp', age=0)
+
+            report = check_media(workers=2)
+            self.assertEqual(report.orphans, [('images/legacy/orphan.webp', 6)])
+            self.assertEqual(report.recent_files, 1)
+            self.assertEqual(report.missing, [('adventures.ContentImage', self.image.id, 'images/missing.webp')])
+            self.assertEqual(report.directories['images'], {'files': 2, 'bytes': 12})
+
+            self.assertEqual(delete_orphans(report, batch_size=1), 1)
+            self.assertFalse(os.path.exists(orphan))
+            self.assertTrue(os.path.exists(recent))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ImageIngestionTests(TestCase):
+    """Uploads are stored as-is and normalized to WEBP outside the request."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.user = User.objects.create_user(username='ingest', email='ingest@example.com', password='password')
+        self.location = Location.objects.create(user=self.user, name='Harbour')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _upload(self):
+        upload = io.BytesIO()
+        Image.new('RGB', (3000, 2000), 'navy').save(upload, 'JPEG')
+        upload.name = 'photo.jpg'
+        upload.seek(0)
+        response = self.client.post('/api/images/', {
+            'image': upload, 'content_type': 'location', 'object_id': str(self.location.id),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        return response
+
+    def _process_pending(self):
+        [(blob_id, name)] = claim_pending_images(2)
+        self.assertEqual(claim_pending_images(2), [])
+        finish_image(blob_id, normalize_image(os.path.join(self.media_root, name), self.media_root, ('webp',)))
+
+    def test_upload_is_processed_in_background(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            response = self._upload()
+            self.assertTrue(response.data['processing'])
+            image = ContentImage.objects.get(id=response.data['id'])
+            original_blob_id = image.blob_id
+
+            self._process_pending()
+
+            image.refresh_from_db()
+            self.assertFalse(image.processing)
+            self.assertTrue(image.placeholder.startswith('data:image/webp;base64,'))
+            with Image.open(image.image.path) as stored:
+                self.assertEqual((stored.format, stored.size), ('WEBP', (1620, 1080)))
+            self.assertFalse(MediaBlob.objects.filter(id=original_blob_id).exists())
+
+    def test_duplicate_while_processing_is_normalized_too(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            original_blob_id = ContentImage.objects.get(id=self._upload().data['id']).blob_id
+            response = self.client.post(f'/api/locations/{self.location.id}/duplicate/')
+            self.assertEqual(response.status_code, 201)
+            self.assertTrue(ContentImage.objects.get(object_id=response.data['id']).processing)
+
+            self._process_pending()
+
+            images = ContentImage.objects.all()
+            self.assertEqual(len(images), 2)
+            self.assertFalse(any(image.processing for image in images))
+            self.assertEqual(len({image.blob_id for image in images}), 1)
+            self.assertEqual(images[0].blob.ref_count, 2)
+            self.assertFalse(MediaBlob.objects.filter(id=original_blob_id).exists())
+
+
+GPX_TRACK = b"""<?xml version="1.0"?>
+<gpx version="1.1" creator="test"><trk><name>Ridge</name><trkseg>
+<trkpt lat="46.0" lon="7.0"></trkpt><trkpt lat="46.1" lon="7.1"></trkpt><trkpt lat="46.2" lon="7.3"></trkpt>
+</trkseg></trk></gpx>"""
+
+
+class GpxGeojsonTests(TestCase):
+    """GPX attachments are converted to GeoJSON once per stored file."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.user = User.objects.create_user(username='gpx', email='gpx@example.com', password='password')
+        self.location = Location.objects.create(user=self.user, name='Ridge walk')
+
+    def test_geojson_is_stored_on_the_blob(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            attachment = ContentAttachment.objects.create(
+                user=self.user, content_type=ContentType.objects.get_for_model(Location),
+                object_id=self.location.id, **file_kwargs_for_bytes('attachments', 'file', GPX_TRACK, 'ridge.gpx'),
+            )
+            geojson = AttachmentSerializer(attachment).data['geojson']
+            self.assertEqual(len(geojson['features'][0]['geometry']['coordinates']), 3)
+
+            os.remove(attachment.file.path)
+            attachment = ContentAttachment.objects.select_related('blob').get(id=attachment.id)
+            with self.assertNumQueries(0):
+                self.assertEqual(AttachmentSerializer(attachment).data['geojson'], geojson)
+
+
+class TransportationDistanceTests(TestCase):
+    """Transportation distances are measured on change and read from the row."""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.user = User.objects.create_user(username='train', email='train@example.com', password='password')
+        self.transportation = Transportation.objects.create(
+            user=self.user, type='train', name='Valley line',
+            origin_latitude=46.0, origin_longitude=7.0, destination_latitude=46.2, destination_longitude=7.3,
+        )
+
+    def test_gpx_attachment_replaces_geodesic_distance(self):
+        self.assertEqual(self.transportation.distance_source, 'geodesic')
+        geodesic_km = self.transportation.distance_km
+
+        with self.settings(MEDIA_ROOT=self.media_root):
+            attachment = ContentAttachment.objects.create(
+                user=self.user, content_type=ContentType.objects.get_for_model(Transportation),
+                object_id=self.transportation.id, **file_kwargs_for_bytes('attachments', 'file', GPX_TRACK, 'line.gpx'),
+            )
+            self.transportation.refresh_from_db()
+            self.assertEqual(self.transportation.distance_source, 'gpx')
+            self.assertGreater(self.transportation.distance_km, geodesic_km)
+
+            with self.assertNumQueries(0):
+                self.assertEqual(TransportationSerializer().get_distance(self.transportation), self.transportation.distance_km)
+
+            attachment.delete()
+        self.transportation.refresh_from_db()
+        self.assertEqual((self.transportation.distance_km, self.transportation.distance_source), (geodesic_km, 'geodesic'))
+
+    def test_deleting_transportation_does_not_measure_it_again(self):
+        with self.settings(MEDIA_ROOT=self.media_root):
+            ContentAttachment.objects.create(
+                user=self.user, content_type=ContentType.objects.get_for_model(Transportation),
+                object_id=self.transportation.id, **file_kwargs_for_bytes('attachments', 'file', GPX_TRACK, 'line.gpx'),
+            )
+            with CaptureQueriesContext(connection) as queries:
+                Transportation.objects.get(id=self.transportation.id).delete()
+        self.assertFalse(ContentAttachment.objects.exists())
+        self.assertFalse([query for query in queries if query['sql'].startswith('UPDATE "adventures_transportation"')])
+
+
+class TrackSimplifyTests(SimpleTestCase):
+    """Tracks are simplified to every tolerance level in one pass."""
+
+    def test_levels_keep_fewer_points(self):
+        # A zigzag about 11m either side of a straight line east
+        coords = [[7.0 + i * 0.001, 46.0 + (0.0001 if i % 2 else 0)] for i in range(101)]
+        levels = simplify_line(coords)
+        self.assertEqual(levels[2], coords)
+        self.assertEqual(levels[32], [coords[0], coords[-1]])
+        self.assertGreaterEqual(len(levels[8]), len(levels[32]))
+
+    def test_requested_level(self):
+        self.assertEqual(requested_level({}), 2)
+        self.assertIsNone(requested_level({'tolerance': '0'}))
+        self.assertEqual(requested_level({'tolerance': '50'}), 32)
+        self.assertEqual(requested_level({'zoom': '3'}), 512)
+        self.assertEqual(requested_level({'zoom': 'street'}), 2)
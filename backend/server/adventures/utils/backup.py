@@ -0,0 +1,231 @@
+"""
+Full-account backup export and restore.
+
+A backup is a ZIP archive holding all of a user's records plus the images,
+attachments and activity GPX files they reference. Export and restore are
+plain functions of a user so they can run inside a request or in a background
+job (see ``adventures.utils.jobs``).
+
+Format 2 archives keep a small ``header.json`` and one newline-delimited JSON
+member per section (``data/<section>.ndjson``), so both export and restore
+handle one record at a time. Format 1 archives, a single ``data.json`` with
+every section, are still restored.
+
+Every archive also holds ``manifest.json`` describing the backed up state. A
+backup made against the manifest of an earlier one is incremental: it only
+carries what changed since, and is restored together with the backups before
+it (see ``adventures.utils.backup_chain``).
+"""
+import io
+import json
+import zipfile
+from collections import defaultdict
+from datetime import datetime
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from adventures.models import CollectionItineraryItem
+from adventures.utils.backup_export import SECTION_KEYS, BackupExporter
+from adventures.utils.backup_restore import BackupRestorer
+from adventures.utils.stats import defer_user_stats
+from adventures.utils.zip_stream import ZipStream
+
+
+BACKUP_FORMAT = 2
+HEADER_NAME = 'header.json'
+MANIFEST_NAME = 'manifest.json'
+TOMBSTONES_NAME = 'data/tombstones.ndjson'
+
+
+class BackupError(Exception):
+    """The uploaded file is not a usable backup archive."""
+
+
+def build_backup_export(user):
+    """Return the format 1 ``data.json`` structure for all of ``user``'s data."""
+    return BackupExporter(user).build()
+
+
+def backup_media_entries(user):
+    """Return ``(archive name, storage name)`` for every file in a backup of ``user``."""
+    return BackupExporter(user).media_entries()
+
+
+def section_member(name):
+    return f'data/{name}.ndjson'
+
+
+def backup_archive_chunks(user, progress=None, parent=None):
+    """
+    Yield the backup ZIP of ``user`` chunk by chunk. Given ``parent``, the
+    manifest of an earlier backup, the archive is incremental on top of it.
+    """
+    exporter = BackupExporter(user)
+
+    archive = ZipStream()
+    header = {'format': BACKUP_FORMAT, **exporter.header(parent), 'sections': list(SECTION_KEYS)}
+    yield from archive.write_json(HEADER_NAME, header, indent=2)
+    for name, entries in exporter.changed_sections(parent):
+        yield from archive.write_ndjson(section_member(name), entries)
+    if parent:
+        yield from archive.write_ndjson(TOMBSTONES_NAME, exporter.tombstones(parent))
+    yield from archive.write_json(MANIFEST_NAME, exporter.manifest(parent))
+
+    media_entries = exporter.changed_media_entries(parent)
+    for index, (arcname, storage_name) in enumerate(media_entries):
+        yield from archive.write_storage_file(arcname, storage_name, default_storage)
+        if progress:
+            progress(index + 1, len(media_entries))
+    yield from archive.close()
+
+
+def backup_filename(user, incremental=False):
+    suffix = '_incremental' if incremental else ''
+    return f"adventurelog_backup_{user.username}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}.zip"
+
+
+class BackupSection:
+    """
+    One section of a format 2 archive. Every iteration reads the member
+    again, decoding one line at a time, so a section can be walked by
+    several restore phases without being held in memory.
+    """
+
+    def __init__(self, zip_file, member):
+        self.zip_file = zip_file
+        self.member = member
+
+    def __iter__(self):
+        with self.zip_file.open(self.member) as raw:
+            for line in io.TextIOWrapper(raw, encoding='utf-8'):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    raise BackupError(f'Invalid JSON in {self.member}')
+
+
+def read_backup_data(zip_file):
+    """
+    Return the backup data of an opened archive as a dict of the header
+    fields and one iterable of entries per section.
+    """
+    members = set(zip_file.namelist())
+    if HEADER_NAME not in members:
+        if 'data.json' not in members:
+            raise BackupError('Invalid backup file - missing header.json or data.json')
+        try:
+            return json.loads(zip_file.read('data.json').decode('utf-8'))
+        except json.JSONDecodeError:
+            raise BackupError('Invalid JSON in backup file')
+
+    try:
+        header = json.loads(zip_file.read(HEADER_NAME).decode('utf-8'))
+    except json.JSONDecodeError:
+        raise BackupError('Invalid JSON in backup file')
+    if header.get('format', 0) > BACKUP_FORMAT:
+        raise BackupError('The backup was made by a newer version of AdventureLog')
+
+    backup_data = dict(header)
+    for name in SECTION_KEYS:
+        member = section_member(name)
+        backup_data[name] = BackupSection(zip_file, member) if member in members else []
+    if TOMBSTONES_NAME in members:
+        tombstones = defaultdict(list)
+        for row in BackupSection(zip_file, TOMBSTONES_NAME):
+            tombstones[row['section']].append(row['key'])
+        backup_data['tombstones'] = dict(tombstones)
+    return backup_data
+
+
+def _parse_manifest(raw):
+    try:
+        manifest = json.loads(raw)
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise BackupError('Invalid backup manifest')
+    if not isinstance(manifest, dict) or not {'backup_id', 'entities', 'media'} <= manifest.keys():
+        raise BackupError('Invalid backup manifest')
+    return manifest
+
+
+def read_zip_manifest(zip_file):
+    """Return the manifest of an opened backup archive."""
+    if MANIFEST_NAME not in zip_file.namelist():
+        raise BackupError('The backup has no manifest; make a new full backup first')
+    return _parse_manifest(zip_file.read(MANIFEST_NAME))
+
+
+def read_backup_manifest(source):
+    """
+    Return the manifest of a backup archive, or of a bare ``manifest.json``.
+    ``source`` is a path or a file object.
+    """
+    if zipfile.is_zipfile(source):
+        try:
+            with zipfile.ZipFile(source, 'r') as zip_file:
+                return read_zip_manifest(zip_file)
+        except zipfile.BadZipFile:
+            raise BackupError('Invalid backup file - not a ZIP archive')
+    if hasattr(source, 'read'):
+        source.seek(0)
+        return _parse_manifest(source.read())
+    with open(source, 'rb') as manifest_file:
+        return _parse_manifest(manifest_file.read())
+
+
+def clear_user_data(user):
+    """Clear all existing user data before import"""
+    # Delete itinerary items first (they reference collections and content)
+    CollectionItineraryItem.objects.filter(collection__user=user).delete()
+    
+    # Delete in reverse order of dependencies
+    user.activity_set.all().delete()  # Delete activities first
+    user.trail_set.all().delete()     # Delete trails
+    user.checklistitem_set.all().delete()
+    user.checklist_set.all().delete()
+    user.note_set.all().delete()
+    user.transportation_set.all().delete()
+    user.lodging_set.all().delete()
+    
+    # Delete location-related data
+    user.contentimage_set.all().delete()
+    user.contentattachment_set.all().delete()
+    # Visits are deleted via cascade when locations are deleted
+    user.location_set.all().delete()
+    
+    # Delete collections and categories last
+    user.collection_set.all().delete()
+    user.category_set.all().delete()
+
+    # Clear visited cities and regions
+    user.visitedcity_set.all().delete()
+    user.visitedregion_set.all().delete()
+
+
+def import_backup_data(backup_data, zip_file, user, progress=None):
+    """Import backup data and return summary"""
+    return BackupRestorer(backup_data, zip_file, user, progress=progress).run()
+
+
+def import_backup_archive(archive, user, progress=None):
+    """
+    Replace all of ``user``'s data with the contents of a backup archive (a
+    path or file object) and return the import summary.
+    """
+    try:
+        with zipfile.ZipFile(archive, 'r') as zip_file:
+            backup_data = read_backup_data(zip_file)
+            if backup_data.get('parent_backup_id'):
+                raise BackupError(
+                    'This is an incremental backup; restore it together with the backups it builds on'
+                )
+
+            # Import with transaction; the stats rollup is refreshed once at the end
+            with transaction.atomic(), defer_user_stats():
+                # Clear existing data first
+                clear_user_data(user)
+                return import_backup_data(backup_data, zip_file, user, progress=progress)
+    except zipfile.BadZipFile:
+        raise BackupError('Invalid backup file - not a ZIP archive')
@@ -0,0 +1,105 @@
+"""
+Restore of a chain of incremental backups.
+
+A chain is a full backup followed by incremental backups, each made against
+the manifest of the one before it. The chain is folded into the state of its
+last backup before anything is written: entries are matched by their section
+key, later versions replace earlier ones and tombstones remove them. Media
+files are looked up by SHA-256 in whichever archive of the chain carries
+them. The folded data is then restored like a single full backup. Archives
+of both backup formats can be mixed in a chain.
+"""
+import zipfile
+from contextlib import ExitStack
+
+from django.db import transaction
+
+from adventures.utils.backup import (
+    BackupError, clear_user_data, import_backup_data, read_backup_data, read_zip_manifest,
+)
+from adventures.utils.backup_export import SECTION_KEYS, entry_key
+from adventures.utils.stats import defer_user_stats
+
+
+class ChainArchive:
+    """
+    Read-only view of the media of a folded chain, with the ``namelist()`` and
+    ``read()`` methods the restore uses on a ``ZipFile``.
+    """
+
+    def __init__(self, zip_files, manifests):
+        # sha256 -> (archive, member) of the first archive carrying the content
+        sources = {}
+        for zip_file, manifest in zip(zip_files, manifests):
+            members = set(zip_file.namelist())
+            for arcname, sha256 in manifest['media'].items():
+                if arcname in members:
+                    sources.setdefault(sha256, (zip_file, arcname))
+
+        self._members = {
+            arcname: sources[sha256]
+            for arcname, sha256 in manifests[-1]['media'].items()
+            if sha256 in sources
+        }
+
+    def namelist(self):
+        return list(self._members)
+
+    def read(self, name):
+        zip_file, member = self._members[name]
+        return zip_file.read(member)
+
+
+def fold_backup_chain(zip_files):
+    """
+    Return ``(backup_data, archive)`` with the state at the end of the chain
+    of opened backup archives, oldest first.
+    """
+    if not zip_files:
+        raise BackupError('No backups given')
+
+    manifests = [read_zip_manifest(zip_file) for zip_file in zip_files]
+    backup_data = read_backup_data(zip_files[0])
+    if backup_data.get('parent_backup_id') or manifests[0].get('parent_id'):
+        raise BackupError('The first backup of a chain must be a full backup')
+
+    sections = {
+        name: {entry_key(name, entry): entry for entry in backup_data.get(name, [])}
+        for name in SECTION_KEYS
+    }
+    for previous, manifest, zip_file in zip(manifests, manifests[1:], zip_files[1:]):
+        if manifest.get('parent_id') != previous['backup_id']:
+            raise BackupError(
+                f"Backup {manifest['backup_id']} does not build on backup {previous['backup_id']}"
+            )
+        increment = read_backup_data(zip_file)
+        tombstones = increment.get('tombstones', {})
+        for name, entries in sections.items():
+            for entry in increment.get(name, []):
+                entries[entry_key(name, entry)] = entry
+            for key in tombstones.get(name, []):
+                entries.pop(key, None)
+        backup_data.update({key: value for key, value in increment.items() if key not in SECTION_KEYS})
+
+    backup_data.pop('tombstones', None)
+    backup_data.pop('parent_backup_id', None)
+    for name, entries in sections.items():
+        backup_data[name] = list(entries.values())
+    return backup_data, ChainArchive(zip_files, manifests)
+
+
+def restore_backup_chain(archives, user, progress=None):
+    """
+    Replace all of ``user``'s data with the state at the end of a backup
+    chain. ``archives`` are paths or file objects, the full backup first.
+    """
+    with ExitStack() as stack:
+        try:
+            zip_files = [stack.enter_context(zipfile.ZipFile(archive, 'r')) for archive in archives]
+        except zipfile.BadZipFile:
+            raise BackupError('Invalid backup file - not a ZIP archive')
+
+        backup_data, archive = fold_backup_chain(zip_files)
+        with transaction.atomic(), defer_user_stats():
+            clear_user_data(user)
+            return import_backup_data(backup_data, archive, user, progress=progress)
@@ -0,0 +1,497 @@
+"""
+Single-pass builder for the records of a backup.
+
+Every model is loaded once with the prefetches its entries need, export ids
+are assigned in one sweep over the loaded rows, and each entry is produced by
+a small writer method that only reads prefetched data. The number of queries
+does not depend on the size of the account.
+
+``BackupExporter.sections()`` yields the sections in archive order so a
+caller can write them one at a time; ``build()`` returns the whole format 1
+``data.json`` dict.
+
+Export ids are the rows' own UUIDs, so an entry keeps its id from one backup
+to the next. Incremental backups build on that: every archive carries a
+manifest with a digest of each entry and the SHA-256 of each media file, and
+``changed_sections()`` against a parent manifest only yields what changed
+since.
+"""
+import hashlib
+import json
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Prefetch
+
+from adventures.models import (
+    Activity, Category, Checklist, Collection, CollectionItineraryItem, ContentAttachment, ContentImage, Location,
+    Lodging, Note, Transportation, Visit,
+)
+from adventures.utils.geojson import BLOB_GEOJSON_FIELDS
+from adventures.utils.media_blobs import hash_field_file
+
+MANIFEST_FORMAT = 1
+
+# Itinerary item content types and the export id map that resolves them
+ITINERARY_MODELS = {
+    'location': Location,
+    'transportation': Transportation,
+    'note': Note,
+    'lodging': Lodging,
+    'checklist': Checklist,
+}
+
+# Field identifying an entry of each section across backups
+SECTION_KEYS = {
+    'categories': 'name',
+    'collections': 'export_id',
+    'locations': 'export_id',
+    'transportation': 'export_id',
+    'notes': 'export_id',
+    'checklists': 'export_id',
+    'lodging': 'export_id',
+    'visited_cities': 'city',
+    'visited_regions': 'region',
+    'itinerary_items': 'export_id',
+}
+
+
+def entry_key(section, entry):
+    return str(entry[SECTION_KEYS[section]])
+
+
+def entry_digest(entry):
+    """Digest of an exported entry; it changes whenever anything in the entry does."""
+    encoded = json.dumps(entry, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _str_or_none(value):
+    return str(value) if value else None
+
+
+def _float_or_none(value):
+    return float(value) if value else None
+
+
+def _seconds_or_none(value):
+    return value.total_seconds() if value else None
+
+
+def _file_basename(field_file):
+    return field_file.name.split('/')[-1] if field_file else None
+
+
+class BackupExporter:
+    """Loads a user's data once and writes the backup entries from it."""
+
+    def __init__(self, user):
+        self.user = user
+        self.backup_id = str(uuid.uuid4())
+        self.created_at = datetime.now().isoformat()
+        self._media_hashes = None
+        self._load()
+        self._assign_export_ids()
+
+    def _load(self):
+        user = self.user
+        self.visited_city_ids = list(user.visitedcity_set.values_list('city_id', flat=True))
+        self.visited_region_ids = list(user.visitedregion_set.values_list('region_id', flat=True))
+        self.categories = list(Category.objects.filter(user=user))
+        self.collections = list(
+            Collection.objects.filter(user=user).prefetch_related('shared_with')
+        )
+        self.locations = list(
+            Location.objects.filter(user=user).select_related('category').prefetch_related(
+                Prefetch('collections', queryset=Collection.objects.only('id')),
+                Prefetch(
+                    'visits',
+                    queryset=Visit.objects.prefetch_related(
+                        Prefetch('activities', queryset=Activity.objects.select_related('trail').defer('gpx_geojson'))
+                    ),
+                ),
+                'trails',
+                Prefetch('images', queryset=ContentImage.objects.select_related('blob').defer(*BLOB_GEOJSON_FIELDS)),
+                Prefetch(
+                    'attachments',
+                    queryset=ContentAttachment.objects.select_related('blob').defer(*BLOB_GEOJSON_FIELDS),
+                ),
+            )
+        )
+        self.transportation = list(Transportation.objects.filter(user=user))
+        self.notes = list(Note.objects.filter(user=user))
+        self.checklists = list(
+            Checklist.objects.filter(user=user).prefetch_related('checklistitem_set')
+        )
+        self.lodging = list(Lodging.objects.filter(user=user))
+
+        self.itinerary_items = defaultdict(list)
+        for item in CollectionItineraryItem.objects.filter(collection__user=user).select_related('content_type'):
+            self.itinerary_items[item.collection_id].append(item)
+
+    def _assign_export_ids(self):
+        def index(rows):
+            return {row.id: str(row.id) for row in rows}
+
+        self.collection_ids = index(self.collections)
+        self.location_ids = index(self.locations)
+        self.export_ids = {
+            Location: self.location_ids,
+            Transportation: index(self.transportation),
+            Note: index(self.notes),
+            Lodging: index(self.lodging),
+            Checklist: index(self.checklists),
+        }
+
+        # Image references used for collection primary images
+        self.image_refs = {}
+        for location in self.locations:
+            for image_index, image in enumerate(location.images.all()):
+                self.image_refs[image.id] = {
+                    'location_export_id': self.location_ids[location.id],
+                    'image_index': image_index,
+                    'immich_id': image.immich_id,
+                    'filename': _file_basename(image.image),
+                }
+
+    # Writers
+
+    def header(self, parent=None):
+        header = {
+            'version': settings.ADVENTURELOG_RELEASE_VERSION,
+            'export_date': self.created_at,
+            'user_email': self.user.email,
+            'user_username': self.user.username,
+            'backup_id': self.backup_id,
+        }
+        if parent:
+            header['parent_backup_id'] = parent['backup_id']
+        return header
+
+    def category_entry(self, category):
+        return {
+            'name': category.name,
+            'display_name': category.display_name,
+            'icon': category.icon,
+        }
+
+    def collection_entry(self, collection):
+        entry = {
+            'export_id': self.collection_ids[collection.id],
+            'name': collection.name,
+            'description': collection.description,
+            'is_public': collection.is_public,
+            'start_date': _isoformat(collection.start_date),
+            'end_date': _isoformat(collection.end_date),
+            'is_archived': collection.is_archived,
+            'link': collection.link,
+            'shared_with_user_ids': [str(shared.uuid) for shared in collection.shared_with.all()],
+        }
+        if collection.primary_image_id in self.image_refs:
+            entry['primary_image'] = self.image_refs[collection.primary_image_id]
+        return entry
+
+    def activity_entry(self, activity):
+        return {
+            'name': activity.name,
+            'sport_type': activity.sport_type,
+            'distance': _float_or_none(activity.distance),
+            'moving_time': _seconds_or_none(activity.moving_time),
+            'elapsed_time': _seconds_or_none(activity.elapsed_time),
+            'rest_time': _seconds_or_none(activity.rest_time),
+            'elevation_gain': _float_or_none(activity.elevation_gain),
+            'elevation_loss': _float_or_none(activity.elevation_loss),
+            'elev_high': _float_or_none(activity.elev_high),
+            'elev_low': _float_or_none(activity.elev_low),
+            'start_date': _isoformat(activity.start_date),
+            'start_date_local': _isoformat(activity.start_date_local),
+            'timezone': activity.timezone,
+            'average_speed': _float_or_none(activity.average_speed),
+            'max_speed': _float_or_none(activity.max_speed),
+            'average_cadence': _float_or_none(activity.average_cadence),
+            'calories': _float_or_none(activity.calories),
+            'start_lat': _float_or_none(activity.start_lat),
+            'start_lng': _float_or_none(activity.start_lng),
+            'end_lat': _float_or_none(activity.end_lat),
+            'end_lng': _float_or_none(activity.end_lng),
+            'external_service_id': activity.external_service_id,
+            'trail_name': activity.trail.name if activity.trail else None,  # Link by trail name
+            'gpx_filename': _file_basename(activity.gpx_file),
+        }
+
+    def visit_entry(self, visit):
+        return {
+            'export_id': str(visit.id),
+            'start_date': _isoformat(visit.start_date),
+            'end_date': _isoformat(visit.end_date),
+            'timezone': visit.timezone,
+            'notes': visit.notes,
+            'activities': [self.activity_entry(activity) for activity in visit.activities.all()],
+        }
+
+    def location_entry(self, location):
+        return {
+            'export_id': self.location_ids[location.id],
+            'name': location.name,
+            'location': location.location,
+            'tags': location.tags,
+            'description': location.description,
+            'rating': location.rating,
+            'link': location.link,
+            'is_public': location.is_public,
+            'longitude': _str_or_none(location.longitude),
+            'latitude': _str_or_none(location.latitude),
+            'city': location.city_id,
+            'region': location.region_id,
+            'country': location.country_id,
+            'category_name': location.category.name if location.category else None,
+            'collection_export_ids': [
+                self.collection_ids[collection.id]
+                for collection in location.collections.all()
+                if collection.id in self.collection_ids
+            ],
+            'visits': [self.visit_entry(visit) for visit in location.visits.all()],
+            'trails': [
+                {
+                    'name': trail.name,
+                    'link': trail.link,
+                    'wanderer_id': trail.wanderer_id,
+                    'created_at': _isoformat(trail.created_at),
+                }
+                for trail in location.trails.all()
+            ],
+            'images': [
+                {
+                    'immich_id': image.immich_id,
+                    'is_primary': image.is_primary,
+                    'filename': _file_basename(image.image),
+                }
+                for image in location.images.all()
+            ],
+            'attachments': [
+                {
+                    'name': attachment.name,
+                    'filename': _file_basename(attachment.file),
+                }
+                for attachment in location.attachments.all()
+            ],
+        }
+
+    def _collection_export_id(self, obj):
+        return self.collection_ids.get(obj.collection_id) if obj.collection_id else None
+
+    def transportation_entry(self, transport):
+        return {
+            'export_id': self.export_ids[Transportation][transport.id],
+            'type': transport.type,
+            'name': transport.name,
+            'description': transport.description,
+            'rating': transport.rating,
+            'link': transport.link,
+            'date': _isoformat(transport.date),
+            'end_date': _isoformat(transport.end_date),
+            'start_timezone': transport.start_timezone,
+            'end_timezone': transport.end_timezone,
+            'flight_number': transport.flight_number,
+            'from_location': transport.from_location,
+            'origin_latitude': _str_or_none(transport.origin_latitude),
+            'origin_longitude': _str_or_none(transport.origin_longitude),
+            'destination_latitude': _str_or_none(transport.destination_latitude),
+            'destination_longitude': _str_or_none(transport.destination_longitude),
+            'to_location': transport.to_location,
+            'is_public': transport.is_public,
+            'collection_export_id': self._collection_export_id(transport),
+        }
+
+    def note_entry(self, note):
+        return {
+            'export_id': self.export_ids[Note][note.id],
+            'name': note.name,
+            'content': note.content,
+            'links': note.links,
+            'date': _isoformat(note.date),
+            'is_public': note.is_public,
+            'collection_export_id': self._collection_export_id(note),
+        }
+
+    def checklist_entry(self, checklist):
+        return {
+            'export_id': self.export_ids[Checklist][checklist.id],
+            'name': checklist.name,
+            'date': _isoformat(checklist.date),
+            'is_public': checklist.is_public,
+            'collection_export_id': self._collection_export_id(checklist),
+            'items': [
+                {'name': item.name, 'is_checked': item.is_checked}
+                for item in checklist.checklistitem_set.all()
+            ],
+        }
+
+    def lodging_entry(self, lodging):
+        return {
+            'export_id': self.export_ids[Lodging][lodging.id],
+            'name': lodging.name,
+            'type': lodging.type,
+            'description': lodging.description,
+            'rating': lodging.rating,
+            'link': lodging.link,
+            'check_in': _isoformat(lodging.check_in),
+            'check_out': _isoformat(lodging.check_out),
+            'timezone': lodging.timezone,
+            'reservation_number': lodging.reservation_number,
+            'price': _str_or_none(lodging.price),
+            'latitude': _str_or_none(lodging.latitude),
+            'longitude': _str_or_none(lodging.longitude),
+            'location': lodging.location,
+            'is_public': lodging.is_public,
+            'collection_export_id': self._collection_export_id(lodging),
+        }
+
+    def itinerary_item_entry(self, item):
+        """Return the entry, or ``None`` when the item points at nothing exported."""
+        content_type_str = item.content_type.model
+        model = ITINERARY_MODELS.get(content_type_str)
+        item_reference = self.export_ids[model].get(item.object_id) if model else None
+        if item_reference is None:
+            return None
+        return {
+            'export_id': str(item.id),
+            'collection_export_id': self.collection_ids[item.collection_id],
+            'content_type': content_type_str,
+            'item_reference': item_reference,
+            'date': _isoformat(item.date),
+            'is_global': item.is_global,
+            'order': item.order,
+        }
+
+    # Sections
+
+    def _itinerary_entries(self):
+        for collection in self.collections:
+            for item in self.itinerary_items.get(collection.id, ()):
+                entry = self.itinerary_item_entry(item)
+                if entry is not None:
+                    yield entry
+
+    def sections(self):
+        """Yield ``(name, entries)`` for every section, entries as an iterator."""
+        yield 'categories', map(self.category_entry, self.categories)
+        yield 'collections', map(self.collection_entry, self.collections)
+        yield 'locations', map(self.location_entry, self.locations)
+        yield 'transportation', map(self.transportation_entry, self.transportation)
+        yield 'notes', map(self.note_entry, self.notes)
+        yield 'checklists', map(self.checklist_entry, self.checklists)
+        yield 'lodging', map(self.lodging_entry, self.lodging)
+        yield 'visited_cities', ({'city': city_id} for city_id in self.visited_city_ids)
+        yield 'visited_regions', ({'region': region_id} for region_id in self.visited_region_ids)
+        yield 'itinerary_items', self._itinerary_entries()
+
+    def build(self):
+        export_data = self.header()
+        for name, entries in self.sections():
+            export_data[name] = list(entries)
+        return export_data
+
+    def _media_files(self):
+        """Yield ``(folder, field file, blob)`` for every file the backup references."""
+        for location in self.locations:
+            for image in location.images.all():
+                yield 'images', image.image, image.blob
+            for attachment in location.attachments.all():
+                yield 'attachments', attachment.file, attachment.blob
+            for visit in location.visits.all():
+                for activity in visit.activities.all():
+                    yield 'gpx', activity.gpx_file, None
+
+    def media_entries(self):
+        """Return ``(archive name, storage name)`` for every file the backup references."""
+        media_entries = []
+        files_added = set()
+        for folder, field_file, _ in self._media_files():
+            if field_file and field_file.name not in files_added:
+                media_entries.append((f'{folder}/{_file_basename(field_file)}', field_file.name))
+                files_added.add(field_file.name)
+        return media_entries
+
+    def media_hashes(self):
+        """
+        Return ``{archive name: sha256}`` for the files of the backup. Blob
+        backed files use the stored hash; the others (GPX files) are read.
+        Files missing from storage are left out, as they are from the archive.
+        """
+        if self._media_hashes is not None:
+            return self._media_hashes
+        hashes = self._media_hashes = {}
+        for folder, field_file, blob in self._media_files():
+            if not field_file:
+                continue
+            arcname = f'{folder}/{_file_basename(field_file)}'
+            if arcname in hashes:
+                continue
+            if blob is not None:
+                hashes[arcname] = blob.sha256
+                continue
+            try:
+                hashes[arcname] = hash_field_file(field_file)[0]
+            except OSError:
+                continue
+        return hashes
+
+    # Incremental backups
+
+    def changed_sections(self, parent=None):
+        """
+        Yield ``(name, entries)`` like ``sections()``, leaving out the entries
+        that did not change since the ``parent`` manifest. The digest of every
+        entry is recorded as the entries are consumed, for ``manifest()`` and
+        ``tombstones()``.
+        """
+        self.digests = {}
+        for name, entries in self.sections():
+            parent_digests = parent['entities'].get(name, {}) if parent else {}
+            yield name, self._changed_entries(name, entries, parent_digests)
+
+    def _changed_entries(self, name, entries, parent_digests):
+        digests = self.digests[name] = {}
+        for entry in entries:
+            key = entry_key(name, entry)
+            digests[key] = entry_digest(entry)
+            if parent_digests.get(key) != digests[key]:
+                yield entry
+
+    def tombstones(self, parent):
+        """Yield ``{'section', 'key'}`` for entries of ``parent`` that no longer exist."""
+        for name, parent_digests in parent['entities'].items():
+            current = self.digests.get(name, {})
+            for key in parent_digests:
+                if key not in current:
+                    yield {'section': name, 'key': key}
+
+    def manifest(self, parent=None):
+        """
+        Manifest of the complete current state, so it can be the parent of
+        the next backup. Call it once the changed sections were consumed.
+        """
+        return {
+            'format': MANIFEST_FORMAT,
+            'backup_id': self.backup_id,
+            'parent_id': parent['backup_id'] if parent else None,
+            'created_at': self.created_at,
+            'entities': self.digests,
+            'media': self.media_hashes(),
+        }
+
+    def changed_media_entries(self, parent=None):
+        """``media_entries()`` without the files whose content ``parent`` already has."""
+        media = self.media_hashes()
+        parent_hashes = set(parent['media'].values()) if parent else set()
+        return [
+            (arcname, storage_name) for arcname, storage_name in self.media_entries()
+            if arcname in media and media[arcname] not in parent_hashes
+        ]
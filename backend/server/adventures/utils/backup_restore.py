@@ -0,0 +1,610 @@
+"""
+Phased restore of a full backup.
+
+Rows are not created one ``objects.create()`` at a time. The restore runs in
+phases instead:
+
+1. Reference data (cities, regions, countries, users a collection is shared
+   with, content types) is resolved with one lookup per table.
+2. Every model is inserted with ``bulk_create`` in foreign-key order.
+   Primary keys are UUIDs assigned in Python, so export ids are remapped to
+   the new rows in memory before anything is written.
+3. Image, attachment and GPX files are decoded, resized and written by a
+   thread pool; the main thread only records the results.
+
+``bulk_create`` bypasses ``save()`` and post-save signals, so what they would
+have done is applied in batch: the default category, collection publicity
+of linked locations, blob refcounts and the stats rollup. Geocoding and the
+visited region/city sync run once for the restored locations at the end.
+"""
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from adventures.models import (
+    Activity, Category, Checklist, ChecklistItem, Collection, CollectionItineraryItem, ContentAttachment,
+    ContentImage, Location, Lodging, Note, Trail, Transportation, Visit, background_geocode_and_assign,
+)
+from adventures.utils.get_is_visited import is_location_visited
+from adventures.utils.media_blobs import acquire_many, adopt_staged_files, find_blobs, hash_bytes, stage_file
+from adventures.utils.stats import STAT_PARTS, mark_user_stats_dirty
+from adventures.utils.transportation_distance import geodesic_from_coordinates
+from worldtravel.models import City, Country, Region, VisitedCity, VisitedRegion
+
+User = get_user_model()
+
+# Threads decoding and writing media files
+MEDIA_WORKERS = min(8, os.cpu_count() or 1)
+
+# Itinerary item content types restored from a backup
+ITINERARY_MODELS = {
+    'location': Location,
+    'transportation': Transportation,
+    'note': Note,
+    'lodging': Lodging,
+    'checklist': Checklist,
+}
+
+
+def _seconds_to_timedelta(value):
+    return timedelta(seconds=value) if value is not None else None
+
+
+class BackupRestorer:
+    """Restores one backup's data plus its archive members for a user."""
+
+    def __init__(self, backup_data, zip_file, user, progress=None):
+        self.data = backup_data
+        self.zip_file = zip_file
+        self.members = set(zip_file.namelist())
+        self.user = user
+        self.progress = progress
+        self.summary = {
+            'categories': 0, 'collections': 0, 'locations': 0,
+            'transportation': 0, 'notes': 0, 'checklists': 0,
+            'checklist_items': 0, 'lodging': 0, 'images': 0,
+            'attachments': 0, 'visited_cities': 0, 'visited_regions': 0,
+            'trails': 0, 'activities': 0, 'gpx_files': 0, 'itinerary_items': 0
+        }
+
+        # Export id -> new row
+        self.collection_map = {}
+        self.location_map = {}
+        self.item_maps = {model: {} for model in ITINERARY_MODELS.values()}
+        self.location_images = defaultdict(list)
+
+    def run(self):
+        steps = (
+            self._resolve_reference_data,
+            self._restore_collections,
+            self._restore_locations,
+            self._restore_media,
+            self._restore_content,
+            self._restore_itinerary,
+            self._restore_visited,
+        )
+        for index, step in enumerate(steps):
+            step()
+            if self.progress:
+                self.progress(index + 1, len(steps))
+
+        # bulk_create sends no post_save signals for the rollup
+        mark_user_stats_dirty(self.user.id, *STAT_PARTS)
+        self._schedule_geocoding()
+        return self.summary
+
+    # Phase 1: reference data
+
+    def _resolve_reference_data(self):
+        locations = self.data.get('locations', [])
+
+        def existing(model, ids):
+            ids = {value for value in ids if value}
+            return set(model.objects.filter(id__in=ids).values_list('id', flat=True)) if ids else set()
+
+        self.city_ids = existing(
+            City,
+            [loc.get('city') for loc in locations] + [row['city'] for row in self.data.get('visited_cities', [])],
+        )
+        self.region_ids = existing(
+            Region,
+            [loc.get('region') for loc in locations] + [row['region'] for row in self.data.get('visited_regions', [])],
+        )
+        self.country_ids = existing(Country, [loc.get('country') for loc in locations])
+
+        shared_uuids = {
+            str(uuid) for col in self.data.get('collections', []) for uuid in col.get('shared_with_user_ids', [])
+        }
+        self.shared_users = {}
+        if shared_uuids:
+            self.shared_users = {
+                str(shared.uuid): shared
+                for shared in User.objects.filter(uuid__in=shared_uuids, public_profile=True)
+            }
+
+        self.content_types = ContentType.objects.get_for_models(*ITINERARY_MODELS.values())
+
+        # Categories
+        categories = []
+        self.category_map = {}
+        for cat_data in self.data.get('categories', []):
+            category = Category(
+                user=self.user,
+                name=cat_data['name'],
+                display_name=cat_data['display_name'],
+                icon=cat_data.get('icon', '🌍')
+            )
+            categories.append(category)
+            self.category_map[cat_data['name']] = category
+            self.summary['categories'] += 1
+
+        # Location.save() files uncategorized locations under 'general'
+        if 'general' not in self.category_map and any(
+            not self.category_map.get(loc.get('category_name')) for loc in locations
+        ):
+            general = Category(user=self.user, name='general', display_name='General', icon='🌍')
+            categories.append(general)
+            self.category_map['general'] = general
+        Category.objects.bulk_create(categories)
+
+    # Phase 2: collections
+
+    def _restore_collections(self):
+        collections = []
+        shared_rows = []
+        shared_with = Collection._meta.get_field('shared_with')
+        SharedWith = shared_with.remote_field.through
+        for col_data in self.data.get('collections', []):
+            collection = Collection(
+                user=self.user,
+                name=col_data['name'],
+                description=col_data.get('description', ''),
+                is_public=col_data.get('is_public', False),
+                start_date=col_data.get('start_date'),
+                end_date=col_data.get('end_date'),
+                is_archived=col_data.get('is_archived', False),
+                link=col_data.get('link')
+            )
+            collections.append(collection)
+            self.collection_map[col_data['export_id']] = collection
+            self.summary['collections'] += 1
+
+            for uuid in col_data.get('shared_with_user_ids', []):
+                shared_user = self.shared_users.get(str(uuid))
+                if shared_user:
+                    shared_rows.append(SharedWith(**{
+                        f'{shared_with.m2m_field_name()}_id': collection.id,
+                        f'{shared_with.m2m_reverse_field_name()}_id': shared_user.id,
+                    }))
+
+        Collection.objects.bulk_create(collections)
+        SharedWith.objects.bulk_create(shared_rows, ignore_conflicts=True)
+
+    # Phase 3: locations, trails, visits and activities
+
+    def _restore_locations(self):
+        locations = []
+        collection_links = []
+        trails = []
+        visits = []
+        self.activities = []
+        self.pending_gpx = []
+        self.pending_images = []
+        self.pending_attachments = []
+        self.immich_images = []
+
+        LocationCollections = Location.collections.through
+        visit_start = Visit._meta.get_field('start_date')
+        visit_end = Visit._meta.get_field('end_date')
+        general = self.category_map.get('general')
+
+        for adv_data in self.data.get('locations', []):
+            linked = [
+                self.collection_map[export_id]
+                for export_id in adv_data.get('collection_export_ids', [])
+                if export_id in self.collection_map
+            ]
+            is_public = adv_data.get('is_public', False)
+            if linked:
+                # Linking collections makes a location exactly as public as they are
+                is_public = any(collection.is_public for collection in linked)
+
+            location = Location(
+                user=self.user,
+                name=adv_data['name'],
+                location=adv_data.get('location'),
+                tags=adv_data.get('tags', []),
+                description=adv_data.get('description'),
+                rating=adv_data.get('rating'),
+                link=adv_data.get('link'),
+                is_public=is_public,
+                longitude=adv_data.get('longitude'),
+                latitude=adv_data.get('latitude'),
+                city_id=adv_data.get('city') if adv_data.get('city') in self.city_ids else None,
+                region_id=adv_data.get('region') if adv_data.get('region') in self.region_ids else None,
+                country_id=adv_data.get('country') if adv_data.get('country') in self.country_ids else None,
+                category=self.category_map.get(adv_data.get('category_name')) or general,
+            )
+            locations.append(location)
+            self.location_map[adv_data['export_id']] = location
+            collection_links.extend(
+                LocationCollections(location_id=location.id, collection_id=collection.id)
+                for collection in {collection.id: collection for collection in linked}.values()
+            )
+
+            trail_name_map = {}
+            for trail_data in adv_data.get('trails', []):
+                trail = Trail(
+                    user=self.user,
+                    location=location,
+                    name=trail_data['name'],
+                    link=trail_data.get('link'),
+                    wanderer_id=trail_data.get('wanderer_id'),
+                    created_at=trail_data.get('created_at')
+                )
+                # Trail.save() runs full_clean(); the link/Wanderer rule is the one a backup can break
+                trail.clean()
+                trails.append(trail)
+                trail_name_map[trail_data['name']] = trail
+                self.summary['trails'] += 1
+
+            for visit_data in adv_data.get('visits', []):
+                visit = Visit(
+                    location=location,
+                    # Parsed here so the visited sync can compare them
+                    start_date=visit_start.to_python(visit_data.get('start_date')),
+                    end_date=visit_end.to_python(visit_data.get('end_date')),
+                    timezone=visit_data.get('timezone'),
+                    notes=visit_data.get('notes')
+                )
+                visits.append(visit)
+                for activity_data in visit_data.get('activities', []):
+                    self._add_activity(activity_data, visit, trail_name_map)
+
+            for img_data in adv_data.get('images', []):
+                self._add_image(img_data, adv_data['export_id'], location)
+
+            for att_data in adv_data.get('attachments', []):
+                filename = att_data.get('filename')
+                if filename and f'attachments/{filename}' in self.members:
+                    self.pending_attachments.append((location, att_data, filename))
+
+            self.summary['locations'] += 1
+
+        Location.objects.bulk_create(locations)
+        LocationCollections.objects.bulk_create(collection_links)
+        Trail.objects.bulk_create(trails)
+        Visit.objects.bulk_create(visits)
+        self.locations = locations
+        self.visits_by_location = defaultdict(list)
+        for visit in visits:
+            self.visits_by_location[visit.location_id].append(visit)
+
+    def _add_activity(self, activity_data, visit, trail_name_map):
+        trail = None
+        if activity_data.get('trail_name'):
+            trail = trail_name_map.get(activity_data['trail_name'])
+
+        activity = Activity(
+            user=self.user,
+            visit=visit,
+            trail=trail,
+            name=activity_data['name'],
+            sport_type=activity_data.get('sport_type'),
+            distance=activity_data.get('distance'),
+            moving_time=_seconds_to_timedelta(activity_data.get('moving_time')),
+            elapsed_time=_seconds_to_timedelta(activity_data.get('elapsed_time')),
+            rest_time=_seconds_to_timedelta(activity_data.get('rest_time')),
+            elevation_gain=activity_data.get('elevation_gain'),
+            elevation_loss=activity_data.get('elevation_loss'),
+            elev_high=activity_data.get('elev_high'),
+            elev_low=activity_data.get('elev_low'),
+            start_date=activity_data.get('start_date'),
+            start_date_local=activity_data.get('start_date_local'),
+            timezone=activity_data.get('timezone'),
+            average_speed=activity_data.get('average_speed'),
+            max_speed=activity_data.get('max_speed'),
+            average_cadence=activity_data.get('average_cadence'),
+            calories=activity_data.get('calories'),
+            start_lat=activity_data.get('start_lat'),
+            start_lng=activity_data.get('start_lng'),
+            end_lat=activity_data.get('end_lat'),
+            end_lng=activity_data.get('end_lng'),
+            external_service_id=activity_data.get('external_service_id')
+        )
+        self.activities.append(activity)
+        self.summary['activities'] += 1
+
+        gpx_filename = activity_data.get('gpx_filename')
+        if gpx_filename and f'gpx/{gpx_filename}' in self.members:
+            self.pending_gpx.append((activity, gpx_filename))
+            self.summary['gpx_files'] += 1
+
+    def _add_image(self, img_data, location_export_id, location):
+        image = ContentImage(
+            user=self.user,
+            is_primary=img_data.get('is_primary', False),
+            content_type=self.content_types[Location],
+            object_id=location.id,
+        )
+        if img_data.get('immich_id'):
+            image.immich_id = img_data['immich_id']
+            self.immich_images.append(image)
+        else:
+            filename = img_data.get('filename')
+            if not filename or f'images/{filename}' not in self.members:
+                return
+            self.pending_images.append((image, filename))
+        # Position in the list is what collection primary image references point at
+        self.location_images[location_export_id].append(image)
+
+    # Phase 4: media files
+
+    def _stage_members(self, pool, kind, model, field_name, entries):
+        """
+        Resolve archive members to blobs. Members whose bytes are already
+        stored reuse the blob; the rest are written by the pool.
+        Returns a list of blobs matching ``entries``.
+        """
+        members = [f'{kind}/{filename}' for filename in entries]
+        hashes = list(pool.map(lambda member: hash_bytes(self.zip_file.read(member)), members))
+        known = find_blobs(kind, hashes)
+
+        def stage(index):
+            filename = entries[index]
+            return stage_file(model, field_name, self.zip_file.read(members[index]), filename)
+
+        missing = [index for index, sha256 in enumerate(hashes) if sha256 not in known]
+        staged = dict(zip(missing, pool.map(stage, missing)))
+        adopted = adopt_staged_files(kind, list(staged.values())) if staged else {}
+
+        blobs = []
+        for index, sha256 in enumerate(hashes):
+            blobs.append(adopted[staged[index][0]] if index in staged else known[sha256])
+        return blobs
+
+    def _restore_media(self):
+        blob_ids = []
+        with ThreadPoolExecutor(max_workers=MEDIA_WORKERS) as pool:
+            gpx_names = list(pool.map(
+                lambda entry: stage_file(Activity, 'gpx_file', self.zip_file.read(f'gpx/{entry[1]}'), entry[1])[0],
+                self.pending_gpx,
+            ))
+            for (activity, _), name in zip(self.pending_gpx, gpx_names):
+                activity.gpx_file = name
+
+            image_blobs = self._stage_members(
+                pool, 'images', ContentImage, 'image', [filename for _, filename in self.pending_images]
+            )
+            attachment_blobs = self._stage_members(
+                pool, 'attachments', ContentAttachment, 'file',
+                [filename for _, _, filename in self.pending_attachments],
+            )
+
+        images = list(self.immich_images)
+        for (image, _), blob in zip(self.pending_images, image_blobs):
+            image.image = blob.file.name
+            image.blob = blob
+            # Archive bytes are normalized in the background like any other upload
+            image.processing = True
+            blob_ids.append(blob.id)
+            images.append(image)
+
+        attachments = []
+        for (location, att_data, _), blob in zip(self.pending_attachments, attachment_blobs):
+            attachments.append(ContentAttachment(
+                user=self.user,
+                file=blob.file.name,
+                blob=blob,
+                name=att_data.get('name'),
+                content_type=self.content_types[Location],
+                object_id=location.id,
+            ))
+            blob_ids.append(blob.id)
+
+        Activity.objects.bulk_create(self.activities)
+        ContentImage.objects.bulk_create(images)
+        ContentAttachment.objects.bulk_create(attachments)
+        acquire_many(blob_ids)
+        self.summary['images'] += len(images)
+        self.summary['attachments'] += len(attachments)
+
+        # Collection primary images now that images exist
+        with_primary = []
+        for col_data in self.data.get('collections', []):
+            data = col_data.get('primary_image') or {}
+            collection = self.collection_map.get(col_data['export_id'])
+            loc_export_id = data.get('location_export_id')
+            img_index = data.get('image_index')
+            if not collection or loc_export_id is None or img_index is None:
+                continue
+            images_for_location = self.location_images.get(loc_export_id, [])
+            if 0 <= img_index < len(images_for_location):
+                collection.primary_image = images_for_location[img_index]
+                with_primary.append(collection)
+        if with_primary:
+            Collection.objects.bulk_update(with_primary, ['primary_image'])
+
+    # Phase 5: content attached to collections
+
+    def _collection_for(self, row):
+        if row.get('collection_export_id') is None:
+            return None
+        return self.collection_map.get(row['collection_export_id'])
+
+    def _restore_content(self):
+        transportation = []
+        for trans_data in self.data.get('transportation', []):
+            item = Transportation(
+                user=self.user,
+                type=trans_data['type'],
+                name=trans_data['name'],
+                description=trans_data.get('description'),
+                rating=trans_data.get('rating'),
+                link=trans_data.get('link'),
+                date=trans_data.get('date'),
+                end_date=trans_data.get('end_date'),
+                start_timezone=trans_data.get('start_timezone'),
+                end_timezone=trans_data.get('end_timezone'),
+                flight_number=trans_data.get('flight_number'),
+                from_location=trans_data.get('from_location'),
+                origin_latitude=trans_data.get('origin_latitude'),
+                origin_longitude=trans_data.get('origin_longitude'),
+                destination_latitude=trans_data.get('destination_latitude'),
+                destination_longitude=trans_data.get('destination_longitude'),
+                to_location=trans_data.get('to_location'),
+                is_public=trans_data.get('is_public', False),
+                collection=self._collection_for(trans_data)
+            )
+            # bulk_create skips the signal that measures new rows
+            item.distance_km, item.distance_source = geodesic_from_coordinates(item)
+            transportation.append(item)
+            # Only mapped if export_id exists (for backward compatibility with old backups)
+            if 'export_id' in trans_data:
+                self.item_maps[Transportation][trans_data['export_id']] = item
+        self.summary['transportation'] += len(transportation)
+
+        notes = []
+        for note_data in self.data.get('notes', []):
+            note = Note(
+                user=self.user,
+                name=note_data['name'],
+                content=note_data.get('content'),
+                links=note_data.get('links', []),
+                date=note_data.get('date'),
+                is_public=note_data.get('is_public', False),
+                collection=self._collection_for(note_data)
+            )
+            notes.append(note)
+            if 'export_id' in note_data:
+                self.item_maps[Note][note_data['export_id']] = note
+        self.summary['notes'] += len(notes)
+
+        checklists = []
+        checklist_items = []
+        for check_data in self.data.get('checklists', []):
+            checklist = Checklist(
+                user=self.user,
+                name=check_data['name'],
+                date=check_data.get('date'),
+                is_public=check_data.get('is_public', False),
+                collection=self._collection_for(check_data)
+            )
+            checklists.append(checklist)
+            for item_data in check_data.get('items', []):
+                checklist_items.append(ChecklistItem(
+                    user=self.user,
+                    checklist=checklist,
+                    name=item_data['name'],
+                    is_checked=item_data.get('is_checked', False)
+                ))
+            if 'export_id' in check_data:
+                self.item_maps[Checklist][check_data['export_id']] = checklist
+        self.summary['checklists'] += len(checklists)
+        self.summary['checklist_items'] += len(checklist_items)
+
+        lodging = []
+        for lodg_data in self.data.get('lodging', []):
+            item = Lodging(
+                user=self.user,
+                name=lodg_data['name'],
+                type=lodg_data.get('type', 'other'),
+                description=lodg_data.get('description'),
+                rating=lodg_data.get('rating'),
+                link=lodg_data.get('link'),
+                check_in=lodg_data.get('check_in'),
+                check_out=lodg_data.get('check_out'),
+                timezone=lodg_data.get('timezone'),
+                reservation_number=lodg_data.get('reservation_number'),
+                price=lodg_data.get('price'),
+                latitude=lodg_data.get('latitude'),
+                longitude=lodg_data.get('longitude'),
+                location=lodg_data.get('location'),
+                is_public=lodg_data.get('is_public', False),
+                collection=self._collection_for(lodg_data)
+            )
+            lodging.append(item)
+            if 'export_id' in lodg_data:
+                self.item_maps[Lodging][lodg_data['export_id']] = item
+        self.summary['lodging'] += len(lodging)
+
+        Transportation.objects.bulk_create(transportation)
+        Note.objects.bulk_create(notes)
+        Checklist.objects.bulk_create(checklists)
+        ChecklistItem.objects.bulk_create(checklist_items)
+        Lodging.objects.bulk_create(lodging)
+
+    # Phase 6: itinerary
+
+    def _restore_itinerary(self):
+        self.item_maps[Location] = self.location_map
+        items = []
+        for itinerary_data in self.data.get('itinerary_items', []):
+            collection = self.collection_map.get(itinerary_data['collection_export_id'])
+            model = ITINERARY_MODELS.get(itinerary_data['content_type'])
+            if not collection or model is None:
+                continue
+            content_object = self.item_maps[model].get(itinerary_data['item_reference'])
+            if content_object is None:
+                continue
+            items.append(CollectionItineraryItem(
+                collection=collection,
+                content_type=self.content_types[model],
+                object_id=content_object.id,
+                date=itinerary_data.get('date') if not itinerary_data.get('is_global') else None,
+                is_global=bool(itinerary_data.get('is_global', False)),
+                order=itinerary_data['order']
+            ))
+        CollectionItineraryItem.objects.bulk_create(items)
+        self.summary['itinerary_items'] += len(items)
+
+    # Phase 7: visited cities and regions
+
+    def _restore_visited(self):
+        city_ids = {row['city'] for row in self.data.get('visited_cities', []) if row['city'] in self.city_ids}
+        region_ids = {
+            row['region'] for row in self.data.get('visited_regions', []) if row['region'] in self.region_ids
+        }
+        self.summary['visited_cities'] += len(city_ids)
+        self.summary['visited_regions'] += len(region_ids)
+
+        # Regions and cities of visited restored locations, as the visited sync would add them
+        for location in self.locations:
+            location._prefetched_objects_cache = {'visits': self.visits_by_location.get(location.id, [])}
+            if is_location_visited(location):
+                if location.region_id:
+                    region_ids.add(location.region_id)
+                if location.city_id:
+                    city_ids.add(location.city_id)
+            del location._prefetched_objects_cache
+
+        VisitedCity.objects.bulk_create([VisitedCity(user=self.user, city_id=city_id) for city_id in city_ids])
+        VisitedRegion.objects.bulk_create(
+            [VisitedRegion(user=self.user, region_id=region_id) for region_id in region_ids]
+        )
+
+    def _schedule_geocoding(self):
+        """Geocode restored locations that have coordinates but no region, once the restore commits."""
+        location_ids = [
+            str(location.id) for location in self.locations
+            if location.latitude and location.longitude and not location.region_id
+        ]
+        if not location_ids:
+            return
+
+        def geocode_all():
+            for location_id in location_ids:
+                background_geocode_and_assign(location_id)
+
+        def start():
+            thread = threading.Thread(target=geocode_all)
+            thread.daemon = True
+            thread.start()
+
+        transaction.on_commit(start)
@@ -0,0 +1,316 @@
+"""
+Single-collection export and import.
+
+A collection archive is a ZIP holding ``metadata.json`` plus the images and
+attachments of the collection's locations. Both directions are plain
+functions so they can run inside a request or in a background job (see
+``adventures.utils.jobs``).
+"""
+import datetime
+import json
+import os
+import zipfile
+
+from django.conf import settings
+
+from adventures.models import (
+    Category, Checklist, Collection, ContentAttachment, ContentImage, Location, Lodging, Note, Transportation,
+)
+from adventures.utils.location_matcher import LocationMatchIndex
+from adventures.utils.media_blobs import file_kwargs_for_bytes
+from adventures.utils.zip_stream import ZipStream
+
+
+class CollectionArchiveError(Exception):
+    """The uploaded file is not a usable collection archive."""
+
+
+def build_collection_export(collection):
+    """
+    Return ``(metadata, media_entries)`` for ``collection``, where
+    ``media_entries`` lists ``(archive name, FieldFile)`` pairs.
+    """
+    export_data = {
+        'version': getattr(settings, 'ADVENTURELOG_RELEASE_VERSION', 'unknown'),
+        # Omit export_date to keep template-friendly exports (no dates)
+        'collection': {
+            'id': str(collection.id),
+            'name': collection.name,
+            'description': collection.description,
+            'is_public': collection.is_public,
+            # Omit start/end dates
+            'link': collection.link,
+        },
+        'locations': [],
+        'transportation': [],
+        'notes': [],
+        'checklists': [],
+        'lodging': [],
+        # Omit itinerary_items entirely
+        'images': [],
+        'attachments': [],
+        'primary_image_ref': None,
+    }
+
+    image_export_map = {}
+
+    for loc in collection.locations.all().select_related('city', 'region', 'country'):
+        loc_entry = {
+            'id': str(loc.id),
+            'name': loc.name,
+            'description': loc.description,
+            'location': loc.location,
+            'tags': loc.tags or [],
+            'rating': loc.rating,
+            'link': loc.link,
+            'is_public': loc.is_public,
+            'longitude': float(loc.longitude) if loc.longitude is not None else None,
+            'latitude': float(loc.latitude) if loc.latitude is not None else None,
+            'city': loc.city.name if loc.city else None,
+            'region': loc.region.name if loc.region else None,
+            'country': loc.country.name if loc.country else None,
+            'images': [],
+            'attachments': [],
+        }
+
+        for img in loc.images.all():
+            img_export_id = f"img_{len(export_data['images'])}"
+            image_export_map[str(img.id)] = img_export_id
+            export_data['images'].append({
+                'export_id': img_export_id,
+                'id': str(img.id),
+                'name': os.path.basename(getattr(img.image, 'name', 'image')),
+                'is_primary': getattr(img, 'is_primary', False),
+            })
+            loc_entry['images'].append(img_export_id)
+
+        for att in loc.attachments.all():
+            att_export_id = f"att_{len(export_data['attachments'])}"
+            export_data['attachments'].append({
+                'export_id': att_export_id,
+                'id': str(att.id),
+                'name': os.path.basename(getattr(att.file, 'name', 'attachment')),
+            })
+            loc_entry['attachments'].append(att_export_id)
+
+        export_data['locations'].append(loc_entry)
+
+    if collection.primary_image:
+        export_data['primary_image_ref'] = image_export_map.get(str(collection.primary_image.id))
+
+    # Related content (if models have FK to collection)
+    for t in Transportation.objects.filter(collection=collection):
+        export_data['transportation'].append({
+            'id': str(t.id),
+            'type': getattr(t, 'transportation_type', None),
+            'name': getattr(t, 'name', None),
+            # Omit date
+            'notes': getattr(t, 'notes', None),
+        })
+    for n in Note.objects.filter(collection=collection):
+        export_data['notes'].append({
+            'id': str(n.id),
+            'title': getattr(n, 'title', None),
+            'content': getattr(n, 'content', ''),
+            # Omit created_at
+        })
+    for c in Checklist.objects.filter(collection=collection):
+        items = []
+        if hasattr(c, 'items'):
+            items = [
+                {
+                    'name': getattr(item, 'name', None),
+                    'completed': getattr(item, 'completed', False),
+                } for item in c.items.all()
+            ]
+        export_data['checklists'].append({
+            'id': str(c.id),
+            'name': getattr(c, 'name', None),
+            'items': items,
+        })
+    for l in Lodging.objects.filter(collection=collection):
+        export_data['lodging'].append({
+            'id': str(l.id),
+            'type': getattr(l, 'lodging_type', None),
+            'name': getattr(l, 'name', None),
+            # Omit start_date/end_date
+            'notes': getattr(l, 'notes', None),
+        })
+    # Intentionally omit itinerary_items from export
+
+    # Media entries are collected up front so the stream only touches storage
+    media_entries = []
+    for loc in collection.locations.all():
+        for img in loc.images.all():
+            export_id = image_export_map.get(str(img.id))
+            if not export_id or not img.image:
+                continue
+            file_name = os.path.basename(img.image.name)
+            media_entries.append((f'images/{export_id}-{file_name}', img.image))
+        for att in loc.attachments.all():
+            if not att.file:
+                continue
+            file_name = os.path.basename(att.file.name)
+            media_entries.append((f'attachments/{file_name}', att.file))
+
+    return export_data, media_entries
+
+
+def collection_archive_chunks(export_data, media_entries, progress=None):
+    """Yield a collection ZIP chunk by chunk."""
+    archive = ZipStream()
+    yield from archive.write_json('metadata.json', export_data, indent=2)
+    for index, (arcname, field_file) in enumerate(media_entries):
+        yield from archive.write_storage_file(arcname, field_file.name, field_file.storage)
+        if progress:
+            progress(index + 1, len(media_entries))
+    yield from archive.close()
+
+
+def collection_archive_filename(collection):
+    return f"collection-{collection.name.replace(' ', '_')}.zip"
+
+
+def import_collection_archive(archive, user, progress=None):
+    """
+    Create a new collection for ``user`` from a collection archive (a path or
+    file object). Handles name conflicts by appending (n).
+    """
+    try:
+        zipf = zipfile.ZipFile(archive, 'r')
+    except zipfile.BadZipFile:
+        raise CollectionArchiveError('Invalid file - not a ZIP archive')
+
+    with zipf:
+        try:
+            metadata = json.loads(zipf.read('metadata.json').decode('utf-8'))
+        except KeyError:
+            raise CollectionArchiveError('metadata.json missing')
+
+        base_name = (metadata.get('collection') or {}).get('name') or 'Imported Collection'
+
+        # Ensure unique name per user
+        existing_names = set(user.collection_set.values_list('name', flat=True))
+        unique_name = base_name
+        if unique_name in existing_names:
+            i = 1
+            while True:
+                candidate = f"{base_name} ({i})"
+                if candidate not in existing_names:
+                    unique_name = candidate
+                    break
+                i += 1
+
+        new_collection = Collection.objects.create(
+            user=user,
+            name=unique_name,
+            description=(metadata.get('collection') or {}).get('description'),
+            is_public=(metadata.get('collection') or {}).get('is_public', False),
+            start_date=datetime.date.fromisoformat((metadata.get('collection') or {}).get('start_date')) if (metadata.get('collection') or {}).get('start_date') else None,
+            end_date=datetime.date.fromisoformat((metadata.get('collection') or {}).get('end_date')) if (metadata.get('collection') or {}).get('end_date') else None,
+            link=(metadata.get('collection') or {}).get('link'),
+        )
+
+        image_export_map = {img['export_id']: img for img in metadata.get('images', [])}
+        attachment_export_map = {att['export_id']: att for att in metadata.get('attachments', [])}
+
+        # Archive members are looked up by name instead of scanning namelist() per file
+        member_names = set()
+        image_members = {}
+        for member in zipf.namelist():
+            member_names.add(member)
+            export_id, dash, _ = member[len('images/'):].partition('-')
+            if member.startswith('images/') and dash:
+                image_members.setdefault(export_id, member)
+
+        # Existing locations are only scored when their name or coordinates are close
+        match_index = LocationMatchIndex.for_user(user)
+
+        # Import locations
+        locations = metadata.get('locations', [])
+        for index, loc_data in enumerate(locations):
+            cat_obj = None
+            if loc_data.get('category'):
+                cat_obj, _ = Category.objects.get_or_create(user=user, name=loc_data['category'])
+            incoming_name = loc_data.get('name') or 'Untitled'
+            incoming_location_text = loc_data.get('location')
+            incoming_lat = loc_data.get('latitude')
+            incoming_lon = loc_data.get('longitude')
+
+            # Attempt to find a very similar existing location for this user
+            existing_loc = match_index.find_match(
+                incoming_name, incoming_location_text, incoming_lat, incoming_lon
+            )
+
+            if existing_loc:
+                # Link existing location to the new collection, skip creating a duplicate
+                loc = existing_loc
+                loc.collections.add(new_collection)
+                created_new_loc = False
+            else:
+                # Create a brand-new location
+                loc = Location.objects.create(
+                    user=user,
+                    name=incoming_name,
+                    description=loc_data.get('description'),
+                    location=incoming_location_text,
+                    tags=loc_data.get('tags') or [],
+                    rating=loc_data.get('rating'),
+                    link=loc_data.get('link'),
+                    is_public=bool(loc_data.get('is_public', False)),
+                    longitude=incoming_lon,
+                    latitude=incoming_lat,
+                    category=cat_obj,
+                )
+                loc.collections.add(new_collection)
+                match_index.add(loc)
+                created_new_loc = True
+
+            # Images
+            # Only import images for newly created locations to avoid duplicating user content
+            if created_new_loc:
+                for export_id in loc_data.get('images', []):
+                    img_meta = image_export_map.get(export_id)
+                    if not img_meta:
+                        continue
+                    member = image_members.get(export_id)
+                    if not member:
+                        continue
+                    file_bytes_img = zipf.read(member)
+                    file_name_img = os.path.basename(member)
+                    # Normalized in the background like any other upload
+                    image_obj = ContentImage(
+                        user=user,
+                        processing=True,
+                        **file_kwargs_for_bytes('images', 'image', file_bytes_img, file_name_img),
+                    )
+                    # Assign to the generic relation for Location
+                    image_obj.content_object = loc
+                    image_obj.save()
+                    if img_meta.get('is_primary'):
+                        new_collection.primary_image = image_obj
+                        new_collection.save(update_fields=['primary_image'])
+
+            # Attachments
+            if created_new_loc:
+                for export_id in loc_data.get('attachments', []):
+                    att_meta = attachment_export_map.get(export_id)
+                    if not att_meta:
+                        continue
+                    file_name_att = att_meta.get('name', '')
+                    member = f"attachments/{file_name_att}"
+                    if member not in member_names:
+                        continue
+                    file_bytes_att = zipf.read(member)
+                    attachment_obj = ContentAttachment(
+                        user=user,
+                        **file_kwargs_for_bytes('attachments', 'file', file_bytes_att, file_name_att),
+                    )
+                    # Assign to the generic relation for Location
+                    attachment_obj.content_object = loc
+                    attachment_obj.save()
+
+            if progress:
+                progress(index + 1, len(locations))
+
+    return new_collection
@@ -0,0 +1,206 @@
+"""
+Batch cloner behind ``CollectionViewSet.duplicate``.
+
+Every child model is copied with one ``bulk_create`` in dependency order
+(content, checklist items, itinerary days, itinerary items, media). New
+primary keys are assigned in Python, so the old-id -> new-id map is known
+before anything is written and the generic ``object_id`` of itinerary items
+and media is remapped in memory. The number of queries does not depend on
+the size of the collection.
+
+``bulk_create`` bypasses ``save()``, so the per-row bookkeeping those methods
+do is repeated here in batch: media rows share the source's blob and the blob
+refcounts are raised once per blob.
+"""
+import uuid
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+
+from adventures.models import (
+    Checklist, ChecklistItem, Collection, CollectionItineraryDay, CollectionItineraryItem,
+    ContentAttachment, ContentImage, Lodging, Note, Transportation,
+)
+from adventures.utils.geojson import BLOB_GEOJSON_FIELDS
+from adventures.utils.media_blobs import acquire_many, ensure_blob
+
+TRANSPORTATION_FIELDS = (
+    'type', 'name', 'description', 'rating', 'price', 'link', 'date', 'end_date',
+    'start_timezone', 'end_timezone', 'flight_number', 'from_location',
+    'origin_latitude', 'origin_longitude', 'destination_latitude', 'destination_longitude',
+    'start_code', 'end_code', 'to_location', 'distance_km', 'distance_source', 'is_public',
+)
+NOTE_FIELDS = ('name', 'content', 'links', 'date', 'is_public')
+LODGING_FIELDS = (
+    'name', 'type', 'description', 'rating', 'link', 'check_in', 'check_out', 'timezone',
+    'reservation_number', 'price', 'latitude', 'longitude', 'location', 'is_public',
+)
+CHECKLIST_FIELDS = ('name', 'date', 'is_public')
+
+# Models copied with their images and attachments
+MEDIA_MODELS = (Transportation, Note, Lodging)
+
+
+def _copy(model, source, fields, **overrides):
+    values = {field: getattr(source, field) for field in fields}
+    values.update(overrides)
+    return model(id=uuid.uuid4(), **values)
+
+
+def _clone_image(source, user, content_type_id, object_id, blob_ids):
+    blob = ensure_blob(source) if source.image else None
+    image = ContentImage(
+        id=uuid.uuid4(),
+        user=user,
+        image=blob.file.name if blob is not None else (source.image.name or None),
+        blob=blob,
+        immich_id=None if source.image else (source.immich_id or None),
+        placeholder=source.placeholder if blob is not None else '',
+        processing=source.processing and blob is not None,
+        processing_claimed_at=source.processing_claimed_at if blob is not None else None,
+        is_primary=source.is_primary,
+        content_type_id=content_type_id,
+        object_id=object_id,
+    )
+    # ContentImage.save() runs full_clean(); only the image/Immich rule can
+    # differ from the already valid source
+    image.clean()
+    if blob is not None:
+        blob_ids.append(blob.id)
+    return image
+
+
+def _clone_attachment(source, user, content_type_id, object_id, blob_ids):
+    blob = ensure_blob(source) if source.file else None
+    if blob is not None:
+        blob_ids.append(blob.id)
+    return ContentAttachment(
+        id=uuid.uuid4(),
+        user=user,
+        name=source.name,
+        file=blob.file.name if blob is not None else source.file.name,
+        blob=blob,
+        content_type_id=content_type_id,
+        object_id=object_id,
+    )
+
+
+def duplicate_collection(original, user):
+    """
+    Copy ``original`` for ``user``: metadata, linked locations, transportation,
+    notes, lodging and checklists with their media and items, itinerary days
+    and itinerary items. Call inside a transaction.
+    """
+    new_collection = Collection.objects.create(
+        user=user,
+        name=f"Copy of {original.name}",
+        description=original.description,
+        link=original.link,
+        is_public=False,
+        is_archived=False,
+        start_date=original.start_date,
+        end_date=original.end_date,
+    )
+
+    # Link existing locations to the new collection
+    linked_locations = list(original.locations.all())
+    if linked_locations:
+        new_collection.locations.set(linked_locations)
+
+    object_id_map = {}
+    blob_ids = []
+
+    # FK-based content, with new ids assigned up front
+    content_rows = {}
+    source_ids = {}
+    for model, fields in ((Transportation, TRANSPORTATION_FIELDS), (Note, NOTE_FIELDS), (Lodging, LODGING_FIELDS)):
+        content_rows[model] = []
+        source_ids[model] = []
+        for item in model.objects.filter(collection=original):
+            copy = _copy(model, item, fields, user=user, collection=new_collection)
+            object_id_map[item.id] = copy.id
+            content_rows[model].append(copy)
+            source_ids[model].append(item.id)
+
+    checklists = []
+    for checklist in Checklist.objects.filter(collection=original):
+        copy = _copy(Checklist, checklist, CHECKLIST_FIELDS, user=user, collection=new_collection)
+        object_id_map[checklist.id] = copy.id
+        checklists.append(copy)
+
+    checklist_items = [
+        ChecklistItem(
+            user=user,
+            checklist_id=object_id_map[item.checklist_id],
+            name=item.name,
+            is_checked=item.is_checked,
+        )
+        for item in ChecklistItem.objects.filter(checklist__collection=original)
+    ]
+
+    itinerary_days = [
+        CollectionItineraryDay(
+            collection=new_collection,
+            date=day.date,
+            name=day.name,
+            description=day.description,
+        )
+        for day in CollectionItineraryDay.objects.filter(collection=original)
+    ]
+
+    # Relink itinerary items to duplicated FK-based content where applicable
+    itinerary_items = [
+        CollectionItineraryItem(
+            collection=new_collection,
+            content_type_id=item.content_type_id,
+            object_id=object_id_map.get(item.object_id, item.object_id),
+            date=item.date,
+            is_global=item.is_global,
+            order=item.order,
+        )
+        for item in CollectionItineraryItem.objects.filter(collection=original)
+    ]
+
+    # Media of every copied row, one query for images and one for attachments.
+    # The copies share the source's stored blobs.
+    content_types = ContentType.objects.get_for_models(*MEDIA_MODELS)
+    media_filter = Q()
+    for model in MEDIA_MODELS:
+        if source_ids[model]:
+            media_filter |= Q(content_type=content_types[model], object_id__in=source_ids[model])
+
+    images = []
+    attachments = []
+    if media_filter:
+        for image in ContentImage.objects.filter(media_filter).select_related('blob').defer(*BLOB_GEOJSON_FIELDS):
+            images.append(_clone_image(image, user, image.content_type_id, object_id_map[image.object_id], blob_ids))
+        for attachment in ContentAttachment.objects.filter(media_filter).select_related('blob').defer(*BLOB_GEOJSON_FIELDS):
+            attachments.append(_clone_attachment(
+                attachment, user, attachment.content_type_id, object_id_map[attachment.object_id], blob_ids
+            ))
+
+    # Duplicate primary image so permissions align with the new collection
+    new_primary = None
+    if original.primary_image:
+        new_primary = _clone_image(
+            original.primary_image, user, ContentType.objects.get_for_model(Collection).id,
+            new_collection.id, blob_ids,
+        )
+        images.append(new_primary)
+
+    # Insert in dependency order
+    for model, rows in content_rows.items():
+        model.objects.bulk_create(rows)
+    Checklist.objects.bulk_create(checklists)
+    ChecklistItem.objects.bulk_create(checklist_items)
+    CollectionItineraryDay.objects.bulk_create(itinerary_days)
+    CollectionItineraryItem.objects.bulk_create(itinerary_items)
+    ContentImage.objects.bulk_create(images)
+    ContentAttachment.objects.bulk_create(attachments)
+    acquire_many(blob_ids)
+
+    if new_primary is not None:
+        new_collection.primary_image = new_primary
+        new_collection.save(update_fields=['primary_image'])
+
+    return new_collection
@@ -0,0 +1,191 @@
+"""
+Loaders for the collection list and detail views.
+
+``CollectionSerializer`` walks every child set of a collection (locations with
+their visits, activities, images, attachments, trails and category, plus
+transportation, notes, checklists, lodging and flights). Without prefetching
+each of those is a query per row. ``collection_detail_queryset`` fetches all of
+them up front in a fixed number of queries, and ``collection_detail_context``
+precomputes the per-row lookups the serializers would otherwise make.
+
+List pages use ``collection_list_queryset`` and ``collection_cover_images``,
+which annotate location counts and fetch the first few cover images of every
+collection on the page with a single windowed query.
+"""
+from django.db.models import Case, Count, F, IntegerField, Prefetch, Value, When, Window
+from django.db.models.functions import RowNumber
+
+from adventures.models import (
+    Activity, Checklist, ChecklistItem, CollectionItineraryItem, ContentAttachment,
+    ContentImage, Location, Lodging, Note, Trail, Transportation, Visit,
+)
+from integrations.models import ImmichIntegration
+from worldtravel.models import VisitedRegion
+
+# Cover images returned per collection on list pages
+COVER_IMAGE_LIMIT = 5
+
+
+def _images():
+    return ContentImage.objects.select_related('user')
+
+
+def _attachments():
+    # Responses carry a simplified track; the full one is read only on request
+    return ContentAttachment.objects.select_related('user', 'blob').defer('blob__geojson')
+
+
+def collection_detail_queryset(queryset):
+    """Apply every select/prefetch the full ``CollectionSerializer`` needs."""
+    from flights.models import Flight
+
+    locations = Location.objects.select_related(
+        'user', 'category', 'country', 'region__country', 'city__region__country',
+    ).prefetch_related(
+        Prefetch('images', queryset=_images()),
+        Prefetch('attachments', queryset=_attachments()),
+        Prefetch(
+            'visits',
+            queryset=Visit.objects.prefetch_related(
+                Prefetch('activities', queryset=Activity.objects.select_related('user'))
+            ),
+        ),
+        Prefetch('trails', queryset=Trail.objects.select_related('user')),
+        'collections',
+    )
+
+    return queryset.select_related('user', 'primary_image__user').prefetch_related(
+        'shared_with',
+        Prefetch('locations', queryset=locations),
+        Prefetch(
+            'transportation_set',
+            queryset=Transportation.objects.select_related('user').prefetch_related(
+                Prefetch('images', queryset=_images()),
+                Prefetch('attachments', queryset=_attachments()),
+            ),
+        ),
+        Prefetch('note_set', queryset=Note.objects.select_related('user')),
+        Prefetch(
+            'checklist_set',
+            queryset=Checklist.objects.select_related('user').prefetch_related(
+                Prefetch('checklistitem_set', queryset=ChecklistItem.objects.select_related('user'))
+            ),
+        ),
+        Prefetch(
+            'lodging_set',
+            queryset=Lodging.objects.select_related('user').prefetch_related(
+                Prefetch('images', queryset=_images()),
+                Prefetch('attachments', queryset=_attachments()),
+            ),
+        ),
+        Prefetch(
+            'flight_set',
+            queryset=Flight.objects.select_related('user', 'departure_airport_obj', 'arrival_airport_obj'),
+        ),
+    )
+
+
+def itinerary_items_queryset(collection):
+    return CollectionItineraryItem.objects.filter(collection=collection).select_related(
+        'content_type'
+    ).prefetch_related('item')
+
+
+def collection_detail_context(collection, request_user=None):
+    """
+    Serializer context entries for a collection loaded with
+    ``collection_detail_queryset``: per-category location counts, the request
+    user's visited-region counts per country and Immich integrations per image
+    owner, each resolved with one query instead of one per row.
+    """
+    locations = list(collection.locations.all())
+
+    category_ids = {location.category_id for location in locations if location.category_id}
+    category_location_counts = {category_id: 0 for category_id in category_ids}
+    if category_ids:
+        category_location_counts.update(
+            Location.objects.filter(category_id__in=category_ids, user=F('category__user'))
+            .order_by()
+            .values('category')
+            .annotate(count=Count('id'))
+            .values_list('category', 'count')
+        )
+
+    country_visit_counts = {}
+    country_ids = {location.country_id for location in locations if location.country_id}
+    if country_ids and request_user is not None and request_user.is_authenticated:
+        country_visit_counts = {country_id: 0 for country_id in country_ids}
+        country_visit_counts.update(
+            VisitedRegion.objects.filter(user=request_user, region__country_id__in=country_ids)
+            .order_by()
+            .values('region__country')
+            .annotate(count=Count('id'))
+            .values_list('region__country', 'count')
+        )
+
+    image_owner_ids = set()
+    image_sets = [location.images.all() for location in locations]
+    image_sets += [item.images.all() for item in collection.transportation_set.all()]
+    image_sets += [item.images.all() for item in collection.lodging_set.all()]
+    if collection.primary_image:
+        image_sets.append([collection.primary_image])
+    for images in image_sets:
+        image_owner_ids.update(image.user_id for image in images if image.immich_id)
+
+    immich_integrations = {user_id: None for user_id in image_owner_ids}
+    if image_owner_ids:
+        for integration in ImmichIntegration.objects.filter(user_id__in=image_owner_ids).order_by('id'):
+            if immich_integrations.get(integration.user_id) is None:
+                immich_integrations[integration.user_id] = integration
+
+    return {
+        'category_location_counts': category_location_counts,
+        'country_visit_counts': country_visit_counts,
+        'immich_integrations': immich_integrations,
+    }
+
+
+def collection_list_queryset(queryset):
+    """Select/prefetch and annotate what ``UltraSlimCollectionSerializer`` needs."""
+    return queryset.select_related('user', 'primary_image__user').prefetch_related(
+        'shared_with'
+    ).annotate(location_count=Count('locations', distinct=True))
+
+
+def collection_cover_images(collections, limit=COVER_IMAGE_LIMIT):
+    """
+    Return ``{collection_id: [ContentImage, ...]}`` with up to ``limit`` images
+    of the collections' locations, ordered the collection's primary image
+    first, then images marked primary, then by id.
+
+    All collections are served by one query ranking images with
+    ``ROW_NUMBER() OVER (PARTITION BY collection)``.
+    """
+    collection_ids = [collection.id for collection in collections]
+    covers = {collection_id: [] for collection_id in collection_ids}
+    if not collection_ids:
+        return covers
+
+    cover_order = Case(
+        When(id=F('location__collections__primary_image'), then=Value(0)),
+        When(is_primary=True, then=Value(1)),
+        default=Value(2),
+        output_field=IntegerField(),
+    )
+    images = (
+        ContentImage.objects.filter(location__collections__in=collection_ids)
+        .select_related('user')
+        .annotate(
+            cover_collection_id=F('location__collections'),
+            cover_rank=Window(
+                RowNumber(),
+                partition_by=F('location__collections'),
+                order_by=[cover_order.asc(), F('id').asc()],
+            ),
+        )
+        .filter(cover_rank__lte=limit)
+        .order_by('cover_collection_id', 'cover_rank')
+    )
+    for image in images:
+        covers[image.cover_collection_id].append(image)
+    return covers
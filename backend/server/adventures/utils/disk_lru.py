@@ -0,0 +1,115 @@
+"""
+Size-bounded on-disk caches evicted least recently used first.
+
+A ``DiskLRU`` is a directory of cache files with a byte budget. Recency is the
+file's modification time: ``touch()`` refreshes it on a hit (at most once per
+``TOUCH_INTERVAL``) and ``add()`` records a newly written file. Once the
+directory grows past its budget the oldest files are removed until it is back
+under ``EVICT_TO`` of the budget.
+
+The running total is kept in the Django cache so the directory is only
+scanned when the total is missing or when evicting; one process evicts at a
+time.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# A hit only rewrites the file's mtime when it is older than this
+TOUCH_INTERVAL = 60 * 60
+
+# Share of the budget a cache is trimmed to when it overflows
+EVICT_TO = 0.9
+
+
+class DiskLRU:
+    """
+    ``root`` and ``max_bytes_setting`` are read when used, so settings
+    overridden at runtime (and in tests) are honoured.
+    """
+
+    def __init__(self, name, root, max_bytes_setting):
+        self.name = name
+        self._root = root
+        self.max_bytes_setting = max_bytes_setting
+
+    @property
+    def root(self):
+        return str(self._root())
+
+    @property
+    def max_bytes(self):
+        return getattr(settings, self.max_bytes_setting)
+
+    @property
+    def _total_key(self):
+        return f'disk_lru_total:{self.name}'
+
+    @property
+    def _lock_key(self):
+        return f'disk_lru_evicting:{self.name}'
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    def _scan(self):
+        """Return ``[(mtime, size, path)]`` for every file in the cache."""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def touch(self, path, mtime=None):
+        """Mark ``path`` as used. ``mtime`` saves a stat when the caller has it."""
+        now = time.time()
+        try:
+            if mtime is None:
+                mtime = os.stat(path).st_mtime
+            if now - mtime > TOUCH_INTERVAL:
+                os.utime(path, (now, now))
+        except FileNotFoundError:
+            pass
+
+    def add(self, size):
+        """Record ``size`` new bytes, evicting if the budget is exceeded."""
+        try:
+            total = cache.incr(self._total_key, size)
+        except ValueError:
+            total = sum(entry_size for _, entry_size, _ in self._scan())
+            cache.set(self._total_key, total, None)
+        if total > self.max_bytes and cache.add(self._lock_key, True, 60):
+            try:
+                self.evict()
+            finally:
+                cache.delete(self._lock_key)
+
+    def forget_total(self):
+        """Call after removing files behind the cache's back."""
+        cache.delete(self._total_key)
+
+    def evict(self, max_bytes=None):
+        """Remove least recently used files until the cache fits the budget."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = max_bytes * EVICT_TO if total > max_bytes else total
+        removed = 0
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        cache.set(self._total_key, total, None)
+        return removed
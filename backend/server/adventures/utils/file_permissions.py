@@ -1,8 +1,59 @@
-from adventures.models import ContentImage, ContentAttachment
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from adventures.models import Collection, ContentImage, ContentAttachment
 
 from adventures.models import Visit
 
-protected_paths = ['images/', 'attachments/']
+protected_paths = ['images/', 'attachments/', 'jobs/']
+
+# Decisions are cached under a generation that any sharing or publicity
+# change replaces, which drops every cached decision at once
+PERMISSION_GENERATION_KEY = 'media_permission_generation'
+
+
+def _permission_generation():
+    generation = cache.get(PERMISSION_GENERATION_KEY)
+    if generation is None:
+        cache.add(PERMISSION_GENERATION_KEY, uuid.uuid4().hex, None)
+        generation = cache.get(PERMISSION_GENERATION_KEY)
+    return generation
+
+
+def invalidate_media_permissions():
+    """Forget every cached media permission decision."""
+    cache.set(PERMISSION_GENERATION_KEY, uuid.uuid4().hex, None)
+
+
+def _decision_cache_key(user, path):
+    user_key = user.id if user.is_authenticated else 'anonymous'
+    path_hash = hashlib.sha1(path.encode('utf-8')).hexdigest()
+    return f'media_permission:{_permission_generation()}:{user_key}:{path_hash}'
+
+
+def cached_permission(user, path, check):
+    """
+    Return ``check()`` for ``user`` and ``path``, caching the decision for
+    ``MEDIA_PERMISSION_CACHE_TTL``. Decisions are dropped on sharing and
+    publicity changes; ``check`` must not return None.
+    """
+    cache_key = _decision_cache_key(user, path)
+    decision = cache.get(cache_key)
+    if decision is None:
+        decision = check()
+        cache.set(cache_key, decision, settings.MEDIA_PERMISSION_CACHE_TTL)
+    return decision
+
+
+def _is_collaborator(collections, user):
+    """Whether ``user`` owns or is shared one of ``collections``, in one query."""
+    if not user.is_authenticated:
+        return False
+    return collections.filter(Q(user_id=user.id) | Q(shared_with__id=user.id)).exists()
 
 def _check_content_object_permission(content_object, user):
     """Check if user has permission to access a content object."""
@@ -20,21 +71,25 @@ def _check_content_object_permission(content_object, user):
         return True
 
     # Check collection-based permissions
-    if hasattr(content_object, 'collections') and content_object.collections.exists():
-        for collection in content_object.collections.all():
-            if collection.user == user or collection.shared_with.filter(id=user.id).exists():
-                return True
-        return False
-    elif hasattr(content_object, 'collection') and content_object.collection:
-        if content_object.collection.user == user or content_object.collection.shared_with.filter(id=user.id).exists():
-            return True
-        return False
+    if hasattr(content_object, 'collections'):
+        return _is_collaborator(content_object.collections.all(), user)
+    elif hasattr(content_object, 'collection') and content_object.collection_id:
+        return _is_collaborator(Collection.objects.filter(id=content_object.collection_id), user)
     else:
         return False
 
 def checkFilePermission(fileId, user, mediaType):
     if mediaType not in protected_paths:
         return True
+    if mediaType == 'jobs/':
+        # Job archives are only handed out by the jobs API, never as media
+        return False
+
+    return cached_permission(
+        user, f'{mediaType}{fileId}', lambda: _check_file_permission(fileId, user, mediaType)
+    )
+
+def _check_file_permission(fileId, user, mediaType):
     if mediaType == 'images/':
         image_path = f"images/{fileId}"
         # Use filter() instead of get() to handle multiple ContentImage entries
@@ -49,10 +104,14 @@ def checkFilePermission(fileId, user, mediaType):
                 return True
         return False
     elif mediaType == 'attachments/':
-        try:
-            attachment_path = f"attachments/{fileId}"
-            content_attachment = ContentAttachment.objects.get(file=attachment_path)
-            content_object = content_attachment.content_object
-            return _check_content_object_permission(content_object, user) if content_object else False
-        except ContentAttachment.DoesNotExist:
+        attachment_path = f"attachments/{fileId}"
+        # Attachments are content-addressed, so several rows can share a file
+        content_attachments = ContentAttachment.objects.filter(file=attachment_path)
+        if not content_attachments.exists():
             return False
+        for content_attachment in content_attachments:
+            content_object = content_attachment.content_object
+            if content_object and _check_content_object_permission(content_object, user):
+                return True
+        return False
+    return False
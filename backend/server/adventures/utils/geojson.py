@@ -1,6 +1,11 @@
 import gpxpy
 import geojson
 
+from adventures.utils.track_simplify import pick_level, simplify_feature_collection
+
+# Stored tracks of an image/attachment's blob; defer them where GeoJSON is not served
+BLOB_GEOJSON_FIELDS = ('blob__geojson', 'blob__geojson_levels')
+
 def gpx_to_geojson(gpx_file):
     """
     Convert a GPX file to GeoJSON format.
@@ -36,4 +41,73 @@ def gpx_to_geojson(gpx_file):
         return {
             "error": str(e),
             "message": "Failed to convert GPX to GeoJSON"
-        }
\ No newline at end of file
+        }
+
+def track_levels(feature_collection):
+    """Simplified levels of a converted track; None when the conversion failed."""
+    if not feature_collection or 'error' in feature_collection:
+        return None
+    return simplify_feature_collection(feature_collection)
+
+
+def store_blob_geojson(blob):
+    """Convert a GPX blob to GeoJSON and keep the result and its levels on the blob."""
+    from adventures.models import MediaBlob
+
+    blob.geojson = gpx_to_geojson(blob.file)
+    blob.geojson_levels = track_levels(blob.geojson)
+    MediaBlob.objects.filter(id=blob.id).update(geojson=blob.geojson, geojson_levels=blob.geojson_levels)
+    return blob.geojson
+
+
+def attachment_geojson(attachment, level=None):
+    """
+    GeoJSON of a GPX attachment, converted once per stored file, simplified
+    to ``level`` meters or at full resolution when ``level`` is None.
+
+    Attachment files are content-addressed blobs, so a changed file is a new
+    blob and the stored GeoJSON can never be stale. Attachments without a
+    blob are converted on every call.
+    """
+    from adventures.models import MediaBlob
+
+    if not attachment.blob_id:
+        full = gpx_to_geojson(attachment.file)
+        return pick_level(full, track_levels(full) if level is not None else None, level)
+    blob = attachment.blob
+    if level is not None and blob.geojson_levels:
+        # Leaves a deferred full track unread
+        simplified = blob.geojson_levels.get(str(level))
+        if simplified is not None:
+            return simplified
+    if blob.geojson is None:
+        store_blob_geojson(blob)
+    elif blob.geojson_levels is None and level is not None and 'error' not in blob.geojson:
+        # Converted before levels were stored; the stored GeoJSON saves the parse
+        blob.geojson_levels = track_levels(blob.geojson)
+        MediaBlob.objects.filter(id=blob.id).update(geojson_levels=blob.geojson_levels)
+    return pick_level(blob.geojson, blob.geojson_levels, level)
+
+
+def store_activity_geojson(activity):
+    """Convert an activity's GPX file and keep the result and its levels on the row."""
+    from adventures.models import Activity
+
+    full = gpx_to_geojson(activity.gpx_file)
+    activity.gpx_geojson = {'file': activity.gpx_file.name, 'full': full, 'levels': track_levels(full)}
+    Activity.objects.filter(id=activity.id).update(gpx_geojson=activity.gpx_geojson)
+    return activity.gpx_geojson
+
+
+def activity_geojson(activity, level=None):
+    """
+    GeoJSON of an activity's GPX file, simplified to ``level`` meters or at
+    full resolution when ``level`` is None. Converted again whenever the
+    stored result was read from a different file.
+    """
+    if not activity.gpx_file:
+        return None
+    stored = activity.gpx_geojson
+    if not stored or stored.get('file') != activity.gpx_file.name:
+        stored = store_activity_geojson(activity)
+    return pick_level(stored['full'], stored['levels'], level)
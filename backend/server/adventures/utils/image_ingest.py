@@ -0,0 +1,237 @@
+"""
+Background processing of uploaded images.
+
+Uploads used to be decoded and re-encoded to WEBP inside the request, which
+blocks a gunicorn worker for seconds on large phone photos. The uploaded
+file is now stored as-is and the row is marked ``processing``; the
+``run_data_jobs`` worker then claims pending images and hands them to a
+bounded process pool, which:
+
+- applies the EXIF orientation and strips all metadata
+- fits the image into ``IMAGE_MAX_SIZE`` and encodes it to WEBP
+- writes every rendition from the decoded image
+- computes a 16px inline WEBP placeholder (LQIP) stored on the row
+
+Back in the worker the normalized file becomes the image's blob, the
+original blob is removed once nothing else uses it and ``processing`` is
+cleared. Images that cannot be decoded keep their original file.
+
+Pool functions only take and return plain paths and values so they run in a
+fresh interpreter without Django; models are imported where they are used.
+"""
+import base64
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from adventures.utils.renditions import (
+    RENDITION_SIZES, available_formats, rendition_cache, rendition_name, save_rendition,
+)
+
+logger = logging.getLogger(__name__)
+
+# Same bounds and quality the images field used to apply on save
+IMAGE_MAX_SIZE = (1920, 1080)
+IMAGE_QUALITY = 75
+
+# Longest edge of the inline placeholder, in pixels
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 40
+
+# A claim older than this belongs to a worker that died
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def image_placeholder(image):
+    """Return a tiny WEBP of an open, upright ``image`` as a data URI."""
+    image = image.copy()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BOX)
+    out = io.BytesIO()
+    image.save(out, format='WEBP', quality=PLACEHOLDER_QUALITY)
+    return 'data:image/webp;base64,' + base64.b64encode(out.getvalue()).decode('ascii')
+
+
+def placeholder_for_file(path):
+    """Pool task: the placeholder of a stored image."""
+    with Image.open(path) as image:
+        return image_placeholder(ImageOps.exif_transpose(image))
+
+
+def normalize_image(source_path, media_root, rendition_formats):
+    """
+    Pool task: write the normalized WEBP of ``source_path`` to a temporary
+    file in ``media_root/images`` plus its missing renditions. Returns
+    ``(temporary path, sha256, size, rendition bytes written, placeholder)``.
+
+    A source that is already a metadata-free WEBP within ``IMAGE_MAX_SIZE``
+    (e.g. an image restored from an export) is kept rather than re-encoded;
+    the temporary path is then None.
+    """
+    images_dir = os.path.join(media_root, 'images')
+    with Image.open(source_path) as original:
+        normalized = (
+            original.format == 'WEBP' and not original.getexif()
+            and original.width <= IMAGE_MAX_SIZE[0] and original.height <= IMAGE_MAX_SIZE[1]
+        )
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+        image.thumbnail(IMAGE_MAX_SIZE, Image.Resampling.LANCZOS)
+
+        if normalized:
+            tmp_path = None
+            sha256 = _sha256_file(source_path)
+            stored_name = os.path.relpath(source_path, media_root).replace(os.sep, '/')
+        else:
+            fd, tmp_path = tempfile.mkstemp(dir=images_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as out:
+                    # No exif= argument, so no metadata is carried over
+                    image.save(out, format='WEBP', quality=IMAGE_QUALITY)
+                sha256 = _sha256_file(tmp_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            stored_name = f'images/{sha256}.webp'
+
+        rendition_bytes = 0
+        for size, width in RENDITION_SIZES.items():
+            for image_format in rendition_formats:
+                target = os.path.join(media_root, rendition_name(stored_name, size, image_format))
+                if not os.path.exists(target):
+                    rendition_bytes += save_rendition(image.copy(), target, width, image_format)
+        placeholder = image_placeholder(image)
+    return tmp_path, sha256, os.path.getsize(tmp_path or source_path), rendition_bytes, placeholder
+
+
+def claim_pending_images(limit):
+    """
+    Claim up to ``limit`` blobs whose images are waiting for processing and
+    return ``[(blob id, stored name)]``. Rows sharing a blob are processed once.
+    """
+    from adventures.models import ContentImage
+
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            ContentImage.objects.select_for_update(skip_locked=True)
+            .filter(processing=True, blob__isnull=False)
+            .filter(Q(processing_claimed_at__isnull=True) | Q(processing_claimed_at__lt=now - CLAIM_TIMEOUT))
+            .values_list('id', 'blob_id', 'blob__file')[:limit * 4]
+        )
+        claimed = {}
+        for _, blob_id, name in rows:
+            if blob_id in claimed or len(claimed) < limit:
+                claimed.setdefault(blob_id, name)
+        ContentImage.objects.filter(
+            id__in=[image_id for image_id, blob_id, _ in rows if blob_id in claimed]
+        ).update(processing_claimed_at=now)
+    return list(claimed.items())
+
+
+def finish_image(source_blob_id, result):
+    """Point the images waiting on ``source_blob_id`` at the normalized file."""
+    from adventures.models import ContentImage, MediaBlob
+
+    tmp_path, sha256, size, rendition_bytes, placeholder = result
+    with transaction.atomic():
+        blob, created = MediaBlob.objects.get_or_create(
+            kind='images', sha256=sha256, defaults={'file': f'images/{sha256}.webp', 'size': size},
+        )
+        target_path = os.path.join(settings.MEDIA_ROOT, blob.file.name)
+        if tmp_path is not None:
+            if created or not os.path.exists(target_path):
+                os.replace(tmp_path, target_path)
+            else:
+                os.remove(tmp_path)
+
+        moved = ContentImage.objects.filter(blob_id=source_blob_id, processing=True).update(
+            image=blob.file.name, blob=blob, placeholder=placeholder, processing=False, processing_claimed_at=None,
+        )
+        if moved and blob.id != source_blob_id:
+            MediaBlob.objects.filter(id=blob.id).update(ref_count=F('ref_count') + moved)
+            MediaBlob.objects.filter(id=source_blob_id).update(ref_count=F('ref_count') - moved)
+
+    if rendition_bytes:
+        rendition_cache.add(rendition_bytes)
+    # The original is not needed anymore unless another row shares it
+    for source in MediaBlob.objects.filter(
+        id=source_blob_id, ref_count=0, images__isnull=True, attachments__isnull=True,
+    ).exclude(id=blob.id):
+        source.delete()
+    return moved
+
+
+def fail_image(source_blob_id):
+    """Keep the original file of images that could not be processed."""
+    from adventures.models import ContentImage
+
+    return ContentImage.objects.filter(blob_id=source_blob_id, processing=True).update(
+        processing=False, processing_claimed_at=None,
+    )
+
+
+class ImageIngestor:
+    """
+    Feeds pending images to a process pool. ``poll()`` is called from the
+    ``run_data_jobs`` loop; at most two tasks per process are in flight.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._formats = available_formats()
+        # A fresh interpreter per process rather than forking a threaded worker
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        self._running = {}
+
+    @property
+    def busy(self):
+        return bool(self._running)
+
+    def poll(self):
+        """Record finished images and claim more."""
+        for future in [future for future in self._running if future.done()]:
+            self._finish(future, self._running.pop(future))
+
+        for blob_id, name in claim_pending_images(self.workers * 2 - len(self._running)):
+            source_path = os.path.join(settings.MEDIA_ROOT, name)
+            future = self._pool.submit(normalize_image, source_path, str(settings.MEDIA_ROOT), self._formats)
+            self._running[future] = blob_id
+
+    def _finish(self, future, blob_id):
+        try:
+            finish_image(blob_id, future.result())
+        except Exception:
+            logger.exception("Failed to process image blob %s; keeping the original", blob_id)
+            fail_image(blob_id)
+
+    def shutdown(self):
+        """Wait for running tasks and record them."""
+        self._pool.shutdown(wait=True)
+        for future, blob_id in list(self._running.items()):
+            self._finish(future, blob_id)
+        self._running.clear()
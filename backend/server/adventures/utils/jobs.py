@@ -0,0 +1,258 @@
+"""
+Background export and import jobs.
+
+Backups and collection archives can take minutes to build or restore, longer
+than a request should be held open. The endpoints therefore record a
+``DataJob`` and return ``202`` right away; the ``run_data_jobs`` worker
+claims queued jobs, runs them and stores the result archive under
+``MEDIA_ROOT/jobs/``. Clients poll ``/api/jobs/<id>/`` for status and progress
+and fetch the archive from ``/api/jobs/<id>/download/``. Scripts that want the
+result in the response itself can still pass ``?sync=true``.
+
+Imports run inside a transaction, so progress written to the job row would
+not be visible to pollers until the end. Progress is therefore published
+through the cache and only mirrored to the row outside of a transaction.
+"""
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from adventures.models import Collection, DataJob
+from adventures.utils.backup import (
+    BackupError, backup_archive_chunks, backup_filename, import_backup_archive, read_backup_manifest,
+)
+from adventures.utils.collection_archive import (
+    CollectionArchiveError, build_collection_export, collection_archive_chunks, collection_archive_filename,
+    import_collection_archive,
+)
+
+logger = logging.getLogger(__name__)
+
+# Seconds between progress writes while a job runs
+PROGRESS_INTERVAL = 1.0
+PROGRESS_CACHE_TIMEOUT = 60 * 60 * 6
+
+# A running job whose heartbeat is older than this lost its worker
+STALE_AFTER = timedelta(minutes=5)
+MAX_ATTEMPTS = 3
+
+# Finished jobs and their archives are removed after this long
+JOB_RETENTION = timedelta(days=7)
+
+
+class JobCancelled(Exception):
+    """Raised from the progress callback once a cancel was requested."""
+
+
+def wants_sync(request):
+    value = request.query_params.get('sync') or request.data.get('sync')
+    return str(value).lower() == 'true'
+
+
+def enqueue_job(user, kind, params=None, upload=None):
+    """Queue a job for the worker. ``upload`` is stored as the job's input file."""
+    job = DataJob(user=user, kind=kind, params=params or {})
+    if upload is not None:
+        extension = os.path.splitext(upload.name or '')[1] or '.zip'
+        job.input_file.save(f'{job.id}-input{extension}', upload, save=False)
+    job.save()
+    return job
+
+
+def _progress_cache_key(job_id):
+    return f'data_job_progress:{job_id}'
+
+
+def job_progress(job):
+    """Return ``(current, total)``, preferring the live value of a running job."""
+    if job.status == 'running':
+        live = cache.get(_progress_cache_key(job.id))
+        if live is not None:
+            return live
+    return job.progress_current, job.progress_total
+
+
+class JobProgress:
+    """Progress callback handed to the export/import functions."""
+
+    def __init__(self, job):
+        self.job = job
+        self._last_write = 0.0
+
+    def __call__(self, current, total):
+        now = time.monotonic()
+        if current < total and now - self._last_write < PROGRESS_INTERVAL:
+            return
+        self._last_write = now
+
+        cache.set(_progress_cache_key(self.job.id), (current, total), PROGRESS_CACHE_TIMEOUT)
+        if not connection.in_atomic_block:
+            DataJob.objects.filter(id=self.job.id).update(progress_current=current, progress_total=total)
+
+        # Reads the committed flag even inside the import transaction
+        if DataJob.objects.filter(id=self.job.id, cancel_requested=True).exists():
+            raise JobCancelled()
+
+
+def _write_result(job, chunks):
+    name = f'jobs/{job.id}.zip'
+    path = default_storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        with open(path, 'wb') as out:
+            for chunk in chunks:
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    job.result_file.name = name
+    job.save(update_fields=['result_file'])
+    return os.path.getsize(path)
+
+
+def _run_backup_export(job, progress):
+    # An input file is the parent of an incremental backup
+    parent = None
+    if job.input_file:
+        with job.input_file.open('rb') as parent_file:
+            parent = read_backup_manifest(parent_file)
+    size = _write_result(job, backup_archive_chunks(job.user, progress=progress, parent=parent))
+    return {'filename': backup_filename(job.user, incremental=parent is not None), 'size': size}
+
+
+def _run_backup_import(job, progress):
+    with job.input_file.open('rb') as archive:
+        summary = import_backup_archive(archive, job.user, progress=progress)
+    return {'summary': summary}
+
+
+def _run_collection_export(job, progress):
+    collection = Collection.objects.get(id=job.params['collection_id'])
+    export_data, media_entries = build_collection_export(collection)
+    size = _write_result(job, collection_archive_chunks(export_data, media_entries, progress=progress))
+    return {'filename': collection_archive_filename(collection), 'size': size}
+
+
+def _run_collection_import(job, progress):
+    # Atomic so a cancelled import leaves nothing half-created
+    with job.input_file.open('rb') as archive, transaction.atomic():
+        collection = import_collection_archive(archive, job.user, progress=progress)
+    return {'collection_id': str(collection.id), 'name': collection.name}
+
+
+JOB_HANDLERS = {
+    'backup_export': _run_backup_export,
+    'backup_import': _run_backup_import,
+    'collection_export': _run_collection_export,
+    'collection_import': _run_collection_import,
+}
+
+
+def claim_next_job():
+    """Mark the oldest queued job as running and return it, or ``None``."""
+    with transaction.atomic():
+        job = (
+            DataJob.objects.select_for_update(skip_locked=True)
+            .select_related('user')
+            .filter(status='queued')
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        now = timezone.now()
+        job.status = 'running'
+        job.started_at = now
+        job.heartbeat_at = now
+        job.attempts += 1
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at', 'attempts'])
+    return job
+
+
+def _finish(job, status, result=None, error=''):
+    job.status = status
+    job.result = result
+    job.error = error
+    job.finished_at = timezone.now()
+    update_fields = ['status', 'result', 'error', 'finished_at']
+
+    current, total = job_progress(job)
+    if status == 'succeeded':
+        current = total
+    job.progress_current, job.progress_total = current, total
+    update_fields += ['progress_current', 'progress_total']
+
+    # The uploaded archive is only needed while the job runs
+    if job.input_file:
+        job.input_file.delete(save=False)
+        update_fields.append('input_file')
+    if status != 'succeeded' and job.result_file:
+        job.result_file.delete(save=False)
+        update_fields.append('result_file')
+
+    job.save(update_fields=update_fields)
+    cache.delete(_progress_cache_key(job.id))
+
+
+def run_job(job):
+    """Run a claimed job to completion and record the outcome."""
+    try:
+        if DataJob.objects.filter(id=job.id, cancel_requested=True).exists():
+            raise JobCancelled()
+        result = JOB_HANDLERS[job.kind](job, JobProgress(job))
+    except JobCancelled:
+        _finish(job, 'cancelled')
+    except (BackupError, CollectionArchiveError) as e:
+        _finish(job, 'failed', error=str(e))
+    except Exception:
+        logger.exception("Data job %s (%s) failed", job.id, job.kind)
+        _finish(job, 'failed', error='An internal error occurred')
+    else:
+        _finish(job, 'succeeded', result=result)
+
+
+def cancel_job(job):
+    """Cancel a queued job right away or ask the worker to stop a running one."""
+    if job.is_finished:
+        return job
+    DataJob.objects.filter(id=job.id).update(cancel_requested=True)
+    updated = DataJob.objects.filter(id=job.id, status='queued').update(
+        status='cancelled', finished_at=timezone.now()
+    )
+    job.refresh_from_db()
+    if updated:
+        job.delete_files()
+    return job
+
+
+def touch_jobs(job_ids):
+    DataJob.objects.filter(id__in=job_ids, status='running').update(heartbeat_at=timezone.now())
+
+
+def requeue_stale_jobs():
+    """Requeue running jobs whose worker stopped, failing them after ``MAX_ATTEMPTS``."""
+    cutoff = timezone.now() - STALE_AFTER
+    stale = DataJob.objects.filter(status='running', heartbeat_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status='failed', error='The worker stopped while running the job', finished_at=timezone.now()
+    )
+    requeued = stale.filter(attempts__lt=MAX_ATTEMPTS).update(status='queued', heartbeat_at=None)
+    return requeued, failed
+
+
+def purge_expired_jobs():
+    """Delete finished jobs, and their archives, older than ``JOB_RETENTION``."""
+    cutoff = timezone.now() - JOB_RETENTION
+    expired = DataJob.objects.filter(status__in=['succeeded', 'failed', 'cancelled'], finished_at__lt=cutoff)
+    count = 0
+    for job in expired.iterator():
+        job.delete()
+        count += 1
+    return count
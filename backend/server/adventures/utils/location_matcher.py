@@ -0,0 +1,140 @@
+"""
+Duplicate detection for imported locations.
+
+Scoring every incoming location against every existing one with
+``SequenceMatcher`` is O(incoming x existing). ``LocationMatchIndex`` blocks
+candidates first: a location is only scored when its normalized name shares
+enough character trigrams with the incoming name, or when its coordinates
+fall in the same or a neighbouring grid cell. The scoring rules themselves
+are unchanged.
+"""
+import math
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+
+# Coordinates closer than this in both latitude and longitude count as "close"
+COORD_THRESHOLD = 0.02
+
+# Share of the shorter name's trigrams a candidate must have in common. Names
+# with a SequenceMatcher ratio of 0.85 or more share well over half of them.
+MIN_SHARED_TRIGRAMS = 0.4
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_name(value):
+    return _WHITESPACE.sub(' ', (value or '').strip().lower())
+
+
+def name_trigrams(value):
+    """Character trigrams of a normalized name, padded like ``pg_trgm``."""
+    padded = f"  {normalize_name(value)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity_ratio(a, b):
+    a = (a or '').strip().lower()
+    b = (b or '').strip().lower()
+    if not a and not b:
+        return 1.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def coords_close(lat1, lon1, lat2, lon2, threshold=COORD_THRESHOLD):
+    try:
+        if lat1 is None or lon1 is None or lat2 is None or lon2 is None:
+            return False
+        return abs(float(lat1) - float(lat2)) <= threshold and abs(float(lon1) - float(lon2)) <= threshold
+    except Exception:
+        return False
+
+
+def _grid_cell(latitude, longitude):
+    try:
+        if latitude is None or longitude is None:
+            return None
+        return (
+            math.floor(float(latitude) / COORD_THRESHOLD),
+            math.floor(float(longitude) / COORD_THRESHOLD),
+        )
+    except (TypeError, ValueError):
+        return None
+
+
+class LocationMatchIndex:
+    """In-memory blocking index over a user's locations."""
+
+    def __init__(self, locations=()):
+        self._locations = []
+        self._trigrams = []
+        self._by_trigram = defaultdict(set)
+        self._by_cell = defaultdict(set)
+        for location in locations:
+            self.add(location)
+
+    @classmethod
+    def for_user(cls, user):
+        from adventures.models import Location
+
+        return cls(
+            Location.objects.filter(user=user)
+            .only('id', 'user_id', 'name', 'location', 'latitude', 'longitude')
+            .order_by()
+        )
+
+    def add(self, location):
+        position = len(self._locations)
+        trigrams = name_trigrams(location.name)
+        self._locations.append(location)
+        self._trigrams.append(trigrams)
+        for trigram in trigrams:
+            self._by_trigram[trigram].add(position)
+        cell = _grid_cell(location.latitude, location.longitude)
+        if cell is not None:
+            self._by_cell[cell].add(position)
+
+    def _candidates(self, name, latitude, longitude):
+        positions = set()
+
+        trigrams = name_trigrams(name)
+        shared = defaultdict(int)
+        for trigram in trigrams:
+            for position in self._by_trigram.get(trigram, ()):
+                shared[position] += 1
+        for position, count in shared.items():
+            smaller = min(len(trigrams), len(self._trigrams[position]))
+            if count >= MIN_SHARED_TRIGRAMS * smaller:
+                positions.add(position)
+
+        cell = _grid_cell(latitude, longitude)
+        if cell is not None:
+            lat_cell, lon_cell = cell
+            for d_lat in (-1, 0, 1):
+                for d_lon in (-1, 0, 1):
+                    positions.update(self._by_cell.get((lat_cell + d_lat, lon_cell + d_lon), ()))
+
+        # Score in insertion order so ties resolve like a sequential scan
+        return [self._locations[position] for position in sorted(positions)]
+
+    def find_match(self, name, location_text, latitude, longitude):
+        """
+        Return the most similar existing location, or ``None``. A match needs a
+        strong name match, or a decent one plus a matching location text or
+        nearby coordinates.
+        """
+        best_match = None
+        best_score = 0.0
+        for candidate in self._candidates(name, latitude, longitude):
+            name_score = similarity_ratio(name, candidate.name)
+            loc_text_score = similarity_ratio(location_text, candidate.location)
+            close_coords = coords_close(latitude, longitude, candidate.latitude, candidate.longitude)
+            combined_score = max(name_score, (name_score + loc_text_score) / 2.0)
+            if close_coords:
+                combined_score = max(combined_score, name_score + 0.1)  # small boost for coord proximity
+            if combined_score > best_score and (
+                name_score >= 0.92 or (name_score >= 0.85 and (loc_text_score >= 0.85 or close_coords))
+            ):
+                best_score = combined_score
+                best_match = candidate
+        return best_match
@@ -0,0 +1,242 @@
+"""
+Content-addressed storage for ContentImage and ContentAttachment files.
+
+Every stored file lives at ``<kind>/<sha256><ext>`` and is tracked by a
+``MediaBlob`` row whose ``ref_count`` is the number of images/attachments
+pointing at it. Rows with identical bytes share a single file on disk, so
+duplicating a location or collection only adds database rows. Blobs whose
+refcount drops to zero are removed by the ``image_cleanup`` command.
+"""
+import hashlib
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_field_file(field_file):
+    """Return ``(sha256, size)`` for a stored file, reading it in chunks."""
+    digest = hashlib.sha256()
+    size = 0
+    field_file.open('rb')
+    try:
+        for chunk in field_file.chunks(CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+    finally:
+        try:
+            field_file.close()
+        except Exception:
+            pass
+    return digest.hexdigest(), size
+
+
+def blob_name(kind, sha256, source_name):
+    ext = os.path.splitext(source_name or '')[1].lower()
+    return f"{kind}/{sha256}{ext}"
+
+
+def _move_stored_file(src_name, dst_name):
+    src_path = default_storage.path(src_name)
+    dst_path = default_storage.path(dst_name)
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    os.replace(src_path, dst_path)
+
+
+def find_blob(kind, sha256):
+    from adventures.models import MediaBlob
+    return MediaBlob.objects.filter(kind=kind, sha256=sha256).first()
+
+
+def find_blob_for_bytes(kind, data):
+    """Return an existing blob holding exactly ``data``, if any."""
+    return find_blob(kind, hash_bytes(data))
+
+
+def adopt_file(field_file, kind):
+    """
+    Move a freshly stored file into the blob store and return its MediaBlob.
+
+    If a blob with the same content already exists the new copy is removed
+    and the existing blob is returned. The refcount is not touched.
+    """
+    from adventures.models import MediaBlob
+
+    sha256, size = hash_field_file(field_file)
+    target_name = blob_name(kind, sha256, field_file.name)
+    blob, created = MediaBlob.objects.get_or_create(
+        kind=kind,
+        sha256=sha256,
+        defaults={'file': target_name, 'size': size},
+    )
+
+    if field_file.name != blob.file.name:
+        if created or not default_storage.exists(blob.file.name):
+            _move_stored_file(field_file.name, blob.file.name)
+        else:
+            default_storage.delete(field_file.name)
+    return blob
+
+
+def find_blobs(kind, sha256s):
+    """Return ``{sha256: MediaBlob}`` for the given hashes whose file is still stored."""
+    from adventures.models import MediaBlob
+    if not sha256s:
+        return {}
+    return {
+        blob.sha256: blob
+        for blob in MediaBlob.objects.filter(kind=kind, sha256__in=set(sha256s))
+        if default_storage.exists(blob.file.name)
+    }
+
+
+def stage_file(model, field_name, data, name):
+    """
+    Store ``data`` the way saving a new ``model`` row would (upload path and
+    any field processing) and return ``(stored name, sha256, size)`` of the
+    stored file. Only storage is touched, so this can run in worker threads;
+    ``adopt_staged_files`` moves the files into the blob store afterwards.
+    """
+    field_file = getattr(model(), field_name)
+    field_file.save(name, ContentFile(data, name=name), save=False)
+    sha256, size = hash_field_file(field_file)
+    return field_file.name, sha256, size
+
+
+def adopt_staged_files(kind, staged):
+    """
+    Batch version of ``adopt_file`` for ``(stored name, sha256, size)`` tuples
+    from ``stage_file``. Returns ``{stored name: MediaBlob}``; refcounts are
+    not touched.
+    """
+    from adventures.models import MediaBlob
+
+    hashes = {sha256 for _, sha256, _ in staged}
+    blobs = {blob.sha256: blob for blob in MediaBlob.objects.filter(kind=kind, sha256__in=hashes)}
+    new_blobs = {}
+    for stored_name, sha256, size in staged:
+        if sha256 not in blobs and sha256 not in new_blobs:
+            new_blobs[sha256] = MediaBlob(
+                kind=kind, sha256=sha256, file=blob_name(kind, sha256, stored_name), size=size,
+            )
+    if new_blobs:
+        # A concurrent upload may have created some of them meanwhile
+        MediaBlob.objects.bulk_create(new_blobs.values(), ignore_conflicts=True)
+        blobs.update(
+            (blob.sha256, blob) for blob in MediaBlob.objects.filter(kind=kind, sha256__in=set(new_blobs))
+        )
+
+    adopted = {}
+    for stored_name, sha256, _ in staged:
+        blob = blobs[sha256]
+        if stored_name != blob.file.name:
+            if not default_storage.exists(blob.file.name):
+                _move_stored_file(stored_name, blob.file.name)
+            else:
+                default_storage.delete(stored_name)
+        adopted[stored_name] = blob
+    return adopted
+
+
+def acquire(blob_id):
+    from adventures.models import MediaBlob
+    MediaBlob.objects.filter(id=blob_id).update(ref_count=F('ref_count') + 1)
+
+
+def acquire_many(blob_ids):
+    """Add one reference per occurrence in ``blob_ids``, one query per distinct count."""
+    from collections import Counter
+    from adventures.models import MediaBlob
+
+    by_count = {}
+    for blob_id, count in Counter(blob_ids).items():
+        by_count.setdefault(count, []).append(blob_id)
+    for count, ids in by_count.items():
+        MediaBlob.objects.filter(id__in=ids).update(ref_count=F('ref_count') + count)
+
+
+def release(blob_id):
+    from adventures.models import MediaBlob
+    MediaBlob.objects.filter(id=blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+
+
+def sync_instance_blob(instance, previous_blob_id=None):
+    """
+    Point a saved ContentImage/ContentAttachment at the blob holding its file.
+
+    ``previous_blob_id`` is the blob the row referenced before this save; it is
+    released when the row now points elsewhere (or at nothing).
+    """
+    field_file = getattr(instance, instance.blob_field_name)
+    blob = None
+    if field_file and field_file.name:
+        if instance.blob_id and instance.blob.file.name == field_file.name:
+            blob = instance.blob
+        else:
+            blob = adopt_file(field_file, instance.blob_kind)
+
+    updates = {}
+    if blob is not None and field_file.name != blob.file.name:
+        field_file.name = blob.file.name
+        updates[instance.blob_field_name] = blob.file.name
+    new_blob_id = blob.id if blob is not None else None
+    if instance.blob_id != new_blob_id:
+        updates['blob'] = blob
+    instance.blob = blob
+
+    if updates:
+        type(instance).objects.filter(pk=instance.pk).update(**updates)
+
+    if new_blob_id != previous_blob_id:
+        if new_blob_id:
+            acquire(new_blob_id)
+        if previous_blob_id:
+            release(previous_blob_id)
+    return blob
+
+
+def ensure_blob(instance):
+    """Return the blob backing ``instance``, migrating a legacy file on demand."""
+    if instance.blob_id:
+        return instance.blob
+    return sync_instance_blob(instance, previous_blob_id=None)
+
+
+def shared_file_kwargs(source):
+    """
+    Keyword arguments that make a new ContentImage/ContentAttachment share the
+    file of ``source`` instead of copying its bytes.
+    """
+    blob = ensure_blob(source)
+    if blob is None:
+        return {}
+    kwargs = {source.blob_field_name: blob.file.name, 'blob': blob}
+    if getattr(source, 'placeholder', ''):
+        kwargs['placeholder'] = source.placeholder
+    if getattr(source, 'processing', False):
+        # Joins the pending claim on the blob, so the ingest worker moves the
+        # copy to the normalized file along with the source
+        kwargs['processing'] = True
+        kwargs['processing_claimed_at'] = source.processing_claimed_at
+    return kwargs
+
+
+def file_kwargs_for_bytes(kind, field_name, data, name):
+    """
+    Keyword arguments for a new ContentImage/ContentAttachment holding ``data``.
+
+    Reuses an existing blob when the bytes are already stored (e.g. re-importing
+    an export), otherwise falls back to a regular upload that is adopted into
+    the blob store on save.
+    """
+    blob = find_blob_for_bytes(kind, data)
+    if blob is not None and default_storage.exists(blob.file.name):
+        return {field_name: blob.file.name, 'blob': blob}
+    return {field_name: ContentFile(data, name=name)}
@@ -0,0 +1,213 @@
+"""
+Consistency check between stored media files and the database.
+
+``check_media()`` walks the media directories with ``os.scandir`` on a thread
+pool and streams every file name stored in the database with
+``values_list().iterator()``, so neither side is loaded as model instances.
+It reports:
+
+- orphans: files under the media directories no row references
+- missing: rows whose file is not on disk
+- dead blobs: MediaBlob rows nothing references anymore
+- file counts and byte totals per directory
+
+Files younger than ``ORPHAN_MIN_AGE`` are never orphans; they may belong to
+an upload whose row is not committed yet. Deletion re-checks references in
+batches so files claimed after the scan are kept.
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from adventures.models import Activity, ContentAttachment, ContentImage, MediaBlob
+from users.models import CustomUser
+
+# Top-level media directories holding files referenced by rows. Renditions and
+# job files are managed by their own code.
+MEDIA_DIRS = ('images', 'attachments', 'profile-pics', 'activities')
+
+# (model, file field) pairs whose values are media names
+MEDIA_REFERENCES = (
+    (ContentImage, 'image'),
+    (ContentAttachment, 'file'),
+    (MediaBlob, 'file'),
+    (CustomUser, 'profile_pic'),
+    (Activity, 'gpx_file'),
+)
+
+ORPHAN_MIN_AGE = 60 * 60
+
+DEFAULT_BATCH_SIZE = 500
+
+ITERATOR_CHUNK_SIZE = 2000
+
+
+class MediaReport:
+    def __init__(self):
+        self.directories = {}
+        self.orphans = []
+        self.missing = []
+        self.dead_blobs = []
+        self.referenced_bytes = 0
+        self.recent_files = 0
+
+    @property
+    def orphan_bytes(self):
+        return sum(size for _, size in self.orphans)
+
+    @property
+    def dead_blob_bytes(self):
+        return sum(size for _, _, size in self.dead_blobs)
+
+    @property
+    def is_clean(self):
+        return not (self.orphans or self.missing or self.dead_blobs)
+
+    def as_dict(self):
+        return {
+            'directories': self.directories,
+            'referenced_bytes': self.referenced_bytes,
+            'recent_files': self.recent_files,
+            'orphans': [{'name': name, 'size': size} for name, size in self.orphans],
+            'orphan_bytes': self.orphan_bytes,
+            'missing': [{'model': label, 'id': str(pk), 'name': name} for label, pk, name in self.missing],
+            'dead_blobs': [{'id': str(pk), 'name': name, 'size': size} for pk, name, size in self.dead_blobs],
+            'dead_blob_bytes': self.dead_blob_bytes,
+        }
+
+
+def _scan_dir(path, name_prefix):
+    """Return ``({name: (size, mtime)}, [(path, name_prefix)])`` for one directory."""
+    files = {}
+    subdirectories = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            name = f'{name_prefix}/{entry.name}'
+            if entry.is_dir(follow_symlinks=False):
+                subdirectories.append((entry.path, name))
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                files[name] = (stat.st_size, stat.st_mtime)
+    return files, subdirectories
+
+
+def scan_media(workers=None):
+    """Return ``{name: (size, mtime)}`` for every file in ``MEDIA_DIRS``."""
+    files = {}
+    with ThreadPoolExecutor(max_workers=workers or min(8, (os.cpu_count() or 1) * 2)) as pool:
+        pending = {
+            pool.submit(_scan_dir, os.path.join(settings.MEDIA_ROOT, directory), directory)
+            for directory in MEDIA_DIRS
+            if os.path.isdir(os.path.join(settings.MEDIA_ROOT, directory))
+        }
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dir_files, subdirectories = future.result()
+                files.update(dir_files)
+                pending |= {pool.submit(_scan_dir, path, name) for path, name in subdirectories}
+    return files
+
+
+def media_references():
+    """Yield ``(model label, pk, name)`` for every media name stored in the database."""
+    for model, field in MEDIA_REFERENCES:
+        rows = (
+            model.objects
+            .exclude(**{f'{field}__isnull': True})
+            .exclude(**{field: ''})
+            .values_list('pk', field)
+            .iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+        )
+        for pk, name in rows:
+            yield model._meta.label, pk, name
+
+
+def _dead_blobs():
+    return MediaBlob.objects.filter(ref_count=0, images__isnull=True, attachments__isnull=True)
+
+
+def check_media(workers=None, min_age=ORPHAN_MIN_AGE):
+    report = MediaReport()
+    files = scan_media(workers)
+
+    for name, (size, _) in files.items():
+        directory = report.directories.setdefault(name.split('/', 1)[0], {'files': 0, 'bytes': 0})
+        directory['files'] += 1
+        directory['bytes'] += size
+
+    referenced = set()
+    for label, pk, name in media_references():
+        if name in files:
+            if name not in referenced:
+                referenced.add(name)
+                report.referenced_bytes += files[name][0]
+        elif name.split('/', 1)[0] in MEDIA_DIRS or not os.path.isfile(os.path.join(settings.MEDIA_ROOT, name)):
+            report.missing.append((label, pk, name))
+
+    cutoff = time.time() - min_age
+    for name, (size, mtime) in sorted(files.items()):
+        if name in referenced:
+            continue
+        if mtime > cutoff:
+            report.recent_files += 1
+        else:
+            report.orphans.append((name, size))
+
+    report.dead_blobs = list(
+        _dead_blobs().values_list('pk', 'file', 'size').iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    )
+    return report
+
+
+def _still_referenced(names):
+    referenced = set()
+    for model, field in MEDIA_REFERENCES:
+        referenced.update(model.objects.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+    return referenced
+
+
+def _batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def delete_orphans(report, batch_size=DEFAULT_BATCH_SIZE, errors=None):
+    """Remove the report's orphan files; returns how many were deleted."""
+    from adventures.utils.renditions import delete_renditions
+
+    deleted = 0
+    for batch in _batches([name for name, _ in report.orphans], batch_size):
+        referenced = _still_referenced(batch)
+        for name in batch:
+            if name in referenced:
+                continue
+            try:
+                os.remove(os.path.join(settings.MEDIA_ROOT, name))
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                if errors is not None:
+                    errors.append((name, str(e)))
+                continue
+            if name.startswith('images/'):
+                delete_renditions(name)
+            deleted += 1
+    return deleted
+
+
+def collect_dead_blobs(report, batch_size=DEFAULT_BATCH_SIZE, errors=None):
+    """Remove the report's dead blobs, row and file; returns how many were collected."""
+    collected = 0
+    for batch in _batches([pk for pk, _, _ in report.dead_blobs], batch_size):
+        # Re-checked under the current refcount in case a blob was reused meanwhile
+        for blob in _dead_blobs().filter(pk__in=batch):
+            try:
+                blob.delete()
+                collected += 1
+            except Exception as e:
+                if errors is not None:
+                    errors.append((blob.file.name, str(e)))
+    return collected
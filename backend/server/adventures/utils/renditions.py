@@ -0,0 +1,135 @@
+"""
+Resized renditions of uploaded images.
+
+Location images are stored at full size, which is far more than a card or a
+collection cover needs. Smaller WEBP and AVIF renditions are generated the
+first time they are requested and kept under ``MEDIA_ROOT/renditions/``:
+
+    renditions/<original file name>/<size>.<format>
+
+The rendition cache is a ``DiskLRU`` bounded by ``RENDITION_CACHE_MAX_BYTES``:
+serving a rendition marks it as used and the least recently used renditions
+are removed once the budget is exceeded.
+"""
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+
+from django.conf import settings
+from PIL import Image, ImageOps, features
+
+from adventures.utils.disk_lru import DiskLRU
+from adventures.utils.media_signing import media_url
+
+RENDITIONS_DIR = 'renditions'
+
+# Longest edge of each rendition, in pixels
+RENDITION_SIZES = {
+    'thumbnail': 320,
+    'medium': 800,
+    'large': 1600,
+}
+
+# Formats in order of preference, with their encoder options
+RENDITION_FORMATS = {
+    'avif': {'format': 'AVIF', 'quality': 60},
+    'webp': {'format': 'WEBP', 'quality': 75},
+}
+
+rendition_cache = DiskLRU(
+    'renditions',
+    root=lambda: os.path.join(settings.MEDIA_ROOT, RENDITIONS_DIR),
+    max_bytes_setting='RENDITION_CACHE_MAX_BYTES',
+)
+
+
+@lru_cache(maxsize=None)
+def available_formats():
+    """Rendition formats the installed Pillow can encode."""
+    return tuple(name for name in RENDITION_FORMATS if features.check(name))
+
+
+def rendition_name(original_name, size, image_format):
+    """Media path of a rendition of the stored image ``original_name``."""
+    return f"{RENDITIONS_DIR}/{os.path.basename(original_name)}/{size}.{image_format}"
+
+
+def rendition_urls(base_url, original_name):
+    """
+    Return ``{size: {'width': ..., <format>: url}}`` for every rendition of a
+    stored image. The URLs are valid before the renditions exist.
+    """
+
+    formats = available_formats()
+    renditions = {}
+    for size, width in RENDITION_SIZES.items():
+        renditions[size] = {'width': width}
+        for image_format in formats:
+            renditions[size][image_format] = media_url(base_url, rendition_name(original_name, size, image_format))
+    return renditions
+
+
+def evict_renditions(max_bytes=None):
+    """Remove least recently used renditions until the cache fits the budget."""
+    return rendition_cache.evict(max_bytes)
+
+
+def save_rendition(image, target_path, width, image_format):
+    """
+    Write a rendition of an open, upright ``image`` to ``target_path`` and
+    return its size. ``image`` is resized in place.
+    """
+    options = dict(RENDITION_FORMATS[image_format])
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    # thumbnail() keeps the aspect ratio and never enlarges
+    image.thumbnail((width, width), Image.Resampling.LANCZOS)
+
+    directory = os.path.dirname(target_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            image.save(out, **options)
+        # Concurrent requests for the same rendition each replace it whole
+        os.replace(tmp_path, target_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return os.path.getsize(target_path)
+
+
+def _render(source_path, target_path, width, image_format):
+    with Image.open(source_path) as image:
+        return save_rendition(ImageOps.exif_transpose(image), target_path, width, image_format)
+
+
+def ensure_rendition(original_name, size, image_format):
+    """
+    Return the media path of a rendition, generating it on first use.
+    Raises ``FileNotFoundError`` when the original is missing.
+    """
+    name = rendition_name(original_name, size, image_format)
+    path = os.path.join(settings.MEDIA_ROOT, name)
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        source_path = os.path.join(settings.MEDIA_ROOT, original_name)
+        if not os.path.isfile(source_path):
+            raise
+        rendition_cache.add(_render(source_path, path, RENDITION_SIZES[size], image_format))
+        return name
+
+    rendition_cache.touch(path, mtime)
+    return name
+
+
+def delete_renditions(original_name):
+    """Remove every rendition of a stored image."""
+    directory = rendition_cache.path(os.path.basename(original_name))
+    if os.path.isdir(directory):
+        shutil.rmtree(directory, ignore_errors=True)
+        rendition_cache.forget_total()
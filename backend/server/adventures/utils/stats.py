@@ -0,0 +1,476 @@
+"""
+Statistics engine behind the ``/stats/counts`` endpoint.
+
+Activity statistics come from a single aggregate grouped by ``sport_type``;
+the per-category and overall figures are folded together in Python from those
+rows. Sums and non-null counts are kept separately so averages across several
+sport types match what a direct ``Avg`` over the category would return.
+
+The results are persisted in the ``UserStats``/``UserSportStats`` rollup.
+Signals mark the affected part of a user's rollup dirty on every relevant
+write and only that part is recomputed, so the endpoint reads a single row.
+A saved or deleted activity is applied as a delta to its sport row and the
+overall totals instead of recounting every activity of the user.
+"""
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, Max, Min, OuterRef, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from adventures.models import Activity, Collection, Location, UserSportStats, UserStats, Visit
+from adventures.utils.sports_types import SPORT_CATEGORIES
+from worldtravel.models import VisitedCity, VisitedRegion
+
+
+def visited_locations_queryset(user):
+    """Locations of ``user`` that have at least one visit starting today or earlier."""
+    today = timezone.now().date()
+    started_visits = Visit.objects.filter(
+        location=OuterRef('pk'),
+        start_date__isnull=False,
+        start_date__date__lte=today,
+    )
+    return Location.objects.filter(user=user).annotate(
+        has_started_visit=Exists(started_visits)
+    ).filter(has_started_visit=True)
+
+
+def get_visited_location_count(user):
+    return visited_locations_queryset(user).count()
+
+
+SPORT_ROW_FIELDS = (
+    'count', 'total_distance', 'distance_count', 'max_distance', 'total_moving_time',
+    'total_elevation_gain', 'elevation_gain_count', 'max_elevation_gain',
+    'total_elevation_loss', 'total_speed', 'speed_count', 'max_speed', 'total_calories',
+)
+
+
+def sport_type_rows(user):
+    return (
+        Activity.objects.filter(user=user)
+        .order_by()
+        .values('sport_type')
+        .annotate(
+            count=Count('id'),
+            total_distance=Sum('distance'),
+            distance_count=Count('distance'),
+            max_distance=Max('distance'),
+            total_moving_time=Sum('moving_time'),
+            total_elevation_gain=Sum('elevation_gain'),
+            elevation_gain_count=Count('elevation_gain'),
+            max_elevation_gain=Max('elevation_gain'),
+            total_elevation_loss=Sum('elevation_loss'),
+            total_speed=Sum('average_speed'),
+            speed_count=Count('average_speed'),
+            max_speed=Max('max_speed'),
+            total_calories=Sum('calories'),
+        )
+    )
+
+
+def _fold(rows):
+    """Combine grouped aggregate rows into a single accumulator."""
+    acc = {
+        'count': 0,
+        'total_distance': 0,
+        'distance_count': 0,
+        'max_distance': None,
+        'total_moving_time': timedelta(0),
+        'total_elevation_gain': 0,
+        'elevation_gain_count': 0,
+        'max_elevation_gain': None,
+        'total_elevation_loss': 0,
+        'total_speed': 0,
+        'speed_count': 0,
+        'max_speed': None,
+        'total_calories': 0,
+    }
+    for row in rows:
+        acc['count'] += row['count']
+        acc['distance_count'] += row['distance_count']
+        acc['elevation_gain_count'] += row['elevation_gain_count']
+        acc['speed_count'] += row['speed_count']
+        for key in ('total_distance', 'total_elevation_gain', 'total_elevation_loss', 'total_speed', 'total_calories'):
+            acc[key] += row[key] or 0
+        if row['total_moving_time']:
+            acc['total_moving_time'] += row['total_moving_time']
+        for key in ('max_distance', 'max_elevation_gain', 'max_speed'):
+            if row[key] is not None and (acc[key] is None or row[key] > acc[key]):
+                acc[key] = row[key]
+    return acc
+
+
+def _average(total, count):
+    return total / count if count else 0
+
+
+def _overall_stats(acc):
+    return {
+        'total_count': acc['count'],
+        'total_distance': round(acc['total_distance'], 2),
+        'total_moving_time': int(acc['total_moving_time'].total_seconds()),
+        'total_elevation_gain': round(acc['total_elevation_gain'], 2),
+        'total_elevation_loss': round(acc['total_elevation_loss'], 2),
+        'total_calories': round(acc['total_calories'], 2),
+    }
+
+
+def _category_stats(acc, sport_breakdown):
+    return {
+        'count': acc['count'],
+        'total_distance': round(acc['total_distance'], 2),
+        'total_moving_time': int(acc['total_moving_time'].total_seconds()),
+        'total_elevation_gain': round(acc['total_elevation_gain'], 2),
+        'total_elevation_loss': round(acc['total_elevation_loss'], 2),
+        'avg_distance': round(_average(acc['total_distance'], acc['distance_count']), 2),
+        'max_distance': round(acc['max_distance'] or 0, 2),
+        'avg_elevation_gain': round(_average(acc['total_elevation_gain'], acc['elevation_gain_count']), 2),
+        'max_elevation_gain': round(acc['max_elevation_gain'] or 0, 2),
+        'avg_speed': round(_average(acc['total_speed'], acc['speed_count']), 2),
+        'max_speed': round(acc['max_speed'] or 0, 2),
+        'total_calories': round(acc['total_calories'], 2),
+        'sports': sport_breakdown,
+    }
+
+
+def activity_stats_from_rows(rows):
+    """
+    Return ``(overall, by_category)`` activity statistics from per-sport rows,
+    either live aggregate rows or ``UserSportStats`` values.
+    """
+    rows_by_sport = {row['sport_type']: row for row in rows}
+
+    overall = _overall_stats(_fold(rows_by_sport.values()))
+
+    by_category = {}
+    for category, sports in SPORT_CATEGORIES.items():
+        category_rows = [rows_by_sport[sport] for sport in sports if sport in rows_by_sport]
+        if not category_rows:
+            continue
+
+        sport_breakdown = {}
+        for sport in sports:
+            row = rows_by_sport.get(sport)
+            if row is None:
+                continue
+            sport_breakdown[sport] = {
+                'count': row['count'],
+                'total_distance': round(row['total_distance'] or 0, 2),
+                'total_elevation_gain': round(row['total_elevation_gain'] or 0, 2),
+            }
+
+        by_category[category] = _category_stats(_fold(category_rows), sport_breakdown)
+
+    return overall, by_category
+
+
+def get_activity_stats(user):
+    """Live ``(overall, by_category)`` activity statistics using a single grouped query."""
+    return activity_stats_from_rows(sport_type_rows(user))
+
+
+# ---------------------------------------------------------------------------
+# Rollup maintenance
+# ---------------------------------------------------------------------------
+
+STAT_PARTS = ('locations', 'visited', 'collections', 'cities', 'regions', 'activities')
+
+_state = threading.local()
+
+
+def _compute_locations(user_id):
+    return {'location_count': Location.objects.filter(user_id=user_id).count()}
+
+
+def _compute_visited(user_id):
+    today = timezone.now().date()
+    next_start = Visit.objects.filter(
+        location__user_id=user_id,
+        start_date__date__gt=today,
+    ).aggregate(next_start=Min('start_date'))['next_start']
+    return {
+        'visited_location_count': get_visited_location_count(user_id),
+        'next_visit_start': next_start.date() if next_start else None,
+    }
+
+
+def _compute_collections(user_id):
+    return {'collection_count': Collection.objects.filter(user_id=user_id).count()}
+
+
+def _compute_cities(user_id):
+    return {'visited_city_count': VisitedCity.objects.filter(user_id=user_id).count()}
+
+
+def _compute_regions(user_id):
+    visited_regions = VisitedRegion.objects.filter(user_id=user_id)
+    return {
+        'visited_region_count': visited_regions.count(),
+        'visited_country_count': visited_regions.values('region__country').distinct().count(),
+    }
+
+
+def _compute_activities(user_id, rows=None):
+    if rows is None:
+        rows = list(sport_type_rows(user_id))
+    acc = _fold(rows)
+    return {
+        'activity_count': acc['count'],
+        'total_distance': acc['total_distance'],
+        'total_moving_time': acc['total_moving_time'],
+        'total_elevation_gain': acc['total_elevation_gain'],
+        'total_elevation_loss': acc['total_elevation_loss'],
+        'total_calories': acc['total_calories'],
+    }
+
+
+_PART_COMPUTERS = {
+    'locations': _compute_locations,
+    'visited': _compute_visited,
+    'collections': _compute_collections,
+    'cities': _compute_cities,
+    'regions': _compute_regions,
+}
+
+
+def _sync_sport_rows(user_id, rows):
+    sport_types = []
+    for row in rows:
+        sport_types.append(row['sport_type'])
+        UserSportStats.objects.update_or_create(
+            user_id=user_id,
+            sport_type=row['sport_type'],
+            defaults={field: row[field] for field in SPORT_ROW_FIELDS},
+        )
+    UserSportStats.objects.filter(user_id=user_id).exclude(sport_type__in=sport_types).delete()
+
+
+def compute_user_stats(user_id):
+    """Live values for every rollup field, used for rebuilds and verification."""
+    values = {}
+    for computer in _PART_COMPUTERS.values():
+        values.update(computer(user_id))
+    values.update(_compute_activities(user_id))
+    return values
+
+
+def refresh_user_stats(user_id, parts=STAT_PARTS):
+    """
+    Recompute the given parts of a user's rollup and save them. A row that
+    does not exist yet is built in full, whatever the parts.
+    """
+    stats, created = UserStats.objects.get_or_create(user_id=user_id)
+    if created:
+        parts = STAT_PARTS
+    values = {}
+    for part in parts:
+        if part == 'activities':
+            rows = list(sport_type_rows(user_id))
+            _sync_sport_rows(user_id, rows)
+            values.update(_compute_activities(user_id, rows))
+        else:
+            values.update(_PART_COMPUTERS[part](user_id))
+
+    for field, value in values.items():
+        setattr(stats, field, value)
+    stats.save(update_fields=list(values) + ['updated_at'])
+    return stats
+
+
+def mark_user_stats_dirty(user_id, *parts):
+    """Refresh parts of a rollup now, or at the end of a ``defer_user_stats`` block."""
+    if not user_id:
+        return
+    pending = getattr(_state, 'pending', None)
+    if pending is not None:
+        pending.setdefault(user_id, set()).update(parts)
+        return
+    refresh_user_stats(user_id, parts)
+
+
+def _touch_user_stats(user_id):
+    UserStats.objects.filter(user_id=user_id).update(updated_at=timezone.now())
+
+
+def mark_user_data_changed(user_id):
+    """
+    Record a write that changes none of the rollup counts (a flight, a geocoded
+    location) so caches keyed on ``user_data_version`` are invalidated. Users
+    without a rollup row are skipped; theirs is built on first read.
+    """
+    if not user_id:
+        return
+    pending = getattr(_state, 'pending', None)
+    if pending is not None:
+        pending.setdefault(user_id, set())
+        return
+    _touch_user_stats(user_id)
+
+
+@contextmanager
+def defer_user_stats():
+    """
+    Collect rollup refreshes triggered inside the block and apply each user's
+    dirty parts once when it exits, instead of once per saved object.
+    """
+    if getattr(_state, 'pending', None) is not None:
+        yield
+        return
+
+    pending = _state.pending = {}
+    try:
+        yield
+    finally:
+        _state.pending = None
+
+    for user_id, parts in pending.items():
+        if parts:
+            refresh_user_stats(user_id, [part for part in STAT_PARTS if part in parts])
+        else:
+            _touch_user_stats(user_id)
+
+
+# Activity fields the rollup is built from
+ACTIVITY_STAT_FIELDS = (
+    'user_id', 'sport_type', 'distance', 'moving_time', 'elevation_gain', 'elevation_loss',
+    'average_speed', 'max_speed', 'calories',
+)
+
+# Sport row sums, counts of non-null values and maxima, by activity field
+_SPORT_SUMS = {
+    'total_distance': 'distance',
+    'total_moving_time': 'moving_time',
+    'total_elevation_gain': 'elevation_gain',
+    'total_elevation_loss': 'elevation_loss',
+    'total_speed': 'average_speed',
+    'total_calories': 'calories',
+}
+_SPORT_COUNTS = {'distance_count': 'distance', 'elevation_gain_count': 'elevation_gain', 'speed_count': 'average_speed'}
+_SPORT_MAXES = {'max_distance': 'distance', 'max_elevation_gain': 'elevation_gain', 'max_speed': 'max_speed'}
+
+# UserStats totals, by activity field
+_OVERALL_SUMS = {
+    'total_distance': 'distance',
+    'total_moving_time': 'moving_time',
+    'total_elevation_gain': 'elevation_gain',
+    'total_elevation_loss': 'elevation_loss',
+    'total_calories': 'calories',
+}
+
+
+def activity_snapshot(activity):
+    """The rollup inputs of an activity, or None when some of them are deferred."""
+    if any(field not in activity.__dict__ for field in ACTIVITY_STAT_FIELDS):
+        return None
+    return {field: activity.__dict__[field] for field in ACTIVITY_STAT_FIELDS}
+
+
+def _apply_activity(values, sign):
+    """
+    Add (``sign=1``) or remove (``sign=-1``) one activity in its user's rollup.
+    Users without a rollup row are skipped; theirs is built on first read.
+    """
+    user_id, sport_type = values['user_id'], values['sport_type']
+    overall = {'activity_count': F('activity_count') + sign, 'updated_at': timezone.now()}
+    for field, source in _OVERALL_SUMS.items():
+        if values[source] is not None:
+            overall[field] = F(field) + sign * values[source]
+    if not UserStats.objects.filter(user_id=user_id).update(**overall):
+        return
+
+    sport = UserSportStats.objects.filter(user_id=user_id, sport_type=sport_type)
+    if sign > 0:
+        UserSportStats.objects.get_or_create(user_id=user_id, sport_type=sport_type)
+    update = {'count': F('count') + sign}
+    for field, source in _SPORT_SUMS.items():
+        if values[source] is not None:
+            update[field] = Coalesce(F(field), Value(values[source] * 0)) + sign * values[source]
+    for field, source in _SPORT_COUNTS.items():
+        if values[source] is not None:
+            update[field] = F(field) + sign
+    if sign > 0:
+        for field, source in _SPORT_MAXES.items():
+            if values[source] is not None:
+                update[field] = Greatest(Coalesce(F(field), Value(values[source])), Value(values[source]))
+    sport.update(**update)
+    if sign > 0:
+        return
+
+    row = sport.values('count', *_SPORT_MAXES).first()
+    if row is None:
+        return
+    if row['count'] <= 0:
+        sport.delete()
+    elif any(
+        values[source] is not None and row[field] is not None and values[source] >= row[field]
+        for field, source in _SPORT_MAXES.items()
+    ):
+        # The removed activity may have held a maximum; recount this sport only
+        live = sport_type_rows(user_id).filter(sport_type=sport_type).first()
+        sport.update(**{field: live[field] for field in SPORT_ROW_FIELDS})
+
+
+def apply_activity_change(old, new):
+    """
+    Apply one activity write to the rollup as a delta. ``old`` and ``new`` are
+    its snapshots before and after the write, None when it was created or
+    deleted. Inside ``defer_user_stats`` the activities part is recounted
+    at the end instead.
+    """
+    user_ids = {values['user_id'] for values in (old, new) if values}
+    if getattr(_state, 'pending', None) is not None:
+        for user_id in user_ids:
+            mark_user_stats_dirty(user_id, 'activities')
+        return
+    if old == new:
+        for user_id in user_ids:
+            mark_user_data_changed(user_id)
+        return
+
+    with transaction.atomic():
+        if old:
+            _apply_activity(old, -1)
+        if new:
+            _apply_activity(new, 1)
+
+
+def get_user_stats(user):
+    """Return the rollup row for ``user``, building or refreshing it when stale."""
+    stats = UserStats.objects.filter(user=user).first()
+    if stats is None:
+        return refresh_user_stats(user.id)
+    if stats.next_visit_start and stats.next_visit_start <= timezone.now().date():
+        stats = refresh_user_stats(user.id, ('visited',))
+    return stats
+
+
+def user_data_version(user):
+    """Changes whenever any of the user's travel or activity data is written."""
+    return get_user_stats(user).updated_at.timestamp()
+
+
+def rollup_activity_stats(stats):
+    """
+    Return ``(overall, by_category)`` activity statistics for a rollup row;
+    the per-category figures are folded from its ``UserSportStats`` rows.
+    """
+    overall = {
+        'total_count': stats.activity_count,
+        'total_distance': round(stats.total_distance, 2),
+        'total_moving_time': int(stats.total_moving_time.total_seconds()),
+        'total_elevation_gain': round(stats.total_elevation_gain, 2),
+        'total_elevation_loss': round(stats.total_elevation_loss, 2),
+        'total_calories': round(stats.total_calories, 2),
+    }
+    if not stats.activity_count:
+        return overall, {}
+
+    _, by_category = activity_stats_from_rows(
+        UserSportStats.objects.filter(user_id=stats.user_id).values('sport_type', *SPORT_ROW_FIELDS)
+    )
+    return overall, by_category
@@ -0,0 +1,164 @@
+"""
+Time-bucketed travel and activity history for the ``/stats/timeseries`` endpoint.
+
+Everything is computed in one PostgreSQL query: rows are bucketed with
+``date_trunc``, a continuous series of buckets is generated so charts have no
+gaps, and running totals (distinct countries, distance, flights) come from
+window functions. Running totals are lifetime values as of each bucket, so a
+restricted date range still starts from the user's earlier history.
+"""
+from django.core.cache import cache
+from django.db import connection
+
+from adventures.models import Activity, Location, Visit
+from adventures.utils.stats import user_data_version
+from flights.models import Airport, Flight
+from worldtravel.models import Country
+
+BUCKET_STEPS = {
+    'day': '1 day',
+    'week': '1 week',
+    'month': '1 month',
+    'year': '1 year',
+}
+DEFAULT_BUCKET = 'month'
+TIMESERIES_CACHE_TIMEOUT = 60 * 60 * 24
+
+TIMESERIES_COLUMNS = (
+    'period', 'visits', 'locations_visited', 'new_countries', 'cumulative_countries',
+    'activities', 'distance', 'cumulative_distance', 'flights', 'cumulative_flights',
+    'flight_minutes',
+)
+
+
+def _timeseries_sql(date_filter):
+    return f"""
+        WITH visit_rows AS (
+            SELECT date_trunc(%(bucket)s, v.start_date AT TIME ZONE 'UTC') AS bucket,
+                   v.location_id,
+                   c.country_code
+            FROM {Visit._meta.db_table} v
+            JOIN {Location._meta.db_table} l ON l.id = v.location_id
+            LEFT JOIN {Country._meta.db_table} c ON c.id = l.country_id
+            WHERE l.user_id = %(user_id)s AND v.start_date IS NOT NULL
+        ),
+        activity_rows AS (
+            SELECT date_trunc(%(bucket)s, a.start_date AT TIME ZONE 'UTC') AS bucket,
+                   a.distance
+            FROM {Activity._meta.db_table} a
+            WHERE a.user_id = %(user_id)s AND a.start_date IS NOT NULL
+        ),
+        flight_rows AS (
+            SELECT date_trunc(%(bucket)s, f.departure_datetime AT TIME ZONE 'UTC') AS bucket,
+                   f.duration_minutes,
+                   ap.country_code
+            FROM {Flight._meta.db_table} f
+            LEFT JOIN {Airport._meta.db_table} ap ON ap.iata_code = f.arrival_airport_obj_id
+            WHERE f.user_id = %(user_id)s AND f.status = 'completed'
+        ),
+        all_buckets AS (
+            SELECT bucket FROM visit_rows
+            UNION SELECT bucket FROM activity_rows
+            UNION SELECT bucket FROM flight_rows
+        ),
+        buckets AS (
+            SELECT generate_series(
+                (SELECT MIN(bucket) FROM all_buckets),
+                (SELECT MAX(bucket) FROM all_buckets),
+                %(step)s::interval
+            ) AS bucket
+        ),
+        country_first_seen AS (
+            SELECT country_code, MIN(bucket) AS bucket
+            FROM (
+                SELECT country_code, bucket FROM visit_rows
+                UNION ALL
+                SELECT country_code, bucket FROM flight_rows
+            ) seen
+            WHERE country_code IS NOT NULL AND country_code <> ''
+            GROUP BY country_code
+        ),
+        series AS (
+            SELECT b.bucket,
+                   COALESCE(v.visits, 0) AS visits,
+                   COALESCE(v.locations_visited, 0) AS locations_visited,
+                   COALESCE(n.new_countries, 0) AS new_countries,
+                   COALESCE(a.activities, 0) AS activities,
+                   COALESCE(a.distance, 0) AS distance,
+                   COALESCE(f.flights, 0) AS flights,
+                   COALESCE(f.flight_minutes, 0) AS flight_minutes
+            FROM buckets b
+            LEFT JOIN (
+                SELECT bucket, COUNT(*) AS visits, COUNT(DISTINCT location_id) AS locations_visited
+                FROM visit_rows GROUP BY bucket
+            ) v ON v.bucket = b.bucket
+            LEFT JOIN (
+                SELECT bucket, COUNT(*) AS new_countries
+                FROM country_first_seen GROUP BY bucket
+            ) n ON n.bucket = b.bucket
+            LEFT JOIN (
+                SELECT bucket, COUNT(*) AS activities, SUM(distance) AS distance
+                FROM activity_rows GROUP BY bucket
+            ) a ON a.bucket = b.bucket
+            LEFT JOIN (
+                SELECT bucket, COUNT(*) AS flights, SUM(duration_minutes) AS flight_minutes
+                FROM flight_rows GROUP BY bucket
+            ) f ON f.bucket = b.bucket
+        ),
+        running AS (
+            SELECT bucket, visits, locations_visited,
+                   new_countries, SUM(new_countries) OVER w AS cumulative_countries,
+                   activities, distance, SUM(distance) OVER w AS cumulative_distance,
+                   flights, SUM(flights) OVER w AS cumulative_flights,
+                   flight_minutes
+            FROM series
+            WINDOW w AS (ORDER BY bucket ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+        )
+        SELECT bucket, visits, locations_visited, new_countries, cumulative_countries,
+               activities, distance, cumulative_distance, flights, cumulative_flights,
+               flight_minutes
+        FROM running
+        {date_filter}
+        ORDER BY bucket
+    """
+
+
+def compute_timeseries(user_id, bucket=DEFAULT_BUCKET, start_date=None, end_date=None):
+    """Return the bucketed history rows for a user; dates are inclusive."""
+    params = {'user_id': user_id, 'bucket': bucket, 'step': BUCKET_STEPS[bucket]}
+    conditions = []
+    if start_date:
+        conditions.append("bucket >= date_trunc(%(bucket)s, %(start_date)s::timestamp)")
+        params['start_date'] = start_date
+    if end_date:
+        conditions.append("bucket <= %(end_date)s::timestamp")
+        params['end_date'] = end_date
+    date_filter = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    with connection.cursor() as cursor:
+        cursor.execute(_timeseries_sql(date_filter), params)
+        rows = cursor.fetchall()
+
+    results = []
+    for row in rows:
+        entry = dict(zip(TIMESERIES_COLUMNS, row))
+        entry['period'] = entry['period'].date().isoformat()
+        for key in ('distance', 'cumulative_distance'):
+            entry[key] = round(float(entry[key] or 0), 2)
+        for key in ('new_countries', 'cumulative_countries', 'cumulative_flights', 'flight_minutes'):
+            entry[key] = int(entry[key] or 0)
+        results.append(entry)
+    return results
+
+
+def get_timeseries(user, bucket=DEFAULT_BUCKET, start_date=None, end_date=None):
+    """Cached ``compute_timeseries``; the key includes the user's data version."""
+    cache_key = (
+        f"stats:timeseries:{user.id}:{user_data_version(user)}:{bucket}:"
+        f"{start_date or ''}:{end_date or ''}"
+    )
+    results = cache.get(cache_key)
+    if results is None:
+        results = compute_timeseries(user.id, bucket, start_date, end_date)
+        cache.set(cache_key, results, TIMESERIES_CACHE_TIMEOUT)
+    return results
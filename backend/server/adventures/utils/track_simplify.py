@@ -0,0 +1,128 @@
+"""
+Multi-level simplification of GPX tracks.
+
+Recorded tracks often have tens of thousands of points, far more than a map
+can draw. Every track is simplified ahead of time to each of
+``TOLERANCE_LEVELS`` (meters) with Ramer-Douglas-Peucker, and responses
+carry the level matching ``?tolerance=`` or ``?zoom=``.
+
+One RDP pass computes, for every point, the largest tolerance at which RDP
+would still keep it; each level is then a single threshold on that array.
+The distances of a split are computed with NumPy over the whole span.
+"""
+import math
+
+import numpy as np
+
+# Tolerances, in meters, every track is simplified to ahead of time
+TOLERANCE_LEVELS = (2, 8, 32, 128, 512)
+
+# Served when a request asks for nothing; about a pixel at street zoom
+DEFAULT_TOLERANCE = 2
+
+# Web Mercator meters per pixel at zoom 0 on the equator (256px tiles)
+METERS_PER_PIXEL_Z0 = 156543.03
+
+EARTH_RADIUS = 6371008.8
+
+
+def _project(coords):
+    """Lon/lat degrees to meters on a plane around the track's mean latitude."""
+    lon, lat = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    return np.column_stack((lon * math.cos(float(lat.mean())), lat)) * EARTH_RADIUS
+
+
+def point_importance(coords, floor=0):
+    """
+    Return, for every point of a line, the largest RDP tolerance at which it
+    is kept. Endpoints are always kept. Spans are not split below ``floor``,
+    leaving their points at 0.
+    """
+    xy = _project(np.asarray(coords, dtype=float)[:, :2])
+    importance = np.zeros(len(xy))
+    importance[0] = importance[-1] = np.inf
+
+    stack = [(0, len(xy) - 1, np.inf)]
+    while stack:
+        first, last, ceiling = stack.pop()
+        if last - first < 2:
+            continue
+        segment = xy[last] - xy[first]
+        points = xy[first + 1:last] - xy[first]
+        length = math.hypot(segment[0], segment[1])
+        if length:
+            distances = np.abs(segment[0] * points[:, 1] - segment[1] * points[:, 0]) / length
+        else:
+            distances = np.hypot(points[:, 0], points[:, 1])
+        index = int(np.argmax(distances))
+        # A point only survives a tolerance its whole chain of splits survives
+        value = min(float(distances[index]), ceiling)
+        if value <= floor:
+            continue
+        split = first + 1 + index
+        importance[split] = value
+        stack.append((first, split, value))
+        stack.append((split, last, value))
+    return importance
+
+
+def simplify_line(coords, levels=TOLERANCE_LEVELS):
+    """Return ``{tolerance: coords}`` for one line."""
+    if len(coords) < 3:
+        return {tolerance: coords for tolerance in levels}
+    importance = point_importance(coords, floor=min(levels))
+    return {tolerance: [coords[i] for i in np.flatnonzero(importance > tolerance)] for tolerance in levels}
+
+
+def simplify_feature_collection(feature_collection, levels=TOLERANCE_LEVELS):
+    """
+    Return ``{str(tolerance): FeatureCollection}`` for a GeoJSON feature
+    collection; features other than LineStrings are kept as they are.
+    """
+    simplified = {str(tolerance): [] for tolerance in levels}
+    for feature in feature_collection.get('features', []):
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') != 'LineString':
+            for features in simplified.values():
+                features.append(feature)
+            continue
+        for tolerance, coords in simplify_line(geometry['coordinates'], levels).items():
+            simplified[str(tolerance)].append({
+                'type': 'Feature',
+                'geometry': {'type': 'LineString', 'coordinates': coords},
+                'properties': feature.get('properties', {}),
+            })
+    return {
+        tolerance: {'type': 'FeatureCollection', 'features': features}
+        for tolerance, features in simplified.items()
+    }
+
+
+def level_for(tolerance):
+    """The largest precomputed level not above ``tolerance``; None for the full track."""
+    candidates = [level for level in TOLERANCE_LEVELS if level <= tolerance]
+    return max(candidates) if candidates else None
+
+
+def requested_level(params):
+    """
+    Level asked for with ``?tolerance=`` (meters, 0 for the full track) or
+    ``?zoom=`` (map zoom, one pixel of error). Defaults to ``DEFAULT_TOLERANCE``.
+    """
+    try:
+        if params.get('tolerance') is not None:
+            tolerance = float(params['tolerance'])
+        elif params.get('zoom') is not None:
+            tolerance = METERS_PER_PIXEL_Z0 / 2 ** min(float(params['zoom']), 30)
+        else:
+            tolerance = DEFAULT_TOLERANCE
+    except (TypeError, ValueError):
+        tolerance = DEFAULT_TOLERANCE
+    return level_for(tolerance)
+
+
+def pick_level(full, levels, level):
+    """``full`` or its simplification for ``level``, when one was stored."""
+    if level is None or not levels:
+        return full
+    return levels.get(str(level), full)
@@ -0,0 +1,110 @@
+"""
+Stored distance of transportations.
+
+The distance comes from the first GPX attachment that has a track, or else
+from the geodesic between the origin and destination coordinates. It is
+computed when a GPX attachment is added or removed and when the coordinates
+change, and kept on the row with its source so serializing never parses GPX.
+
+Rows created with ``bulk_create`` skip the signals, so restores measure the
+coordinates themselves and collection copies take the source row's values.
+"""
+import logging
+
+import gpxpy
+from django.core.cache import cache
+from geopy.distance import geodesic
+
+logger = logging.getLogger(__name__)
+
+GPX_DISTANCE_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def gpx_distance_km(gpx_file_field):
+    """Length of every track segment and route in a GPX file, in km; None if there is none."""
+    try:
+        with gpx_file_field.open('r') as gpx_file:
+            gpx = gpxpy.parse(gpx_file)
+
+        total_meters = 0.0
+
+        for track in gpx.tracks:
+            for segment in track.segments:
+                segment_length = segment.length_3d() or segment.length_2d()
+                if segment_length:
+                    total_meters += segment_length
+
+        for route in gpx.routes:
+            route_length = route.length_3d() or route.length_2d()
+            if route_length:
+                total_meters += route_length
+
+        if total_meters > 0:
+            return round(total_meters / 1000, 2)
+    except Exception as exc:
+        logger.warning(
+            "Failed to calculate GPX distance for file %s: %s",
+            getattr(gpx_file_field, 'name', 'unknown'),
+            exc,
+        )
+    return None
+
+
+def attachment_distance_km(attachment):
+    # Blob-backed files are content-addressed, so the distance can be
+    # cached for as long as the bytes exist; shared copies parse once
+    if not attachment.blob_id:
+        return gpx_distance_km(attachment.file)
+
+    cache_key = f"gpx_distance:{attachment.blob.sha256}"
+    distance_km = cache.get(cache_key)
+    if distance_km is None:
+        distance_km = gpx_distance_km(attachment.file)
+        if distance_km is not None:
+            cache.set(cache_key, distance_km, GPX_DISTANCE_CACHE_TIMEOUT)
+    return distance_km
+
+
+def geodesic_distance_km(transportation):
+    """Distance between the origin and destination coordinates, in km."""
+    if (
+        transportation.origin_latitude and transportation.origin_longitude and
+        transportation.destination_latitude and transportation.destination_longitude
+    ):
+        try:
+            origin = (float(transportation.origin_latitude), float(transportation.origin_longitude))
+            destination = (float(transportation.destination_latitude), float(transportation.destination_longitude))
+            return round(geodesic(origin, destination).km, 2)
+        except ValueError:
+            return None
+    return None
+
+
+def measure_distance(transportation):
+    """
+    Return ``(distance in km, source)``; the source is ``''`` when there is
+    nothing to measure.
+    """
+    # Filter in Python so prefetched attachments are reused
+    for attachment in transportation.attachments.all():
+        if attachment.file and attachment.file.name.lower().endswith('.gpx'):
+            distance_km = attachment_distance_km(attachment)
+            if distance_km is not None:
+                return distance_km, 'gpx'
+    return geodesic_from_coordinates(transportation)
+
+
+def geodesic_from_coordinates(transportation):
+    distance_km = geodesic_distance_km(transportation)
+    return distance_km, 'geodesic' if distance_km is not None else ''
+
+
+def update_distance(transportation):
+    """Measure ``transportation`` again and store the result on the row."""
+    from adventures.models import Transportation
+
+    transportation.distance_km, transportation.distance_source = measure_distance(transportation)
+    Transportation.objects.filter(id=transportation.id).update(
+        distance_km=transportation.distance_km, distance_source=transportation.distance_source,
+    )
+    return transportation.distance_km
@@ -0,0 +1,156 @@
+"""
+ZIP archives written as a stream of chunks for ``StreamingHttpResponse``.
+
+``zipfile`` supports unseekable outputs by writing a data descriptor after
+each entry, so entries can be emitted as soon as they are written instead of
+building the archive in a temporary file first. Only the bytes of the chunk
+being written are held in memory; media is copied from storage in chunks and
+JSON metadata is encoded incrementally.
+
+Usage::
+
+    def stream():
+        archive = ZipStream()
+        yield from archive.write_json('data.json', export_data)
+        yield from archive.write_storage_file('images/a.webp', 'images/a.webp')
+        yield from archive.close()
+
+    return zip_streaming_response(stream(), 'export.zip')
+"""
+import json
+import logging
+import os
+import time
+import zipfile
+
+from django.core.files.storage import default_storage
+from django.http import StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Formats that are already compressed; deflating them again only costs CPU
+STORED_EXTENSIONS = {
+    '.webp', '.jpg', '.jpeg', '.png', '.gif', '.heic', '.avif',
+    '.zip', '.gz', '.mp4', '.mov', '.m4a', '.mp3',
+}
+
+
+class _ChunkBuffer:
+    """Write-only file object that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        if data:
+            self._chunks.append(bytes(data))
+            self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        if not self._chunks:
+            return b''
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ZipStream:
+    """Incrementally written ZIP archive whose methods yield output chunks."""
+
+    def __init__(self, compression=zipfile.ZIP_DEFLATED):
+        self._buffer = _ChunkBuffer()
+        self._zip = zipfile.ZipFile(self._buffer, 'w', compression)
+
+    def _drain(self):
+        data = self._buffer.drain()
+        if data:
+            yield data
+
+    def _entry_info(self, name, file_size=None):
+        info = zipfile.ZipInfo(name, time.localtime()[:6])
+        extension = os.path.splitext(name)[1].lower()
+        info.compress_type = zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else self._zip.compression
+        if file_size is not None:
+            # Lets zipfile decide up front whether the entry needs ZIP64
+            info.file_size = file_size
+        return info
+
+    def write_chunks(self, name, chunks, file_size=None):
+        """Write an entry from an iterable of bytes."""
+        with self._zip.open(self._entry_info(name, file_size), 'w', force_zip64=file_size is None) as entry:
+            yield from self._drain()
+            for chunk in chunks:
+                entry.write(chunk)
+                yield from self._drain()
+        yield from self._drain()
+
+    def write_json(self, name, data, **kwargs):
+        """Write ``data`` as a JSON entry without building the encoded string."""
+        encoder = json.JSONEncoder(**kwargs)
+        yield from self.write_chunks(name, _batched(
+            fragment.encode('utf-8') for fragment in encoder.iterencode(data)
+        ))
+
+    def write_ndjson(self, name, records):
+        """Write ``records`` as a newline-delimited JSON entry, one record at a time."""
+        yield from self.write_chunks(name, _batched(
+            (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8') for record in records
+        ))
+
+    def write_storage_file(self, name, storage_name, storage=None):
+        """
+        Copy a stored file into the archive in chunks. Returns without writing
+        an entry when the file cannot be opened.
+        """
+        storage = storage or default_storage
+        try:
+            source = storage.open(storage_name, 'rb')
+        except Exception as e:
+            logger.warning("Skipping %s in archive: %s", storage_name, e)
+            return
+        try:
+            try:
+                file_size = storage.size(storage_name)
+            except Exception:
+                file_size = None
+            yield from self.write_chunks(name, iter(lambda: source.read(CHUNK_SIZE), b''), file_size)
+        finally:
+            source.close()
+
+    def close(self):
+        """Write the central directory."""
+        self._zip.close()
+        yield from self._drain()
+
+
+def _batched(fragments, size=CHUNK_SIZE):
+    """Join the many small fragments produced by ``iterencode`` into chunks."""
+    batch = []
+    length = 0
+    for fragment in fragments:
+        batch.append(fragment)
+        length += len(fragment)
+        if length >= size:
+            yield b''.join(batch)
+            batch = []
+            length = 0
+    if batch:
+        yield b''.join(batch)
+
+
+def zip_streaming_response(chunks, filename):
+    response = StreamingHttpResponse(chunks, content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    # Let proxies pass chunks through instead of buffering the whole archive
+    response['X-Accel-Buffering'] = 'no'
+    return response
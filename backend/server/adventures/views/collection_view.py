@@ -6,19 +6,22 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser
 from rest_framework import status
-from django.http import HttpResponse
-from django.conf import settings
-from django.core.files.base import ContentFile
-import io
-import os
-import json
-import zipfile
-import tempfile
-from adventures.models import Collection, Location, Transportation, Note, Checklist, ChecklistItem, CollectionInvite, ContentImage, CollectionItineraryItem, Lodging, CollectionItineraryDay, ContentAttachment, Category
+from adventures.models import Collection, ChecklistItem, CollectionInvite, CollectionItineraryItem, CollectionItineraryDay
 from adventures.permissions import CollectionShared
-from adventures.serializers import CollectionSerializer, CollectionInviteSerializer, UltraSlimCollectionSerializer, CollectionItineraryItemSerializer, CollectionItineraryDaySerializer
+from adventures.serializers import CollectionSerializer, CollectionInviteSerializer, UltraSlimCollectionSerializer, CollectionItineraryItemSerializer, CollectionItineraryDaySerializer, DataJobSerializer
 from users.models import CustomUser as User
 from adventures.utils import pagination
+from adventures.utils.zip_stream import zip_streaming_response
+from adventures.utils.collection_archive import (
+    CollectionArchiveError, build_collection_export, collection_archive_chunks, collection_archive_filename,
+    import_collection_archive,
+)
+from adventures.utils.jobs import enqueue_job, wants_sync
+from adventures.utils.collection_cloner import duplicate_collection
+from adventures.utils.collection_loader import (
+    collection_cover_images, collection_detail_context, collection_detail_queryset, collection_list_queryset,
+    itinerary_items_queryset,
+)
 from users.serializers import CustomUserDetailsSerializer as UserSerializer
 
 
@@ -115,14 +118,7 @@ class CollectionViewSet(viewsets.ModelViewSet):
 
     def get_optimized_queryset_for_listing(self):
         """Get optimized queryset for list actions with prefetching"""
-        return self.get_base_queryset().select_related('user', 'primary_image').prefetch_related(
-            Prefetch(
-                'locations__images',
-                queryset=ContentImage.objects.filter(is_primary=True).select_related('user'),
-                to_attr='primary_images'
-            ),
-            'shared_with'
-        )
+        return collection_list_queryset(self.get_base_queryset())
 
     def get_base_queryset(self):
         """Base queryset logic extracted for reuse"""
@@ -163,6 +159,8 @@ class CollectionViewSet(viewsets.ModelViewSet):
         """Get queryset with optimizations for list actions"""
         if self.action in ['list', 'all', 'archived', 'shared']:
             return self.get_optimized_queryset_for_listing()
+        if self.action == 'retrieve':
+            return collection_detail_queryset(self.get_base_queryset())
         return self.get_base_queryset()
     
     def list(self, request):
@@ -174,14 +172,9 @@ class CollectionViewSet(viewsets.ModelViewSet):
         # via the `shared` action).
         queryset = Collection.objects.filter(
             Q(user=request.user.id) & Q(is_archived=False)
-        ).distinct().select_related('user', 'primary_image').prefetch_related(
-            Prefetch(
-                'locations__images',
-                queryset=ContentImage.objects.filter(is_primary=True).select_related('user'),
-                to_attr='primary_images'
-            )
-        )
+        ).distinct()
         
+        queryset = collection_list_queryset(queryset)
         queryset = self.apply_status_filter(queryset)
         queryset = self.apply_sorting(queryset)
         return self.paginate_and_respond(queryset, request)
@@ -191,18 +184,12 @@ class CollectionViewSet(viewsets.ModelViewSet):
         if not request.user.is_authenticated:
             return Response({"error": "User is not authenticated"}, status=400)
        
-        queryset = Collection.objects.filter(
+        queryset = collection_list_queryset(Collection.objects.filter(
             Q(user=request.user)
-        ).select_related('user', 'primary_image').prefetch_related(
-            Prefetch(
-                'locations__images',
-                queryset=ContentImage.objects.filter(is_primary=True).select_related('user'),
-                to_attr='primary_images'
-            )
-        )
+        ))
         
         queryset = self.apply_sorting(queryset)
-        serializer = self.get_serializer(queryset, many=True)
+        serializer = self.get_listing_serializer(queryset)
        
         return Response(serializer.data)
     
@@ -211,29 +198,25 @@ class CollectionViewSet(viewsets.ModelViewSet):
         if not request.user.is_authenticated:
             return Response({"error": "User is not authenticated"}, status=400)
        
-        queryset = Collection.objects.filter(
+        queryset = collection_list_queryset(Collection.objects.filter(
             Q(user=request.user.id) & Q(is_archived=True)
-        ).select_related('user', 'primary_image').prefetch_related(
-            Prefetch(
-                'locations__images',
-                queryset=ContentImage.objects.filter(is_primary=True).select_related('user'),
-                to_attr='primary_images'
-            )
-        )
+        ))
         
         queryset = self.apply_sorting(queryset)
-        serializer = self.get_serializer(queryset, many=True)
+        serializer = self.get_listing_serializer(queryset)
        
         return Response(serializer.data)
     
     def retrieve(self, request, pk=None):
         """Retrieve a collection and include itinerary items and day metadata in the response."""
         collection = self.get_object()
-        serializer = self.get_serializer(collection)
+        context = self.get_serializer_context()
+        context.update(collection_detail_context(collection, request.user))
+        serializer = self.get_serializer_class()(collection, context=context)
         data = serializer.data
 
         # Include itinerary items inline with collection details
-        itinerary_items = CollectionItineraryItem.objects.filter(collection=collection)
+        itinerary_items = itinerary_items_queryset(collection)
         itinerary_serializer = CollectionItineraryItemSerializer(itinerary_items, many=True)
         data['itinerary'] = itinerary_serializer.data
         
@@ -250,18 +233,12 @@ class CollectionViewSet(viewsets.ModelViewSet):
         if not request.user.is_authenticated:
             return Response({"error": "User is not authenticated"}, status=400)
         
-        queryset = Collection.objects.filter(
+        queryset = collection_list_queryset(Collection.objects.filter(
             shared_with=request.user
-        ).select_related('user').prefetch_related(
-            Prefetch(
-                'locations__images',
-                queryset=ContentImage.objects.filter(is_primary=True).select_related('user'),
-                to_attr='primary_images'
-            )
-        )
+        ))
         
         queryset = self.apply_sorting(queryset)
-        serializer = self.get_serializer(queryset, many=True)
+        serializer = self.get_listing_serializer(queryset)
         return Response(serializer.data)
     
     # Created a custom action to share a collection with another user by their UUID
@@ -477,321 +454,45 @@ class CollectionViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'], url_path='export')
     def export_collection(self, request, pk=None):
-        """Export a single collection and its related content as a ZIP file."""
+        """
+        Export a single collection and its related content as a ZIP file.
+        The archive is built by a background job unless ?sync=true is passed.
+        """
         collection = self.get_object()
 
-        export_data = {
-            'version': getattr(settings, 'ADVENTURELOG_RELEASE_VERSION', 'unknown'),
-            # Omit export_date to keep template-friendly exports (no dates)
-            'collection': {
-                'id': str(collection.id),
-                'name': collection.name,
-                'description': collection.description,
-                'is_public': collection.is_public,
-                # Omit start/end dates
-                'link': collection.link,
-            },
-            'locations': [],
-            'transportation': [],
-            'notes': [],
-            'checklists': [],
-            'lodging': [],
-            # Omit itinerary_items entirely
-            'images': [],
-            'attachments': [],
-            'primary_image_ref': None,
-        }
-
-        image_export_map = {}
-
-        for loc in collection.locations.all().select_related('city', 'region', 'country'):
-            loc_entry = {
-                'id': str(loc.id),
-                'name': loc.name,
-                'description': loc.description,
-                'location': loc.location,
-                'tags': loc.tags or [],
-                'rating': loc.rating,
-                'link': loc.link,
-                'is_public': loc.is_public,
-                'longitude': float(loc.longitude) if loc.longitude is not None else None,
-                'latitude': float(loc.latitude) if loc.latitude is not None else None,
-                'city': loc.city.name if loc.city else None,
-                'region': loc.region.name if loc.region else None,
-                'country': loc.country.name if loc.country else None,
-                'images': [],
-                'attachments': [],
-            }
+        if not wants_sync(request):
+            job = enqueue_job(request.user, 'collection_export', params={'collection_id': str(collection.id)})
+            return Response(DataJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
-            for img in loc.images.all():
-                img_export_id = f"img_{len(export_data['images'])}"
-                image_export_map[str(img.id)] = img_export_id
-                export_data['images'].append({
-                    'export_id': img_export_id,
-                    'id': str(img.id),
-                    'name': os.path.basename(getattr(img.image, 'name', 'image')),
-                    'is_primary': getattr(img, 'is_primary', False),
-                })
-                loc_entry['images'].append(img_export_id)
-
-            for att in loc.attachments.all():
-                att_export_id = f"att_{len(export_data['attachments'])}"
-                export_data['attachments'].append({
-                    'export_id': att_export_id,
-                    'id': str(att.id),
-                    'name': os.path.basename(getattr(att.file, 'name', 'attachment')),
-                })
-                loc_entry['attachments'].append(att_export_id)
-
-            export_data['locations'].append(loc_entry)
-
-        if collection.primary_image:
-            export_data['primary_image_ref'] = image_export_map.get(str(collection.primary_image.id))
-
-        # Related content (if models have FK to collection)
-        for t in Transportation.objects.filter(collection=collection):
-            export_data['transportation'].append({
-                'id': str(t.id),
-                'type': getattr(t, 'transportation_type', None),
-                'name': getattr(t, 'name', None),
-                # Omit date
-                'notes': getattr(t, 'notes', None),
-            })
-        for n in Note.objects.filter(collection=collection):
-            export_data['notes'].append({
-                'id': str(n.id),
-                'title': getattr(n, 'title', None),
-                'content': getattr(n, 'content', ''),
-                # Omit created_at
-            })
-        for c in Checklist.objects.filter(collection=collection):
-            items = []
-            if hasattr(c, 'items'):
-                items = [
-                    {
-                        'name': getattr(item, 'name', None),
-                        'completed': getattr(item, 'completed', False),
-                    } for item in c.items.all()
-                ]
-            export_data['checklists'].append({
-                'id': str(c.id),
-                'name': getattr(c, 'name', None),
-                'items': items,
-            })
-        for l in Lodging.objects.filter(collection=collection):
-            export_data['lodging'].append({
-                'id': str(l.id),
-                'type': getattr(l, 'lodging_type', None),
-                'name': getattr(l, 'name', None),
-                # Omit start_date/end_date
-                'notes': getattr(l, 'notes', None),
-            })
-        # Intentionally omit itinerary_items from export
-
-        # Create ZIP in temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.zip') as tmp_file:
-            with zipfile.ZipFile(tmp_file, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                zipf.writestr('metadata.json', json.dumps(export_data, indent=2))
-
-                # Write image files
-                for loc in collection.locations.all():
-                    for img in loc.images.all():
-                        export_id = image_export_map.get(str(img.id))
-                        if not export_id:
-                            continue
-                        try:
-                            file_name = os.path.basename(getattr(img.image, 'name', 'image'))
-                            storage = getattr(img.image, 'storage', None)
-                            if storage:
-                                with storage.open(img.image.name, 'rb') as f:
-                                    zipf.writestr(f'images/{export_id}-{file_name}', f.read())
-                            elif hasattr(img.image, 'path'):
-                                with open(img.image.path, 'rb') as f:
-                                    zipf.writestr(f'images/{export_id}-{file_name}', f.read())
-                        except Exception:
-                            continue
-
-                # Write attachment files
-                for loc in collection.locations.all():
-                    for att in loc.attachments.all():
-                        try:
-                            file_name = os.path.basename(getattr(att.file, 'name', 'attachment'))
-                            storage = getattr(att.file, 'storage', None)
-                            if storage:
-                                with storage.open(att.file.name, 'rb') as f:
-                                    zipf.writestr(f'attachments/{file_name}', f.read())
-                            elif hasattr(att.file, 'path'):
-                                with open(att.file.path, 'rb') as f:
-                                    zipf.writestr(f'attachments/{file_name}', f.read())
-                        except Exception:
-                            continue
-
-            with open(tmp_file.name, 'rb') as fh:
-                data = fh.read()
-            os.unlink(tmp_file.name)
-
-        filename = f"collection-{collection.name.replace(' ', '_')}.zip"
-        response = HttpResponse(data, content_type='application/zip')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        export_data, media_entries = build_collection_export(collection)
+        return zip_streaming_response(
+            collection_archive_chunks(export_data, media_entries), collection_archive_filename(collection)
+        )
 
     @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
     def import_collection(self, request):
-        """Import a single collection from a ZIP file. Handles name conflicts by appending (n)."""
+        """
+        Import a single collection from a ZIP file. Handles name conflicts by appending (n).
+        The import runs as a background job unless ?sync=true is passed.
+        """
         upload = request.FILES.get('file')
         if not upload:
             return Response({'detail': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Read zip
-        file_bytes = upload.read()
-        with zipfile.ZipFile(io.BytesIO(file_bytes), 'r') as zipf:
-            try:
-                metadata = json.loads(zipf.read('metadata.json').decode('utf-8'))
-            except KeyError:
-                return Response({'detail': 'metadata.json missing'}, status=status.HTTP_400_BAD_REQUEST)
-
-            base_name = (metadata.get('collection') or {}).get('name') or 'Imported Collection'
-
-            # Ensure unique name per user
-            existing_names = set(request.user.collection_set.values_list('name', flat=True))
-            unique_name = base_name
-            if unique_name in existing_names:
-                i = 1
-                while True:
-                    candidate = f"{base_name} ({i})"
-                    if candidate not in existing_names:
-                        unique_name = candidate
-                        break
-                    i += 1
-
-            new_collection = Collection.objects.create(
-                user=request.user,
-                name=unique_name,
-                description=(metadata.get('collection') or {}).get('description'),
-                is_public=(metadata.get('collection') or {}).get('is_public', False),
-                start_date=__import__('datetime').date.fromisoformat((metadata.get('collection') or {}).get('start_date')) if (metadata.get('collection') or {}).get('start_date') else None,
-                end_date=__import__('datetime').date.fromisoformat((metadata.get('collection') or {}).get('end_date')) if (metadata.get('collection') or {}).get('end_date') else None,
-                link=(metadata.get('collection') or {}).get('link'),
-            )
-
-            image_export_map = {img['export_id']: img for img in metadata.get('images', [])}
-            attachment_export_map = {att['export_id']: att for att in metadata.get('attachments', [])}
-
-            # Import locations
-            for loc_data in metadata.get('locations', []):
-                cat_obj = None
-                if loc_data.get('category'):
-                    cat_obj, _ = Category.objects.get_or_create(user=request.user, name=loc_data['category'])
-                # Attempt to find a very similar existing location for this user
-                from difflib import SequenceMatcher
-
-                def _ratio(a, b):
-                    a = (a or '').strip().lower()
-                    b = (b or '').strip().lower()
-                    if not a and not b:
-                        return 1.0
-                    return SequenceMatcher(None, a, b).ratio()
-
-                def _coords_close(lat1, lon1, lat2, lon2, threshold=0.02):
-                    try:
-                        if lat1 is None or lon1 is None or lat2 is None or lon2 is None:
-                            return False
-                        return abs(float(lat1) - float(lat2)) <= threshold and abs(float(lon1) - float(lon2)) <= threshold
-                    except Exception:
-                        return False
-
-                incoming_name = loc_data.get('name') or 'Untitled'
-                incoming_location_text = loc_data.get('location')
-                incoming_lat = loc_data.get('latitude')
-                incoming_lon = loc_data.get('longitude')
-
-                existing_loc = None
-                best_score = 0.0
-                for cand in Location.objects.filter(user=request.user):
-                    name_score = _ratio(incoming_name, cand.name)
-                    loc_text_score = _ratio(incoming_location_text, getattr(cand, 'location', None))
-                    close_coords = _coords_close(incoming_lat, incoming_lon, cand.latitude, cand.longitude)
-                    # Define "very similar": strong name match OR decent name with location/coords match
-                    combined_score = max(name_score, (name_score + loc_text_score) / 2.0)
-                    if close_coords:
-                        combined_score = max(combined_score, name_score + 0.1)  # small boost for coord proximity
-                    if combined_score > best_score and (
-                        name_score >= 0.92 or (name_score >= 0.85 and (loc_text_score >= 0.85 or close_coords))
-                    ):
-                        best_score = combined_score
-                        existing_loc = cand
-
-                if existing_loc:
-                    # Link existing location to the new collection, skip creating a duplicate
-                    loc = existing_loc
-                    loc.collections.add(new_collection)
-                    created_new_loc = False
-                else:
-                    # Create a brand-new location
-                    loc = Location.objects.create(
-                        user=request.user,
-                        name=incoming_name,
-                        description=loc_data.get('description'),
-                        location=incoming_location_text,
-                        tags=loc_data.get('tags') or [],
-                        rating=loc_data.get('rating'),
-                        link=loc_data.get('link'),
-                        is_public=bool(loc_data.get('is_public', False)),
-                        longitude=incoming_lon,
-                        latitude=incoming_lat,
-                        category=cat_obj,
-                    )
-                    loc.collections.add(new_collection)
-                    created_new_loc = True
+        if not wants_sync(request):
+            job = enqueue_job(request.user, 'collection_import', upload=upload)
+            return Response(DataJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
-                # Images
-                # Only import images for newly created locations to avoid duplicating user content
-                if created_new_loc:
-                    for export_id in loc_data.get('images', []):
-                        img_meta = image_export_map.get(export_id)
-                        if not img_meta:
-                            continue
-                        prefix = f"images/{export_id}-"
-                        member = next((m for m in zipf.namelist() if m.startswith(prefix)), None)
-                        if not member:
-                            continue
-                        file_bytes_img = zipf.read(member)
-                        file_name_img = os.path.basename(member)
-                        from django.core.files.base import ContentFile
-                        image_obj = ContentImage(
-                            user=request.user,
-                            image=ContentFile(file_bytes_img, name=file_name_img),
-                        )
-                        # Assign to the generic relation for Location
-                        image_obj.content_object = loc
-                        image_obj.save()
-                        if img_meta.get('is_primary'):
-                            new_collection.primary_image = image_obj
-                            new_collection.save(update_fields=['primary_image'])
-
-                # Attachments
-                if created_new_loc:
-                    for export_id in loc_data.get('attachments', []):
-                        att_meta = attachment_export_map.get(export_id)
-                        if not att_meta:
-                            continue
-                        file_name_att = att_meta.get('name', '')
-                        member = next((m for m in zipf.namelist() if m == f"attachments/{file_name_att}"), None)
-                        if not member:
-                            continue
-                        file_bytes_att = zipf.read(member)
-                        from django.core.files.base import ContentFile
-                        attachment_obj = ContentAttachment(
-                            user=request.user,
-                            file=ContentFile(file_bytes_att, name=file_name_att),
-                        )
-                        # Assign to the generic relation for Location
-                        attachment_obj.content_object = loc
-                        attachment_obj.save()
-
-            serializer = self.get_serializer(new_collection)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        # Read the archive from the upload itself; large uploads are already
+        # spooled to a temporary file by Django's upload handlers
+        upload.seek(0)
+        try:
+            new_collection = import_collection_archive(upload, request.user)
+        except CollectionArchiveError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
+        serializer = self.get_serializer(new_collection)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['post'])
     def duplicate(self, request, pk=None):
@@ -814,209 +515,12 @@ class CollectionViewSet(viewsets.ModelViewSet):
 
         try:
             with transaction.atomic():
-                new_collection = Collection.objects.create(
-                    user=request.user,
-                    name=f"Copy of {original.name}",
-                    description=original.description,
-                    link=original.link,
-                    is_public=False,
-                    is_archived=False,
-                    start_date=original.start_date,
-                    end_date=original.end_date,
-                )
-
-                # Link existing locations to the new collection
-                linked_locations = list(original.locations.all())
-                if linked_locations:
-                    new_collection.locations.set(linked_locations)
-
-                # Duplicate primary image if it exists so permissions align with the new collection
-                if original.primary_image:
-                    original_primary = original.primary_image
-                    if original_primary.image:
-                        try:
-                            original_primary.image.open('rb')
-                            image_bytes = original_primary.image.read()
-                        finally:
-                            try:
-                                original_primary.image.close()
-                            except Exception:
-                                pass
-
-                        file_name = (original_primary.image.name or '').split('/')[-1] or 'image.webp'
-                        new_primary = ContentImage(
-                            user=request.user,
-                            image=ContentFile(image_bytes, name=file_name),
-                            immich_id=None,
-                            is_primary=original_primary.is_primary,
-                        )
-                    else:
-                        new_primary = ContentImage(
-                            user=request.user,
-                            immich_id=original_primary.immich_id,
-                            is_primary=original_primary.is_primary,
-                        )
-
-                    new_primary.content_object = new_collection
-                    new_primary.save()
-                    new_collection.primary_image = new_primary
-                    new_collection.save(update_fields=['primary_image'])
+                new_collection = duplicate_collection(original, request.user)
 
-                def _copy_generic_media(source_obj, target_obj):
-                    # Images
-                    for img in source_obj.images.all():
-                        if img.image:
-                            try:
-                                img.image.open('rb')
-                                image_bytes = img.image.read()
-                            finally:
-                                try:
-                                    img.image.close()
-                                except Exception:
-                                    pass
-
-                            file_name = (img.image.name or '').split('/')[-1] or 'image.webp'
-                            media = ContentImage(
-                                user=request.user,
-                                image=ContentFile(image_bytes, name=file_name),
-                                immich_id=None,
-                                is_primary=img.is_primary,
-                            )
-                        else:
-                            media = ContentImage(
-                                user=request.user,
-                                immich_id=img.immich_id,
-                                is_primary=img.is_primary,
-                            )
-
-                        media.content_object = target_obj
-                        media.save()
-
-                    # Attachments
-                    for attachment in source_obj.attachments.all():
-                        try:
-                            attachment.file.open('rb')
-                            file_bytes = attachment.file.read()
-                        finally:
-                            try:
-                                attachment.file.close()
-                            except Exception:
-                                pass
-
-                        file_name = (attachment.file.name or '').split('/')[-1] or 'attachment'
-                        new_attachment = ContentAttachment(
-                            user=request.user,
-                            file=ContentFile(file_bytes, name=file_name),
-                            name=attachment.name,
-                        )
-                        new_attachment.content_object = target_obj
-                        new_attachment.save()
-
-                # Copy FK-based related content and track ID mapping for itinerary relinks
-                object_id_map = {}
-
-                for item in Transportation.objects.filter(collection=original):
-                    new_item = Transportation.objects.create(
-                        user=request.user,
-                        collection=new_collection,
-                        type=item.type,
-                        name=item.name,
-                        description=item.description,
-                        rating=item.rating,
-                        price=item.price,
-                        link=item.link,
-                        date=item.date,
-                        end_date=item.end_date,
-                        start_timezone=item.start_timezone,
-                        end_timezone=item.end_timezone,
-                        flight_number=item.flight_number,
-                        from_location=item.from_location,
-                        origin_latitude=item.origin_latitude,
-                        origin_longitude=item.origin_longitude,
-                        destination_latitude=item.destination_latitude,
-                        destination_longitude=item.destination_longitude,
-                        start_code=item.start_code,
-                        end_code=item.end_code,
-                        to_location=item.to_location,
-                        is_public=item.is_public,
-                    )
-                    object_id_map[item.id] = new_item.id
-                    _copy_generic_media(item, new_item)
-
-                for item in Note.objects.filter(collection=original):
-                    new_item = Note.objects.create(
-                        user=request.user,
-                        collection=new_collection,
-                        name=item.name,
-                        content=item.content,
-                        links=item.links,
-                        date=item.date,
-                        is_public=item.is_public,
-                    )
-                    object_id_map[item.id] = new_item.id
-                    _copy_generic_media(item, new_item)
-
-                for item in Lodging.objects.filter(collection=original):
-                    new_item = Lodging.objects.create(
-                        user=request.user,
-                        collection=new_collection,
-                        name=item.name,
-                        type=item.type,
-                        description=item.description,
-                        rating=item.rating,
-                        link=item.link,
-                        check_in=item.check_in,
-                        check_out=item.check_out,
-                        timezone=item.timezone,
-                        reservation_number=item.reservation_number,
-                        price=item.price,
-                        latitude=item.latitude,
-                        longitude=item.longitude,
-                        location=item.location,
-                        is_public=item.is_public,
-                    )
-                    object_id_map[item.id] = new_item.id
-                    _copy_generic_media(item, new_item)
-
-                for checklist in Checklist.objects.filter(collection=original):
-                    new_checklist = Checklist.objects.create(
-                        user=request.user,
-                        collection=new_collection,
-                        name=checklist.name,
-                        date=checklist.date,
-                        is_public=checklist.is_public,
-                    )
-                    object_id_map[checklist.id] = new_checklist.id
-
-                    for checklist_item in checklist.checklistitem_set.all():
-                        ChecklistItem.objects.create(
-                            user=request.user,
-                            checklist=new_checklist,
-                            name=checklist_item.name,
-                            is_checked=checklist_item.is_checked,
-                        )
-
-                # Copy itinerary day metadata
-                for day in CollectionItineraryDay.objects.filter(collection=original):
-                    CollectionItineraryDay.objects.create(
-                        collection=new_collection,
-                        date=day.date,
-                        name=day.name,
-                        description=day.description,
-                    )
-
-                # Copy itinerary items and relink to duplicated FK-based content where applicable
-                for item in CollectionItineraryItem.objects.filter(collection=original):
-                    CollectionItineraryItem.objects.create(
-                        collection=new_collection,
-                        content_type=item.content_type,
-                        object_id=object_id_map.get(item.object_id, item.object_id),
-                        date=item.date,
-                        is_global=item.is_global,
-                        order=item.order,
-                    )
-
-            serializer = self.get_serializer(new_collection)
+            new_collection = collection_detail_queryset(Collection.objects.filter(id=new_collection.id)).get()
+            context = self.get_serializer_context()
+            context.update(collection_detail_context(new_collection, request.user))
+            serializer = self.get_serializer_class()(new_collection, context=context)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         except Exception:
@@ -1141,7 +645,14 @@ class CollectionViewSet(viewsets.ModelViewSet):
         paginator = self.pagination_class()
         page = paginator.paginate_queryset(queryset, request)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
+            serializer = self.get_listing_serializer(page)
             return paginator.get_paginated_response(serializer.data)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        serializer = self.get_listing_serializer(queryset)
+        return Response(serializer.data)
+
+    def get_listing_serializer(self, collections):
+        """Serialize a page of collections with their cover images loaded in one query"""
+        collections = list(collections)
+        context = self.get_serializer_context()
+        context['collection_cover_images'] = collection_cover_images(collections)
+        return self.get_serializer_class()(collections, many=True, context=context)
\ No newline at end of file
@@ -0,0 +1,36 @@
+from django.http import FileResponse
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from adventures.models import DataJob
+from adventures.serializers import DataJobSerializer
+from adventures.utils.jobs import cancel_job
+
+
+class DataJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Status of the user's background export/import jobs, with cancel and
+    download of the finished archive.
+    """
+    serializer_class = DataJobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return DataJob.objects.filter(user=self.request.user)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        job = cancel_job(self.get_object())
+        return Response(self.get_serializer(job).data)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'succeeded' or not job.result_file:
+            return Response({'error': 'The job has no result to download'}, status=status.HTTP_404_NOT_FOUND)
+        filename = (job.result or {}).get('filename') or f'{job.id}.zip'
+        return FileResponse(
+            job.result_file.open('rb'), as_attachment=True, filename=filename, content_type='application/zip'
+        )
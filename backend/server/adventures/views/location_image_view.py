@@ -384,7 +384,9 @@ class ContentImageViewSet(viewsets.ModelViewSet):
             file_ext = ext_map.get(content_type_header, '.jpg')
             filename = f"immich_{immich_id}{file_ext}"
             
-            # Create a Django ContentFile from the downloaded image
+            # Create a Django ContentFile from the downloaded image. On save it is
+            # adopted into the blob store, so repeated copies of the same asset
+            # end up sharing one file on disk.
             image_file = ContentFile(immich_response.content, name=filename)
             
             # Modify request data to use the downloaded image instead of immich_id
@@ -398,10 +400,11 @@ class ContentImageViewSet(viewsets.ModelViewSet):
             serializer = self.get_serializer(data=request_data)
             serializer.is_valid(raise_exception=True)
             
-            # Save with the downloaded image
+            # Save with the downloaded image; it is normalized in the background
             serializer.save(
                 user=content_object.user if hasattr(content_object, 'user') else request.user,
                 image=image_file,
+                processing=True,
                 content_type=content_type,
                 object_id=object_id
             )
@@ -455,9 +458,11 @@ class ContentImageViewSet(viewsets.ModelViewSet):
             'object_id': object_id,
         }
         
-        # Add image file if provided
+        # Add image file if provided; it is stored as uploaded and normalized
+        # in the background (see adventures.utils.image_ingest)
         if image_file:
             save_kwargs['image'] = image_file
+            save_kwargs['processing'] = True
 
         # Save with appropriate parameters
         serializer.save(**save_kwargs)
@@ -2,7 +2,6 @@ import logging
 from django.utils import timezone
 from django.db import transaction
 from django.core.exceptions import PermissionDenied
-from django.core.files.base import ContentFile
 from django.db.models import Q, Max, Prefetch
 from django.db.models.functions import Lower
 from rest_framework import viewsets, status
@@ -14,6 +13,7 @@ from django.contrib.contenttypes.models import ContentType
 from adventures.permissions import IsOwnerOrSharedWithFullAccess
 from adventures.serializers import LocationSerializer, MapPinSerializer, CalendarLocationSerializer
 from adventures.utils import pagination
+from adventures.utils.media_blobs import shared_file_kwargs
 
 logger = logging.getLogger(__name__)
 
@@ -262,8 +262,8 @@ class LocationViewSet(viewsets.ModelViewSet):
     def duplicate(self, request, pk=None):
         """Create a duplicate of an existing location.
 
-        Copies all fields except collections and visits. Images are duplicated as
-        independent files (not shared references). The name is prefixed with
+        Copies all fields except collections and visits. Images get new records
+        that share the original's stored blob. The name is prefixed with
         "Copy of " and is_public is reset to False.
         """
         original = self.get_object()
@@ -341,37 +341,18 @@ class LocationViewSet(viewsets.ModelViewSet):
                 if target_collection:
                     new_location.collections.set([target_collection])
 
-                # Duplicate images as independent files/new records
+                # Duplicate image records; local files are content-addressed
+                # blobs, so the copy shares the original file on disk
                 location_ct = ContentType.objects.get_for_model(Location)
                 for img in original_images:
-                    if img.image:
-                        try:
-                            img.image.open('rb')
-                            image_bytes = img.image.read()
-                        finally:
-                            try:
-                                img.image.close()
-                            except Exception:
-                                pass
-
-                        file_name = (img.image.name or '').split('/')[-1] or 'image.webp'
-
-                        ContentImage.objects.create(
-                            content_type=location_ct,
-                            object_id=str(new_location.id),
-                            image=ContentFile(image_bytes, name=file_name),
-                            immich_id=None,
-                            is_primary=img.is_primary,
-                            user=request.user,
-                        )
-                    else:
-                        ContentImage.objects.create(
-                            content_type=location_ct,
-                            object_id=str(new_location.id),
-                            immich_id=img.immich_id,
-                            is_primary=img.is_primary,
-                            user=request.user,
-                        )
+                    ContentImage.objects.create(
+                        content_type=location_ct,
+                        object_id=str(new_location.id),
+                        immich_id=None if img.image else img.immich_id,
+                        is_primary=img.is_primary,
+                        user=request.user,
+                        **shared_file_kwargs(img),
+                    )
 
             serializer = self.get_serializer(new_location)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
@@ -5,6 +5,7 @@ from rest_framework.response import Response
 from worldtravel.models import Region, City, VisitedRegion, VisitedCity
 from adventures.models import Location
 from adventures.serializers import LocationSerializer
+from adventures.utils.stats import mark_user_stats_dirty
 from adventures.geocoding import reverse_geocode
 from django.conf import settings
 from adventures.geocoding import search_google, search_osm
@@ -94,6 +95,8 @@ class ReverseGeocodeViewSet(viewsets.ViewSet):
         
         if new_visited_regions:
             VisitedRegion.objects.bulk_create(new_visited_regions)
+            # bulk_create sends no post_save signals for the rollup
+            mark_user_stats_dirty(self.request.user.id, 'regions')
             new_region_count = len(new_visited_regions)
             # Get region names for response
             regions = Region.objects.filter(
@@ -119,6 +122,7 @@ class ReverseGeocodeViewSet(viewsets.ViewSet):
         
         if new_visited_cities:
             VisitedCity.objects.bulk_create(new_visited_cities)
+            mark_user_stats_dirty(self.request.user.id, 'cities')
             new_city_count = len(new_visited_cities)
             # Get city names for response
             cities = City.objects.filter(
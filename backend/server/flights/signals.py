@@ -5,12 +5,25 @@ Auto-creates Location objects so flight-visited cities appear on the Locations p
 """
 
 import logging
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 logger = logging.getLogger(__name__)
 
 
+@receiver(post_save, sender='flights.Flight')
+@receiver(post_delete, sender='flights.Flight')
+def flight_changed_update_stats_version(sender, instance, origin=None, **kwargs):
+    """Invalidate the owner's cached stats timeseries when a flight changes."""
+    from django.contrib.auth import get_user_model
+    from adventures.utils.stats import mark_user_data_changed
+
+    User = get_user_model()
+    if isinstance(origin, User) or getattr(origin, 'model', None) is User:
+        return
+    mark_user_data_changed(instance.user_id)
+
+
 @receiver(post_save, sender='flights.Flight')
 def mark_visited_on_completed_flight(sender, instance, **kwargs):
     """
@@ -0,0 +1,240 @@
+"""
+On-disk cache of assets proxied from Immich.
+
+Immich images are not stored by AdventureLog; every view used to be fetched
+from the Immich server again. Fetched assets are now kept in a ``DiskLRU``
+under ``IMMICH_CACHE_DIR``, bounded by ``IMMICH_CACHE_MAX_BYTES``:
+
+    <integration id>/<asset id>/<size>          the asset
+    <integration id>/<asset id>/<size>.json     content type and validators
+
+A cached asset is served without asking Immich for
+``IMMICH_CACHE_FRESH_SECONDS``. After that it is revalidated with the ETag and
+Last-Modified Immich sent, and served stale if Immich is unreachable.
+Responses carry their own ETag and support single byte ranges, so browsers
+can revalidate and videos can seek.
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+import requests
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from adventures.utils.disk_lru import DiskLRU
+
+# Immich endpoint of each size, relative to /assets/<asset id>/
+ASSET_SIZES = {
+    'thumbnail': 'thumbnail?size=thumbnail',
+    'preview': 'thumbnail?size=preview',
+    'original': 'original',
+}
+
+ASSET_CONTENT_TYPES = ('image/', 'video/')
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+immich_cache = DiskLRU(
+    'immich',
+    root=lambda: settings.IMMICH_CACHE_DIR,
+    max_bytes_setting='IMMICH_CACHE_MAX_BYTES',
+)
+
+
+class ImmichAssetError(Exception):
+    """Immich answered with something other than an asset."""
+
+
+def _paths(integration_id, asset_id, size):
+    data_path = immich_cache.path(str(integration_id), asset_id, size)
+    return data_path, data_path + '.json'
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path) as meta_file:
+            return json.load(meta_file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_file(path, chunks):
+    """Atomically write ``chunks`` to ``path``; returns (size, sha1 hex)."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    digest = hashlib.sha1()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in chunks:
+                out.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return size, digest.hexdigest()
+
+
+def _write_meta(meta_path, meta):
+    return _write_file(meta_path, [json.dumps(meta).encode('utf-8')])[0]
+
+
+def _fetch(integration, asset_id, size, data_path, meta_path, meta=None):
+    """
+    Download an asset into the cache, or revalidate the cached copy described
+    by ``meta``. Returns the asset's meta and the number of bytes written.
+    """
+    headers = {'x-api-key': integration.api_key}
+    if meta:
+        if meta.get('upstream_etag'):
+            headers['If-None-Match'] = meta['upstream_etag']
+        if meta.get('upstream_last_modified'):
+            headers['If-Modified-Since'] = meta['upstream_last_modified']
+
+    url = f'{integration.server_url}/assets/{asset_id}/{ASSET_SIZES[size]}'
+    with requests.get(url, headers=headers, timeout=5, stream=True) as response:
+        if meta and response.status_code == 304:
+            meta['fetched_at'] = time.time()
+            _write_meta(meta_path, meta)
+            immich_cache.touch(data_path)
+            return meta, 0
+
+        content_type = response.headers.get('Content-Type', 'image/jpeg')
+        if response.status_code != 200 or not content_type.startswith(ASSET_CONTENT_TYPES):
+            raise ImmichAssetError(f'Immich answered {response.status_code} {content_type}')
+
+        written, sha1 = _write_file(data_path, response.iter_content(CHUNK_SIZE))
+        meta = {
+            'content_type': content_type,
+            'etag': f'"{sha1}"',
+            'upstream_etag': response.headers.get('ETag'),
+            'upstream_last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': time.time(),
+        }
+    written += _write_meta(meta_path, meta)
+    return meta, written
+
+
+def open_asset(integration, asset_id, size):
+    """
+    Return ``(file, meta)`` for an Immich asset, fetching or revalidating it
+    when the cached copy is missing or stale. Raises ``ImmichAssetError`` for
+    a bad answer and ``requests`` errors when Immich is unreachable and
+    nothing is cached.
+    """
+    data_path, meta_path = _paths(integration.id, asset_id, size)
+    meta = _read_meta(meta_path)
+    try:
+        asset = open(data_path, 'rb') if meta else None
+    except FileNotFoundError:
+        asset, meta = None, None
+
+    if asset and time.time() - meta['fetched_at'] < settings.IMMICH_CACHE_FRESH_SECONDS:
+        immich_cache.touch(data_path)
+        return asset, meta
+
+    try:
+        meta, written = _fetch(integration, asset_id, size, data_path, meta_path, meta)
+    except requests.exceptions.RequestException:
+        if asset:
+            # A stale copy beats no image while Immich is down
+            return asset, meta
+        raise
+    except BaseException:
+        if asset:
+            asset.close()
+        raise
+
+    if written:
+        if asset:
+            asset.close()
+        # Opened before accounting so eviction cannot remove it from under us
+        asset = open(data_path, 'rb')
+        immich_cache.add(written)
+    return asset, meta
+
+
+def _byte_range(header, length):
+    """
+    Return ``(start, end)`` of a single byte range, inclusive, or None when the
+    header should be ignored. ``start == length`` means unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        suffix = int(last)
+        return (max(length - suffix, 0) if suffix else length), length - 1
+    start = int(first)
+    end = min(int(last), length - 1) if last else length - 1
+    if last and int(last) < start:
+        return None
+    return min(start, length), end
+
+
+def _chunks(asset, start, length):
+    try:
+        asset.seek(start)
+        while length > 0:
+            chunk = asset.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        asset.close()
+
+
+def asset_response(request, asset, meta):
+    """Serve an open cached asset, answering conditional and range requests."""
+    length = os.fstat(asset.fileno()).st_size
+    last_modified = meta.get('upstream_last_modified')
+
+    not_modified = get_conditional_response(
+        request,
+        etag=meta['etag'],
+        last_modified=parse_http_date_safe(last_modified) if last_modified else None,
+    )
+    if not_modified is not None:
+        asset.close()
+        return not_modified
+
+    start, end, status = 0, length - 1, 200
+    range_header = request.headers.get('Range')
+    if_range = request.headers.get('If-Range')
+    if range_header and (not if_range or if_range == meta['etag']):
+        byte_range = _byte_range(range_header, length)
+        if byte_range and byte_range[0] >= length:
+            asset.close()
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{length}'
+            return response
+        if byte_range:
+            (start, end), status = byte_range, 206
+
+    response = StreamingHttpResponse(
+        _chunks(asset, start, end - start + 1), content_type=meta['content_type'], status=status
+    )
+    response['Content-Length'] = str(end - start + 1)
+    if status == 206:
+        response['Content-Range'] = f'bytes {start}-{end}/{length}'
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = meta['etag']
+    if last_modified:
+        response['Last-Modified'] = last_modified
+    response['Cache-Control'] = 'public, max-age=86400, stale-while-revalidate=3600'
+    return response
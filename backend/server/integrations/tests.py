@@ -1,3 +1,90 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import time
+import uuid
+from types import SimpleNamespace
+from unittest.mock import patch
 
-# Create your tests here.
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from integrations.immich_cache import asset_response, open_asset
+
+ASSET = bytes(range(256)) * 4
+
+
+class FakeImmichResponse:
+    def __init__(self, status_code=500, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    IMMICH_CACHE_MAX_BYTES=10 ** 9,
+    IMMICH_CACHE_FRESH_SECONDS=60,
+)
+class ImmichAssetCacheTests(SimpleTestCase):
+    """Immich assets are fetched once, revalidated when stale and served with ranges."""
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        settings_override = self.settings(IMMICH_CACHE_DIR=cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.integration = SimpleNamespace(id=uuid.uuid4(), server_url='http://immich', api_key='key')
+        self.factory = RequestFactory()
+
+    def fetch(self, request=None, **immich_response):
+        response = FakeImmichResponse(**immich_response)
+        with patch('integrations.immich_cache.requests.get', return_value=response) as get:
+            asset, meta = open_asset(self.integration, 'asset-1', 'original')
+            response = asset_response(request or self.factory.get('/'), asset, meta)
+        return response, get
+
+    def test_asset_is_cached_and_revalidated(self):
+        headers = {'Content-Type': 'video/mp4', 'ETag': '"immich-1"'}
+        response, get = self.fetch(status_code=200, content=ASSET, headers=headers)
+        self.assertEqual(b''.join(response.streaming_content), ASSET)
+        self.assertEqual(get.call_count, 1)
+
+        # Fresh: served from disk without asking Immich
+        response, get = self.fetch()
+        self.assertEqual(b''.join(response.streaming_content), ASSET)
+        get.assert_not_called()
+
+        # Stale: revalidated with Immich's validator and kept on 304
+        with patch('integrations.immich_cache.time.time', return_value=time.time() + 120):
+            response, get = self.fetch(status_code=304)
+        self.assertEqual(get.call_args.kwargs['headers']['If-None-Match'], '"immich-1"')
+        self.assertEqual(b''.join(response.streaming_content), ASSET)
+
+    def test_conditional_and_range_requests(self):
+        response, _ = self.fetch(status_code=200, content=ASSET, headers={'Content-Type': 'video/mp4'})
+        etag = response['ETag']
+        b''.join(response.streaming_content)
+
+        response, _ = self.fetch(self.factory.get('/', HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 304)
+
+        response, _ = self.fetch(self.factory.get('/', HTTP_RANGE='bytes=100-199'))
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(ASSET)}')
+        self.assertEqual(b''.join(response.streaming_content), ASSET[100:200])
+
+        response, _ = self.fetch(self.factory.get('/', HTTP_RANGE='bytes=-10'))
+        self.assertEqual(b''.join(response.streaming_content), ASSET[-10:])
+
+        response, _ = self.fetch(self.factory.get('/', HTTP_RANGE=f'bytes={len(ASSET)}-'))
+        self.assertEqual(response.status_code, 416)
@@ -7,8 +7,10 @@ from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 import requests
 from adventures.models import ContentImage
-from django.http import HttpResponse
+from adventures.utils.file_permissions import cached_permission
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
+from integrations.immich_cache import ASSET_SIZES, ImmichAssetError, asset_response, open_asset
 from integrations.utils import StandardResultsSetPagination
 import logging
 
@@ -220,6 +222,65 @@ class ImmichIntegrationView(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+    # Why a user may not see an asset: (status, message, code)
+    ACCESS_DENIED = {
+        'private_location': (
+            status.HTTP_403_FORBIDDEN,
+            'This image belongs to a private location and you are not authorized.',
+            'immich.permission_denied',
+        ),
+        'private_content': (
+            status.HTTP_403_FORBIDDEN,
+            'This image is not publicly accessible and you are not the owner.',
+            'immich.permission_denied',
+        ),
+        'unlinked': (
+            status.HTTP_404_NOT_FOUND,
+            'Image is not linked to any location and you are not the owner.',
+            'immich.not_found',
+        ),
+    }
+
+    @staticmethod
+    def get_asset_access(user, integration, imageid):
+        """
+        Access levels (any image linked to the asset may grant access):
+        1. The integration owner: always
+        2. Public locations: accessible by anyone
+        3. Private locations in public collections: accessible by anyone
+        4. Private locations in collections shared with or owned by the user
+        5. Anything else, or no ContentImage: owner only
+        Returns 'allowed' or a key of ACCESS_DENIED.
+        """
+        if user.is_authenticated and user.id == integration.user_id:
+            return 'allowed'
+
+        image_entries = list(
+            ContentImage.objects
+            .filter(immich_id=imageid, user_id=integration.user_id)
+            .prefetch_related('content_object')
+        )
+        if not image_entries:
+            return 'unlinked'
+
+        if user.is_authenticated:
+            collection_access = Q(is_public=True) | Q(user_id=user.id) | Q(shared_with__id=user.id)
+        else:
+            collection_access = Q(is_public=True)
+
+        linked_to_location = False
+        for image_entry in image_entries:
+            content_obj = image_entry.content_object
+            # Only Location-like objects can be shared (can be extended for other types)
+            if not hasattr(content_obj, 'is_public'):
+                continue
+            linked_to_location = True
+            if content_obj.is_public:
+                return 'allowed'
+            if hasattr(content_obj, 'collections') and content_obj.collections.filter(collection_access).exists():
+                return 'allowed'
+        return 'private_location' if linked_to_location else 'private_content'
+
     @action(
     detail=False,
     methods=['get'],
@@ -228,13 +289,9 @@ class ImmichIntegrationView(viewsets.ViewSet):
     )
     def get_by_integration(self, request, integration_id=None, imageid=None):
         """
-        GET an Immich image using the integration and asset ID.
-        Access levels (in order of priority):
-        1. Public locations: accessible by anyone
-        2. Private locations in public collections: accessible by anyone
-        3. Private locations in private collections shared with user: accessible by shared users, and the collection owner
-        4. Private locations: accessible only to the owner
-        5. No ContentImage: owner can still view via integration
+        GET an Immich asset using the integration and asset ID.
+        ``?size=`` is one of thumbnail, preview (default) or original.
+        Assets are served from a local disk cache, see integrations.immich_cache.
         """
         if not imageid or not integration_id:
             return Response({
@@ -243,125 +300,38 @@ class ImmichIntegrationView(viewsets.ViewSet):
                 'code': 'immich.missing_params'
             }, status=status.HTTP_400_BAD_REQUEST)
 
-        # Lookup integration and user
+        size = request.query_params.get('size', 'preview')
+        if size not in ASSET_SIZES:
+            return Response({
+                'message': f'Size must be one of {", ".join(ASSET_SIZES)}.',
+                'error': True,
+                'code': 'immich.invalid_size'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         integration = get_object_or_404(ImmichIntegration, id=integration_id)
-        owner_id = integration.user
 
-        # Get all images for this immich_id and user
-        image_entries = list(
-            ContentImage.objects
-            .filter(immich_id=imageid, user=owner_id)
-            .select_related('content_type')
+        # Decided once per user and asset, and dropped on sharing changes
+        access = cached_permission(
+            request.user,
+            f'immich/{integration.id}/{imageid}',
+            lambda: self.get_asset_access(request.user, integration, imageid),
         )
+        if access in self.ACCESS_DENIED:
+            status_code, message, code = self.ACCESS_DENIED[access]
+            return Response({
+                'message': message,
+                'error': True,
+                'code': code
+            }, status=status_code)
 
-        # Sort by access level priority and find the best match
-        def get_access_priority(image_entry):
-            """Return priority score for access control (lower = higher priority)"""
-            content_obj = image_entry.content_object
-            
-            # Only handle Location objects for now (can be extended for other types)
-            if not hasattr(content_obj, 'is_public'):
-                return 999  # Low priority for non-location objects
-            
-            # For Location objects, check access levels
-            if content_obj.is_public:
-                return 0  # Highest priority - public location
-            
-            # Check if location is in any public collection
-            if hasattr(content_obj, 'collections'):
-                collections = content_obj.collections.all()
-                if any(collection.is_public for collection in collections):
-                    return 1  # Second priority - private location in public collection
-                    
-                # Check for shared collections (if user is authenticated)
-                if (request.user.is_authenticated and 
-                    any(collection.shared_with.filter(id=request.user.id).exists() 
-                        for collection in collections)):
-                    return 2  # Third priority - shared collection access
-            
-            return 3  # Lowest priority - private location, owner access only
-
-        # Sort image entries by access priority
-        image_entries.sort(key=get_access_priority)
-        image_entry = image_entries[0] if image_entries else None
-
-        # Access control
-        if image_entry:
-            content_obj = image_entry.content_object
-            
-            # Only apply access control to Location objects
-            if hasattr(content_obj, 'is_public'):
-                location = content_obj
-                
-                # Determine access level
-                is_authorized = False
-
-                # Level 1: Public location (highest priority)
-                if location.is_public:
-                    is_authorized = True
-
-                # Level 2: Private location in any public collection
-                elif hasattr(location, 'collections'):
-                    collections = location.collections.all()
-                    if any(collection.is_public for collection in collections):
-                        is_authorized = True
-                    
-                    # Level 3: Owner access
-                    elif request.user.is_authenticated and request.user == owner_id:
-                        is_authorized = True
-                        
-                    # Level 4: Shared collection access or collection owner access
-                    elif (request.user.is_authenticated and 
-                        (any(collection.shared_with.filter(id=request.user.id).exists() 
-                            for collection in collections) or
-                         any(collection.user == request.user for collection in collections))):
-                        is_authorized = True
-                else:
-                    # Location without collections - owner access only
-                    if request.user.is_authenticated and request.user == owner_id:
-                        is_authorized = True
-                
-                if not is_authorized:
-                    return Response({
-                        'message': 'This image belongs to a private location and you are not authorized.',
-                        'error': True,
-                        'code': 'immich.permission_denied'
-                    }, status=status.HTTP_403_FORBIDDEN)
-            else:
-                # For non-Location objects, allow only owner access for now
-                if not request.user.is_authenticated or request.user != owner_id:
-                    return Response({
-                        'message': 'This image is not publicly accessible and you are not the owner.',
-                        'error': True,
-                        'code': 'immich.permission_denied'
-                    }, status=status.HTTP_403_FORBIDDEN)
-        else:
-            # No ContentImage exists; allow only the integration owner
-            if not request.user.is_authenticated or request.user != owner_id:
-                return Response({
-                    'message': 'Image is not linked to any location and you are not the owner.',
-                    'error': True,
-                    'code': 'immich.not_found'
-                }, status=status.HTTP_404_NOT_FOUND)
-
-        # Fetch from Immich
         try:
-            immich_response = requests.get(
-                f'{integration.server_url}/assets/{imageid}/thumbnail?size=preview',
-                headers={'x-api-key': integration.api_key},
-                timeout=5
-            )
-            content_type = immich_response.headers.get('Content-Type', 'image/jpeg')
-            if not content_type.startswith('image/'):
-                return Response({
-                    'message': 'Invalid content type returned from Immich.',
-                    'error': True,
-                    'code': 'immich.invalid_content'
-                }, status=status.HTTP_502_BAD_GATEWAY)
-
-            response = HttpResponse(immich_response.content, content_type=content_type, status=200)
-            response['Cache-Control'] = 'public, max-age=86400, stale-while-revalidate=3600'
-            return response
+            asset, meta = open_asset(integration, imageid, size)
+        except ImmichAssetError:
+            return Response({
+                'message': 'Invalid content type returned from Immich.',
+                'error': True,
+                'code': 'immich.invalid_content'
+            }, status=status.HTTP_502_BAD_GATEWAY)
 
         except requests.exceptions.ConnectionError:
             return Response({
@@ -377,6 +347,8 @@ class ImmichIntegrationView(viewsets.ViewSet):
                 'code': 'immich.timeout'
             }, status=status.HTTP_504_GATEWAY_TIMEOUT)
 
+        return asset_response(request, asset, meta)
+
 class ImmichIntegrationViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     serializer_class = ImmichIntegrationSerializer
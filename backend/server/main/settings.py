@@ -385,4 +385,33 @@ STRAVA_CLIENT_SECRET = getenv('STRAVA_CLIENT_SECRET', '')
 FLIGHT_SMTP_ENABLED = getenv('FLIGHT_SMTP_ENABLED', 'false').lower() == 'true'
 FLIGHT_SMTP_HOST = getenv('FLIGHT_SMTP_HOST', '0.0.0.0')
 FLIGHT_SMTP_PORT = int(getenv('FLIGHT_SMTP_PORT', '2525'))
-FLIGHT_SMTP_DOMAIN = getenv('FLIGHT_SMTP_DOMAIN', '')
\ No newline at end of file
+FLIGHT_SMTP_DOMAIN = getenv('FLIGHT_SMTP_DOMAIN', '')
+# ---------------------------------------------------------------------------
+# Background Export/Import Jobs
+# ---------------------------------------------------------------------------
+# Jobs run concurrently by each `run_data_jobs` worker process
+DATA_JOB_WORKERS = int(getenv('DATA_JOB_WORKERS', '2'))
+# Processes each `run_data_jobs` worker uses to normalize uploaded images
+IMAGE_INGEST_WORKERS = int(getenv('IMAGE_INGEST_WORKERS', '2'))
+# ---------------------------------------------------------------------------
+# Image Renditions
+# ---------------------------------------------------------------------------
+# Disk budget of the resized image cache under MEDIA_ROOT/renditions/
+RENDITION_CACHE_MAX_BYTES = int(getenv('RENDITION_CACHE_MAX_MB', '2048')) * 1024 * 1024
+# ---------------------------------------------------------------------------
+# Signed Media URLs
+# ---------------------------------------------------------------------------
+# Shared with nginx's secure_link check; media URLs are unsigned when empty
+MEDIA_SIGNING_KEY = getenv('MEDIA_SIGNING_KEY', '')
+# Signed media URLs stay valid for one to two of these periods (seconds)
+MEDIA_URL_TTL = int(getenv('MEDIA_URL_TTL', str(60 * 60 * 6)))
+# Seconds a media permission decision is cached for unsigned requests
+MEDIA_PERMISSION_CACHE_TTL = int(getenv('MEDIA_PERMISSION_CACHE_TTL', '60'))
+# ---------------------------------------------------------------------------
+# Immich Asset Cache
+# ---------------------------------------------------------------------------
+# Proxied Immich thumbnails and originals, kept outside MEDIA_ROOT
+IMMICH_CACHE_DIR = getenv('IMMICH_CACHE_DIR', str(BASE_DIR / 'immich_cache'))
+IMMICH_CACHE_MAX_BYTES = int(getenv('IMMICH_CACHE_MAX_MB', '1024')) * 1024 * 1024
+# Seconds a cached asset is served before it is revalidated with Immich
+IMMICH_CACHE_FRESH_SECONDS = int(getenv('IMMICH_CACHE_FRESH_SECONDS', str(60 * 60 * 24)))
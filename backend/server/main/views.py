@@ -2,9 +2,12 @@ from django.http import JsonResponse
 from django.middleware.csrf import get_token
 from os import getenv
 from django.conf import settings
-from django.http import HttpResponse, HttpResponseForbidden
+from django.http import HttpResponse, HttpResponseForbidden, HttpResponseNotFound
 from django.views.static import serve
+from PIL import UnidentifiedImageError
 from adventures.utils.file_permissions import checkFilePermission
+from adventures.utils.media_signing import verify_media_signature
+from adventures.utils.renditions import RENDITION_SIZES, RENDITIONS_DIR, available_formats, ensure_rendition
 
 def get_csrf_token(request):
     csrf_token = get_token(request)
@@ -13,30 +16,52 @@ def get_csrf_token(request):
 def get_public_url(request):
     return JsonResponse({'PUBLIC_URL': getenv('PUBLIC_URL')})
 
-protected_paths = ['images/', 'attachments/']
+protected_paths = ['images/', 'attachments/', 'jobs/']
+
+def _serve_media_file(request, path):
+    if settings.DEBUG:
+        # In debug mode, serve the file directly
+        return serve(request, path, document_root=settings.MEDIA_ROOT)
+    else:
+        # In production, use X-Accel-Redirect to serve the file using Nginx
+        response = HttpResponse()
+        response['Content-Type'] = ''
+        response['X-Accel-Redirect'] = '/protectedMedia/' + path
+        return response
+
+def serve_image_rendition(request, path, signed=False):
+    # renditions/<original file name>/<size>.<format>
+    parts = path.split('/')
+    if len(parts) != 3:
+        return HttpResponseNotFound()
+    original, size_and_format = parts[1], parts[2]
+    size, _, image_format = size_and_format.partition('.')
+    if size not in RENDITION_SIZES or image_format not in available_formats():
+        return HttpResponseNotFound()
+
+    # Renditions are visible to whoever may see the original image
+    if not signed and not checkFilePermission(original, request.user, 'images/'):
+        return HttpResponseForbidden()
+    try:
+        rendition = ensure_rendition(f'images/{original}', size, image_format)
+    except (FileNotFoundError, UnidentifiedImageError):
+        return HttpResponseNotFound()
+    return _serve_media_file(request, rendition)
 
 def serve_protected_media(request, path):
+    # Signed URLs were permission checked when they were issued
+    signed = verify_media_signature(path, request.GET.get('md5'), request.GET.get('expires'))
+    if path.startswith(RENDITIONS_DIR + '/'):
+        return serve_image_rendition(request, path, signed=signed)
+    if signed:
+        return _serve_media_file(request, path)
     if any([path.startswith(protected_path) for protected_path in protected_paths]):
         image_id = path.split('/')[1]
         user = request.user
         media_type =  path.split('/')[0] + '/'
         if checkFilePermission(image_id, user, media_type):
-            if settings.DEBUG:
-                # In debug mode, serve the file directly
-                return serve(request, path, document_root=settings.MEDIA_ROOT)
-            else:
-                # In production, use X-Accel-Redirect to serve the file using Nginx
-                response = HttpResponse()
-                response['Content-Type'] = ''
-                response['X-Accel-Redirect'] = '/protectedMedia/' + path
-                return response
+            return _serve_media_file(request, path)
         else:
             return HttpResponseForbidden()
     else:
-        if settings.DEBUG:
-            return serve(request, path, document_root=settings.MEDIA_ROOT)
-        else:
-            response = HttpResponse()
-            response['Content-Type'] = ''
-            response['X-Accel-Redirect'] = '/protectedMedia/' + path
-            return response
\ No newline at end of file
+        return _serve_media_file(request, path)
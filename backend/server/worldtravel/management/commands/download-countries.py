@@ -10,6 +10,7 @@ import sqlite3
 from contextlib import contextmanager
 
 from django.conf import settings
+from worldtravel.metadata import rebuild_dataset_metadata
 
 COUNTRY_REGION_JSON_VERSION = settings.COUNTRY_REGION_JSON_VERSION
         
@@ -134,6 +135,9 @@ class Command(BaseCommand):
             self.stdout.write('Step 5: Cleaning up obsolete records...')
             self._cleanup_obsolete_records(temp_conn)
 
+        self.stdout.write('Step 6: Rebuilding dataset totals and child counts...')
+        rebuild_dataset_metadata(COUNTRY_REGION_JSON_VERSION)
+
         self.stdout.write(self.style.SUCCESS('All data imported successfully with minimal memory usage'))
 
     def _parse_and_store_temp(self, json_path, temp_conn):
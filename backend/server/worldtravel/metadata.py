@@ -0,0 +1,110 @@
+"""
+Access to the precomputed world travel dataset metadata.
+
+Totals and per-country/per-region child counts only change when
+``download-countries`` imports a new dataset, so they are stored in
+``DatasetMetadata`` and kept in a process-level cache keyed by
+``COUNTRY_REGION_JSON_VERSION``.
+
+A rebuild runs in one process only, so the row's ``built_at`` is also
+published in the shared cache. Every process compares its copy against it
+at most once per ``RECHECK_INTERVAL`` and reloads the row when it changed.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from worldtravel.models import City, Country, DatasetMetadata, Region
+
+# Seconds a process serves its copy before checking for a rebuild again
+RECHECK_INTERVAL = 30
+
+# {version: (metadata, monotonic time of the last check)}
+_cache = {}
+_lock = threading.Lock()
+
+
+def _built_at_key(version):
+    return f'dataset_metadata_built_at:{version}'
+
+
+def _remember(metadata):
+    with _lock:
+        _cache[metadata.version] = (metadata, time.monotonic())
+
+
+def _published_built_at(version):
+    """``built_at`` of the stored row as a timestamp, or None without a row."""
+    built_at = cache.get(_built_at_key(version))
+    if built_at is None:
+        row = DatasetMetadata.objects.filter(version=version).values_list('built_at', flat=True).first()
+        if row is None:
+            return None
+        built_at = row.timestamp()
+        cache.set(_built_at_key(version), built_at, None)
+    return built_at
+
+
+def rebuild_dataset_metadata(version=None):
+    """Recount the dataset and store the result for ``version``."""
+    version = version or settings.COUNTRY_REGION_JSON_VERSION
+    region_counts = {
+        str(row['country']): row['count']
+        for row in Region.objects.order_by().values('country').annotate(count=Count('id'))
+    }
+    city_counts = {
+        str(row['region']): row['count']
+        for row in City.objects.order_by().values('region').annotate(count=Count('id'))
+    }
+    metadata, _ = DatasetMetadata.objects.update_or_create(
+        version=version,
+        defaults={
+            'total_countries': Country.objects.count(),
+            'total_regions': sum(region_counts.values()),
+            'total_cities': sum(city_counts.values()),
+            'region_counts': region_counts,
+            'city_counts': city_counts,
+        },
+    )
+    cache.set(_built_at_key(version), metadata.built_at.timestamp(), None)
+    _remember(metadata)
+    return metadata
+
+
+def get_dataset_metadata():
+    """Metadata for the current dataset version, built on first use if missing."""
+    version = settings.COUNTRY_REGION_JSON_VERSION
+    entry = _cache.get(version)
+    if entry is not None:
+        metadata, checked_at = entry
+        if time.monotonic() - checked_at < RECHECK_INTERVAL:
+            return metadata
+        if _published_built_at(version) == metadata.built_at.timestamp():
+            _remember(metadata)
+            return metadata
+
+    metadata = DatasetMetadata.objects.filter(version=version).first()
+    if metadata is None:
+        return rebuild_dataset_metadata(version)
+    _remember(metadata)
+    return metadata
+
+
+def get_world_totals():
+    metadata = get_dataset_metadata()
+    return {
+        'total_cities': metadata.total_cities,
+        'total_regions': metadata.total_regions,
+        'total_countries': metadata.total_countries,
+    }
+
+
+def get_num_regions(country_id):
+    return get_dataset_metadata().region_counts.get(str(country_id), 0)
+
+
+def get_num_cities(region_id):
+    return get_dataset_metadata().city_counts.get(str(region_id), 0)
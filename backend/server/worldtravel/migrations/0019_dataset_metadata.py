@@ -0,0 +1,30 @@
+# Generated by Django 5.2.11 on 2026-10-18 21:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('worldtravel', '0018_rename_user_id_visitedcity_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetMetadata',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('version', models.CharField(max_length=50, unique=True)),
+                ('total_countries', models.PositiveIntegerField(default=0)),
+                ('total_regions', models.PositiveIntegerField(default=0)),
+                ('total_cities', models.PositiveIntegerField(default=0)),
+                ('region_counts', models.JSONField(default=dict)),
+                ('city_counts', models.JSONField(default=dict)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Dataset Metadata',
+                'verbose_name_plural': 'Dataset Metadata',
+            },
+        ),
+    ]
@@ -48,6 +48,25 @@ class City(models.Model):
     def __str__(self):
         return self.name
 
+class DatasetMetadata(models.Model):
+    """Precomputed totals and child counts for one version of the country/region/city dataset"""
+    id = models.AutoField(primary_key=True)
+    version = models.CharField(max_length=50, unique=True)
+    total_countries = models.PositiveIntegerField(default=0)
+    total_regions = models.PositiveIntegerField(default=0)
+    total_cities = models.PositiveIntegerField(default=0)
+    # {country_id: number of regions} and {region_id: number of cities}
+    region_counts = models.JSONField(default=dict)
+    city_counts = models.JSONField(default=dict)
+    built_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Dataset Metadata"
+        verbose_name_plural = "Dataset Metadata"
+
+    def __str__(self):
+        return f"World travel dataset {self.version}"
+
 class VisitedRegion(models.Model):
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(
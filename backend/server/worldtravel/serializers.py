@@ -2,6 +2,7 @@ import os
 from .models import Country, Region, VisitedRegion, City, VisitedCity
 from rest_framework import serializers
 from main.utils import CustomModelSerializer
+from .metadata import get_num_regions, get_num_cities
 
 
 class CountrySerializer(serializers.ModelSerializer):
@@ -17,14 +18,18 @@ class CountrySerializer(serializers.ModelSerializer):
         return public_url + '/media/' + 'flags/' + obj.country_code.lower() + '.png'
     
     def get_num_regions(self, obj):
-        # get the number of regions in the country
-        return Region.objects.filter(country=obj).count()
+        # get the number of regions in the country from the precomputed dataset metadata
+        return get_num_regions(obj.id)
     
     def get_num_visits(self, obj):
         request = self.context.get('request')
         user = getattr(request, 'user', None)
         
         if user and user.is_authenticated:
+            # Precomputed by loaders that serialize many countries at once
+            counts = self.context.get('country_visit_counts')
+            if counts and obj.id in counts:
+                return counts[obj.id]
             return VisitedRegion.objects.filter(region__country=obj, user=user).count()
         
         return 0
@@ -44,7 +49,7 @@ class RegionSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'name', 'country', 'longitude', 'latitude', 'num_cities', 'country_name']
 
     def get_num_cities(self, obj):
-        return City.objects.filter(region=obj).count()
+        return get_num_cities(obj.id)
 
 class CitySerializer(serializers.ModelSerializer):
     region_name = serializers.CharField(source='region.name', read_only=True)
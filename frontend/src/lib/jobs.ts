@@ -0,0 +1,31 @@
+import type { DataJob } from '$lib/types';
+
+// Milliseconds between status requests while a background job runs
+const POLL_INTERVAL = 1500;
+
+/**
+ * Poll a background export/import job until it has finished and return its
+ * final state. `onProgress` is called with every status that was fetched.
+ */
+export async function waitForJob(
+	job: DataJob,
+	onProgress?: (job: DataJob) => void
+): Promise<DataJob> {
+	while (job.status === 'queued' || job.status === 'running') {
+		await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL));
+		const res = await fetch(`/api/jobs/${job.id}/`);
+		if (!res.ok) {
+			throw new Error(`Failed to fetch the status of job ${job.id}`);
+		}
+		job = await res.json();
+		onProgress?.(job);
+	}
+	return job;
+}
+
+/** Start the browser download of a finished export job's archive. */
+export function downloadJobResult(job: DataJob) {
+	if (job.download_url) {
+		window.location.href = job.download_url;
+	}
+}
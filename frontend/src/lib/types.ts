@@ -32,11 +32,22 @@ export type Collaborator = {
 	is_current_user?: boolean;
 };
 
+export type ImageRendition = {
+	width: number;
+	avif?: string;
+	webp?: string;
+};
+
 export type ContentImage = {
 	id: string;
 	image: string;
 	is_primary: boolean;
 	immich_id: string | null;
+	renditions?: Record<'thumbnail' | 'medium' | 'large', ImageRendition> | null;
+	// True until the uploaded file has been normalized in the background
+	processing?: boolean;
+	// Tiny inline WEBP data URI to paint before the image loads
+	placeholder?: string;
 };
 
 export type Location = {
@@ -222,6 +233,7 @@ export type Transportation = {
 	end_code: string | null; // Could be airport code, station code, etc.
 	is_public: boolean;
 	distance: number | null; // in kilometers
+	distance_source: 'gpx' | 'geodesic' | '' | null;
 	collection: Collection | null | string;
 	created_at: string; // ISO 8601 date string
 	updated_at: string; // ISO 8601 date string
@@ -696,3 +708,20 @@ export type FlightStats = {
 	unique_airports_count: number;
 	unique_airports: string[];
 };
+
+export type DataJob = {
+	id: string;
+	kind: 'backup_export' | 'backup_import' | 'collection_export' | 'collection_import';
+	status: 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled';
+	params: Record<string, any>;
+	result: Record<string, any> | null;
+	error: string;
+	progress_current: number;
+	progress_total: number;
+	cancel_requested: boolean;
+	created_at: string;
+	started_at: string | null;
+	finished_at: string | null;
+	status_url: string;
+	download_url: string | null;
+};
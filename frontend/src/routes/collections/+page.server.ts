@@ -1,7 +1,7 @@
 import { fail, redirect } from '@sveltejs/kit';
 import type { PageServerLoad } from './$types';
 const PUBLIC_SERVER_URL = process.env['PUBLIC_SERVER_URL'];
-import type { Location, Collection, SlimCollection } from '$lib/types';
+import type { Location, Collection, SlimCollection, DataJob } from '$lib/types';
 
 import type { Actions } from '@sveltejs/kit';
 import { fetchCSRFToken } from '$lib/index.server';
@@ -122,7 +122,8 @@ export const actions: Actions = {
 				});
 			}
 
-			return { success: true };
+			// The import runs as a background job that the page polls
+			return { success: true, job: (await res.json()) as DataJob };
 		} catch (error) {
 			console.error('Restore error:', error);
 			return fail(500, { message: 'settings.generic_error' });
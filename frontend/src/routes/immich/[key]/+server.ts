@@ -3,6 +3,24 @@ import type { RequestHandler } from './$types';
 const PUBLIC_SERVER_URL = process.env['PUBLIC_SERVER_URL'];
 const endpoint = PUBLIC_SERVER_URL || 'http://localhost:8000';
 
+const PASS_THROUGH_HEADERS = [
+	'accept-ranges',
+	'cache-control',
+	'content-length',
+	'content-range',
+	'etag',
+	'last-modified'
+];
+
+function passThroughHeaders(res: Response) {
+	const headers = new Headers();
+	for (const name of PASS_THROUGH_HEADERS) {
+		const value = res.headers.get(name);
+		if (value) headers.set(name, value);
+	}
+	return headers;
+}
+
 export const GET: RequestHandler = async (event) => {
 	try {
 		const key = event.params.key;
@@ -32,14 +50,30 @@ export const GET: RequestHandler = async (event) => {
 		const integrationData = await integrationFetch.json();
 		const integrationId = integrationData.id;
 
+		// Forward revalidation and range headers so the backend cache can answer them
+		const headers: Record<string, string> = {
+			'Content-Type': 'application/json',
+			Cookie: `sessionid=${sessionid}`
+		};
+		for (const name of ['range', 'if-range', 'if-none-match', 'if-modified-since']) {
+			const value = event.request.headers.get(name);
+			if (value) headers[name] = value;
+		}
+
 		// Proxy the request to the backend{
-		const res = await fetch(`${endpoint}/api/integrations/immich/${integrationId}/get/${key}`, {
-			method: 'GET',
-			headers: {
-				'Content-Type': 'application/json',
-				Cookie: `sessionid=${sessionid}`
+		const size = event.url.searchParams.get('size');
+		const query = size ? `?size=${encodeURIComponent(size)}` : '';
+		const res = await fetch(
+			`${endpoint}/api/integrations/immich/${integrationId}/get/${key}${query}`,
+			{
+				method: 'GET',
+				headers
 			}
-		});
+		);
+
+		if (res.status === 304) {
+			return new Response(null, { status: 304, headers: passThroughHeaders(res) });
+		}
 
 		if (!res.ok) {
 			// Return an error response if the backend request fails
@@ -50,15 +84,12 @@ export const GET: RequestHandler = async (event) => {
 			});
 		}
 
-		// Get the image as a Blob
-		const image = await res.blob();
-
-		// Create a Response to pass the image back
-		return new Response(image, {
+		// Stream the asset back, keeping partial content and caching headers
+		const responseHeaders = passThroughHeaders(res);
+		responseHeaders.set('Content-Type', res.headers.get('Content-Type') || 'image/jpeg');
+		return new Response(res.body, {
 			status: res.status,
-			headers: {
-				'Content-Type': res.headers.get('Content-Type') || 'image/jpeg'
-			}
+			headers: responseHeaders
 		});
 	} catch (error) {
 		console.error('Error proxying request:', error);
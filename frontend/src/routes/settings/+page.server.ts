@@ -1,7 +1,7 @@
 import { fail, redirect, type Actions } from '@sveltejs/kit';
 import type { PageServerLoad } from '../$types';
 const PUBLIC_SERVER_URL = process.env['PUBLIC_SERVER_URL'];
-import type { ImmichIntegration, User } from '$lib/types';
+import type { DataJob, ImmichIntegration, User } from '$lib/types';
 import { fetchCSRFToken } from '$lib/index.server';
 const endpoint = PUBLIC_SERVER_URL || 'http://localhost:8000';
 
@@ -339,7 +339,8 @@ export const actions: Actions = {
 				});
 			}
 
-			return { success: true };
+			// The restore runs as a background job that the page polls
+			return { job: (await res.json()) as DataJob };
 		} catch (error) {
 			console.error('Restore error:', error);
 			return fail(500, { message: 'settings.generic_error' });